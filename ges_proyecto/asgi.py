@@ -3,6 +3,13 @@ ASGI config for ges_proyecto project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+En producción se sirve con gunicorn y workers de uvicorn (ver gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py
+Las vistas de la API JSON son asíncronas; el resto de las vistas son
+síncronas y Django las corre en un hilo aparte. Por eso acá no se usan
+conexiones persistentes por hilo sino un pool (ver DB_CONN_MAX_AGE y DB_POOL
+en settings.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +19,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ges_proyecto.settings')
+os.environ['SERVIDOR_ASGI'] = 'True'
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
 import dj_database_url # type: ignore
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,6 +74,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gestor.context_processors.revision',
             ],
         },
     },
@@ -84,10 +86,81 @@ WSGI_APPLICATION = 'ges_proyecto.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexiones persistentes: cada hilo reusa su conexión durante
+# DB_CONN_MAX_AGE segundos (0 = una conexión nueva por request) y, con los
+# health checks, la verifica antes de reusarla después de un error o de que
+# el servidor la haya cortado.
+# Bajo ASGI (asgi.py fija SERVIDOR_ASGI) cada request corre en un hilo
+# propio: la conexión persistente del hilo no se vuelve a usar y quedaría
+# abierta hasta vencer, así que ahí DB_CONN_MAX_AGE se ignora y vale 0.
+# Con DB_POOL las conexiones salen de un pool del proceso: es la forma de
+# reusarlas bajo ASGI, y por eso ahí es el valor por defecto cuando la base
+# lo admite. PostgreSQL usa el pool nativo de Django; MySQL, el backend de
+# django-db-connection-pool. SQLite no tiene pool.
+SERVIDOR_ASGI = os.getenv("SERVIDOR_ASGI") == "True"
+DB_CONN_MAX_AGE = 0 if SERVIDOR_ASGI else int(os.getenv("DB_CONN_MAX_AGE", "60"))
+DB_CONN_HEALTH_CHECKS = os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 DATABASES = {
-    'default': dj_database_url.config(default=os.getenv("DATABASE_URL"))
+    'default': dj_database_url.config(
+        default=os.getenv("DATABASE_URL"),
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+    )
+}
+
+_motor = DATABASES['default'].get('ENGINE', '')
+_motor_con_pool = _motor.endswith(('postgresql', 'mysql'))
+DB_POOL = os.getenv("DB_POOL", str(SERVIDOR_ASGI and _motor_con_pool)) == "True"
+# Con pool, Django devuelve la conexión al terminar cada request
+DATABASES['default']['CONN_MAX_AGE'] = 0 if DB_POOL else DB_CONN_MAX_AGE
+
+if DB_POOL:
+    if _motor.endswith('postgresql'):
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_SIZE,
+            'max_size': DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW,
+            'max_lifetime': DB_POOL_RECYCLE,
+        }
+    elif _motor.endswith('mysql'):
+        DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+        DATABASES['default']['POOL_OPTIONS'] = {
+            'POOL_SIZE': DB_POOL_SIZE,
+            'MAX_OVERFLOW': DB_POOL_MAX_OVERFLOW,
+            'RECYCLE': DB_POOL_RECYCLE,
+        }
+    else:
+        raise ImproperlyConfigured(f'DB_POOL no está disponible para {_motor or "esta base"}')
+
+
+# Caché
+# No hay un servicio de caché externo: por defecto la caché vive en la memoria
+# de cada proceso. Con CACHE_DIR se guarda en disco y la comparten todos los
+# workers de la máquina (las claves llevan la revisión de datos, así que un
+# cambio las deja obsoletas en todos los procesos a la vez).
+CACHE_DIR = os.getenv("CACHE_DIR")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache' if CACHE_DIR
+                   else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_DIR or 'gestor',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv("CACHE_MAX_ENTRIES", "5000"))},
+    }
 }
 
+# Bloqueos para que los workers no repitan en paralelo el mismo cálculo
+# (ver gestor/en_vuelo.py). Solo sirven si la caché es compartida: por
+# defecto van junto a CACHE_DIR; sin caché en disco se coalesce por proceso.
+BLOQUEOS_DIR = os.getenv("BLOQUEOS_DIR") or (os.path.join(CACHE_DIR, 'bloqueos') if CACHE_DIR else None)
+
+# Al terminar una importación se recalculan reportes y mapas en segundo plano
+# (ver gestor/precalentar.py y el comando warm_caches)
+PRECALENTAR_TRAS_IMPORTAR = os.getenv("PRECALENTAR_TRAS_IMPORTAR", "True") == "True"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
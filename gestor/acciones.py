@@ -0,0 +1,101 @@
+#gestor/acciones.py
+"""
+Operaciones masivas sobre escuelas y servicios de conectividad (acciones del
+admin). Todo se resuelve con UPDATE/DELETE ... WHERE id IN (...) por lotes:
+SeguimientoQuerySet mantiene el hash, la fecha y el RegistroCambio, y el
+registro avanza la revisión de datos, así que las cachés se invalidan solas.
+
+Las banderas y columnas derivadas de Escuela se mantienen con
+desnormalizacion.sincronizar_escuelas (los caminos masivos ya la llaman).
+Las acciones por escuela tocan solo el servicio vigente: el historial no se
+modifica.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .desnormalizacion import sincronizar_escuelas
+from .models import TAMANO_LOTE, Escuela, RegistroCambio, ServicioConectividad, registrar_cambios
+from .signals import bajas_registradas
+
+
+def en_lotes(ids, tamano=TAMANO_LOTE):
+    ids = list(ids)
+    for i in range(0, len(ids), tamano):
+        yield ids[i:i + tamano]
+
+
+def _vigentes(escuela_ids):
+    """Subconsulta con los ids de los servicios vigentes de las escuelas."""
+    return Escuela.objects.filter(pk__in=escuela_ids, servicio_vigente__isnull=False).values('servicio_vigente_id')
+
+
+@transaction.atomic
+def actualizar_servicios(servicio_ids, **valores):
+    """Aplica los mismos valores a los servicios indicados."""
+    return sum(
+        ServicioConectividad.objects.filter(pk__in=lote).update(**valores)
+        for lote in en_lotes(servicio_ids)
+    )
+
+
+@transaction.atomic
+def actualizar_servicios_de_escuelas(escuela_ids, **valores):
+    """Aplica los mismos valores al servicio vigente de las escuelas indicadas."""
+    return sum(
+        ServicioConectividad.objects.filter(pk__in=_vigentes(lote)).update(**valores)
+        for lote in en_lotes(escuela_ids)
+    )
+
+
+@transaction.atomic
+def marcar_con_internet(escuela_ids, **valores_servicio):
+    """
+    Crea un servicio (con los valores dados) en las escuelas que no tienen
+    uno vigente y marca todas con Internet. Devuelve los servicios creados.
+    """
+    creados = 0
+    for lote in en_lotes(escuela_ids):
+        sin_servicio = Escuela.objects.filter(pk__in=lote, servicio_vigente__isnull=True).values_list('pk', flat=True)
+        nuevos = [ServicioConectividad(escuela_id=pk, **valores_servicio) for pk in sin_servicio]
+        creados += len(ServicioConectividad.objects.bulk_create(nuevos))
+    # Escuelas que ya tenían servicio pero figuraban sin Internet
+    sincronizar_escuelas(escuela_ids)
+    return creados
+
+
+@transaction.atomic
+def eliminar_servicios(servicios):
+    """
+    Borra los servicios del queryset registrando las bajas en una sola
+    inserción por lote y sincroniza sus escuelas al final.
+    Devuelve la cantidad de servicios borrados.
+    """
+    borrados = 0
+    escuela_ids = set()
+    ids = list(servicios.values_list('pk', flat=True))
+    for lote in en_lotes(ids):
+        # select_related: el registro toma el CUE de la escuela ya cargada
+        objetos = list(ServicioConectividad.objects.filter(pk__in=lote).select_related('escuela'))
+        registrar_cambios(objetos, RegistroCambio.ELIMINADO)
+        escuela_ids.update(obj.escuela_id for obj in objetos)
+        with bajas_registradas():
+            borrados += ServicioConectividad.objects.filter(pk__in=lote).delete()[0]
+    sincronizar_escuelas(escuela_ids)
+    return borrados
+
+
+@transaction.atomic
+def marcar_sin_internet(escuela_ids):
+    """
+    Da de baja el servicio vigente de las escuelas indicadas (queda como
+    historial) y las marca sin Internet. Devuelve los servicios dados de baja.
+    """
+    escuela_ids = list(escuela_ids)
+    hoy = timezone.localdate()
+    bajas = sum(
+        ServicioConectividad.objects.filter(pk__in=_vigentes(lote)).update(fecha_baja=hoy)
+        for lote in en_lotes(escuela_ids)
+    )
+    # Escuelas marcadas con Internet pero sin servicio vigente también se corrigen
+    sincronizar_escuelas(escuela_ids)
+    return bajas
@@ -1,4 +1,13 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.paginator import Paginator
+from django.db import connection
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
+
+from . import acciones
+from .desnormalizacion import sincronizar_escuelas
 
 from .models import (
     Escuela,
@@ -19,8 +28,136 @@ from .models import (
     TipoPisoTecnologico,
     PlanPiso,
     MetodoSolicitud,
+    RegistroCambio,
 )
 
+# ---------------------------------------------------------------------
+# UTILIDADES
+# ---------------------------------------------------------------------
+
+# Debajo de esta cantidad estimada de filas se cuenta de verdad
+MIN_FILAS_ESTIMADAS = 10000
+
+
+def filas_estimadas(tabla):
+    """Filas según las estadísticas del motor (sin recorrer la tabla), o None."""
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    elif connection.vendor == 'mysql':
+        sql = ("SELECT table_rows FROM information_schema.tables "
+               "WHERE table_schema = DATABASE() AND table_name = %s")
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tabla])
+        fila = cursor.fetchone()
+    return int(fila[0]) if fila and fila[0] is not None and fila[0] >= 0 else None
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Sin filtros usa la cantidad estimada por el motor en lugar de COUNT(*),
+    que en tablas grandes recorre todo el índice. Con filtros cuenta igual
+    que el paginador de Django.
+    """
+
+    @cached_property
+    def count(self):
+        consulta = getattr(self.object_list, 'query', None)
+        if consulta is not None and not consulta.where:
+            estimadas = filas_estimadas(self.object_list.model._meta.db_table)
+            if estimadas is not None and estimadas >= MIN_FILAS_ESTIMADAS:
+                return estimadas
+        return super().count
+
+
+class FiltroAutocompletar(admin.RelatedFieldListFilter):
+    """
+    Filtro por FK que busca en el catálogo con el autocompletado del admin en
+    lugar de cargar la tabla relacionada completa en la barra de filtros.
+    El admin del catálogo necesita search_fields.
+    """
+    template = 'admin/gestor/filtro_autocompletar.html'
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    @cached_property
+    def seleccionado(self):
+        """(id, texto) del valor filtrado, o None."""
+        valores = self.lookup_val or []
+        if isinstance(valores, str):
+            valores = [valores]
+        valor = next((v for v in valores if v), None)
+        if valor is None:
+            return None
+        objeto = self.field.remote_field.model._default_manager.filter(pk=valor).first()
+        return valor, str(objeto) if objeto else valor
+
+    @cached_property
+    def autocompletar(self):
+        opts = self.field.model._meta
+        return {'app_label': opts.app_label, 'model_name': opts.model_name, 'field_name': self.field.name}
+
+
+class CatalogoAdmin(admin.ModelAdmin):
+    """Catálogos de nombre único: buscables para los autocompletados."""
+    list_display = ('nombre',)
+    search_fields = ('nombre',)
+    ordering = ('nombre',)
+
+
+# ---------------------------------------------------------------------
+# ACCIONES MASIVAS
+# ---------------------------------------------------------------------
+# Todas se aplican con UPDATE/DELETE por lotes (ver gestor/acciones.py),
+# nunca guardando fila por fila.
+
+class FormularioEstado(forms.Form):
+    estado_conectividad = forms.ModelChoiceField(
+        queryset=EstadoConectividad.objects.order_by('nombre'), label='Estado de conectividad',
+    )
+
+
+class FormularioProveedor(forms.Form):
+    proveedor = forms.ModelChoiceField(
+        queryset=ProveedorInternet.objects.order_by('nombre'), label='Proveedor de Internet',
+    )
+
+
+class FormularioConfirmacion(forms.Form):
+    pass
+
+
+def accion_con_formulario(modeladmin, request, queryset, formulario, titulo, aplicar, mensaje):
+    """
+    Acción en dos pasos: primero muestra el formulario (o la confirmación)
+    con la selección original; al enviarlo llama a aplicar(ids, **datos).
+    """
+    form = formulario(request.POST if 'aplicar' in request.POST else None)
+    if form.is_valid():
+        ids = list(queryset.values_list('pk', flat=True))
+        cantidad = aplicar(ids, **form.cleaned_data)
+        modeladmin.message_user(request, mensaje.format(cantidad=cantidad, total=len(ids)), messages.SUCCESS)
+        return None
+
+    opts = modeladmin.model._meta
+    return TemplateResponse(request, 'admin/gestor/accion_masiva.html', {
+        **modeladmin.admin_site.each_context(request),
+        'title': titulo,
+        'opts': opts,
+        'form': form,
+        'cantidad': queryset.count(),
+        'accion': request.POST.get('action'),
+        'seleccionados': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'seleccionar_todo': request.POST.get('select_across', '0'),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    })
+
+
 # ---------------------------------------------------------------------
 # INLINES (formularios anidados)
 # ---------------------------------------------------------------------
@@ -29,14 +166,14 @@ class ServicioConectividadInline(admin.TabularInline):
     """Formulario inline para ServicioConectividad dentro de Escuela."""
     model = ServicioConectividad
     extra = 1
-    raw_id_fields = ('proveedor',)
+    autocomplete_fields = ('proveedor', 'estado_conectividad', 'metodo_solicitud')
 
 
 class PisoTecnologicoInline(admin.TabularInline):
     """Formulario inline para PisoTecnologico dentro de Escuela."""
     model = PisoTecnologico
     extra = 1
-    raw_id_fields = ('proveedor',)
+    autocomplete_fields = ('proveedor', 'plan_piso', 'tipo_piso_instalado')
 
 
 # ---------------------------------------------------------------------
@@ -53,13 +190,16 @@ class EscuelaAdmin(admin.ModelAdmin):
         'distrito',
     )
     search_fields = ('cue', 'nombre')
+    list_select_related = ('region', 'distrito')
     list_filter = (
-        'region',
-        'distrito',
-        'categoria',
+        ('region', FiltroAutocompletar),
+        ('distrito', FiltroAutocompletar),
+        ('categoria', FiltroAutocompletar),
         'tiene_internet',
         'tiene_piso_tecnologico',
     )
+    show_full_result_count = False
+    paginator = PaginadorEstimado
     inlines = [ServicioConectividadInline, PisoTecnologicoInline]
 
     raw_id_fields = (
@@ -73,32 +213,130 @@ class EscuelaAdmin(admin.ModelAdmin):
         'categoria',
         'tipo_establecimiento',
     )
+    actions = ['cambiar_estado', 'cambiar_proveedor', 'marcar_con_internet', 'marcar_sin_internet']
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Los servicios y pisos del inline mandan sobre las casillas tiene_internet / tiene_piso
+        sincronizar_escuelas([form.instance.pk])
+
+    @admin.action(description='Cambiar estado de conectividad de los servicios', permissions=['change'])
+    def cambiar_estado(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioEstado,
+            'Cambiar estado de conectividad', acciones.actualizar_servicios_de_escuelas,
+            '{cantidad} servicios actualizados en {total} escuelas.',
+        )
+
+    @admin.action(description='Cambiar proveedor de Internet de los servicios', permissions=['change'])
+    def cambiar_proveedor(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioProveedor,
+            'Cambiar proveedor de Internet', acciones.actualizar_servicios_de_escuelas,
+            '{cantidad} servicios actualizados en {total} escuelas.',
+        )
+
+    @admin.action(description='Marcar con Internet', permissions=['change'])
+    def marcar_con_internet(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioEstado,
+            'Marcar con Internet', acciones.marcar_con_internet,
+            '{total} escuelas marcadas con Internet ({cantidad} servicios nuevos).',
+        )
+
+    @admin.action(description='Marcar sin Internet (da de baja su servicio)', permissions=['change'])
+    def marcar_sin_internet(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioConfirmacion,
+            'Marcar sin Internet', acciones.marcar_sin_internet,
+            '{total} escuelas marcadas sin Internet ({cantidad} servicios dados de baja).',
+        )
 
 
 class PredioAdmin(admin.ModelAdmin):
     list_display = ('numero_predio',)
+    search_fields = ('numero_predio',)
+    ordering = ('numero_predio',)
 
 
 class ServicioConectividadAdmin(admin.ModelAdmin):
     list_display = ('escuela', 'proveedor', 'estado_conectividad', 'velocidad_mbps')
-    list_filter = ('proveedor', 'estado_conectividad')
+    list_select_related = ('escuela', 'proveedor', 'estado_conectividad')
+    list_filter = (('proveedor', FiltroAutocompletar), ('estado_conectividad', FiltroAutocompletar))
     search_fields = ('escuela__nombre', 'escuela__cue')
+    autocomplete_fields = ('escuela', 'proveedor', 'estado_conectividad', 'metodo_solicitud')
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+    actions = ['cambiar_estado', 'cambiar_proveedor']
+
+    def save_model(self, request, obj, form, change):
+        anterior = form.initial.get('escuela')
+        super().save_model(request, obj, form, change)
+        # La señal sincroniza la escuela nueva; si se cambió de escuela, falta la anterior
+        if anterior and anterior != obj.escuela_id:
+            sincronizar_escuelas([anterior])
+
+    def delete_model(self, request, obj):
+        acciones.eliminar_servicios(ServicioConectividad.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        acciones.eliminar_servicios(queryset)
+
+    @admin.action(description='Cambiar estado de conectividad', permissions=['change'])
+    def cambiar_estado(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioEstado,
+            'Cambiar estado de conectividad', acciones.actualizar_servicios,
+            '{cantidad} servicios actualizados.',
+        )
+
+    @admin.action(description='Cambiar proveedor de Internet', permissions=['change'])
+    def cambiar_proveedor(self, request, queryset):
+        return accion_con_formulario(
+            self, request, queryset, FormularioProveedor,
+            'Cambiar proveedor de Internet', acciones.actualizar_servicios,
+            '{cantidad} servicios actualizados.',
+        )
 
 
 class PisoTecnologicoAdmin(admin.ModelAdmin):
     list_display = ('escuela', 'proveedor', 'tipo_piso_instalado', 'fecha_terminado')
-    list_filter = ('proveedor', 'tipo_piso_instalado')
+    list_select_related = ('escuela', 'proveedor', 'tipo_piso_instalado')
+    list_filter = (('proveedor', FiltroAutocompletar), ('tipo_piso_instalado', FiltroAutocompletar))
     search_fields = ('escuela__nombre', 'escuela__cue')
+    autocomplete_fields = ('escuela', 'proveedor', 'plan_piso', 'tipo_piso_instalado')
+    show_full_result_count = False
+    paginator = PaginadorEstimado
 
 
-class PlanPisoAdmin(admin.ModelAdmin):
-    list_display = ('nombre',)
-    search_fields = ('nombre',)
+class DistritoAdmin(CatalogoAdmin):
+    list_display = ('nombre', 'region')
+    list_select_related = ('region',)
+    autocomplete_fields = ('region',)
 
 
-@admin.register(MetodoSolicitud)
-class MetodoSolicitudAdmin(admin.ModelAdmin):
-    list_display = ('nombre',)
+class CiudadAdmin(CatalogoAdmin):
+    list_display = ('nombre', 'distrito')
+    list_select_related = ('distrito',)
+    autocomplete_fields = ('distrito',)
+
+
+class RegistroCambioAdmin(admin.ModelAdmin):
+    """Solo lectura: el registro se escribe automáticamente."""
+    list_display = ('id', 'fecha', 'modelo', 'accion', 'cue', 'objeto_id')
+    list_filter = ('modelo', 'accion')
+    search_fields = ('cue',)
+    show_full_result_count = False
+    paginator = PaginadorEstimado
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 # ---------------------------------------------------------------------
@@ -110,24 +348,26 @@ admin.site.register(Escuela, EscuelaAdmin)
 admin.site.register(Predio, PredioAdmin)
 
 # Catálogos
-admin.site.register(Region)
-admin.site.register(Distrito)
-admin.site.register(Ciudad)
-admin.site.register(Ambito)
-admin.site.register(Dependencia)
-admin.site.register(Turno)
-admin.site.register(Categoria)
-admin.site.register(TipoEstablecimiento)
+admin.site.register(Region, CatalogoAdmin)
+admin.site.register(Distrito, DistritoAdmin)
+admin.site.register(Ciudad, CiudadAdmin)
+admin.site.register(Ambito, CatalogoAdmin)
+admin.site.register(Dependencia, CatalogoAdmin)
+admin.site.register(Turno, CatalogoAdmin)
+admin.site.register(Categoria, CatalogoAdmin)
+admin.site.register(TipoEstablecimiento, CatalogoAdmin)
 
 # Proveedores
-admin.site.register(ProveedorInternet)
-admin.site.register(ProveedorPisoTecnologico)
+admin.site.register(ProveedorInternet, CatalogoAdmin)
+admin.site.register(ProveedorPisoTecnologico, CatalogoAdmin)
 
 # Conectividad
-admin.site.register(EstadoConectividad)
+admin.site.register(EstadoConectividad, CatalogoAdmin)
+admin.site.register(MetodoSolicitud, CatalogoAdmin)
 admin.site.register(ServicioConectividad, ServicioConectividadAdmin)
 admin.site.register(PisoTecnologico, PisoTecnologicoAdmin)
 
 # Otros
-admin.site.register(TipoPisoTecnologico)
-admin.site.register(PlanPiso, PlanPisoAdmin)
+admin.site.register(TipoPisoTecnologico, CatalogoAdmin)
+admin.site.register(PlanPiso, CatalogoAdmin)
+admin.site.register(RegistroCambio, RegistroCambioAdmin)
@@ -0,0 +1,185 @@
+#gestor/analitica.py
+"""
+Análisis de brechas de cobertura para planificar la conectividad.
+
+Carga la tabla de escuelas una vez en arreglos de NumPy y calcula para cada
+escuela sin Internet:
+  - su matrícula,
+  - la distancia a la escuela con Internet más cercana,
+  - cuántas escuelas sin Internet comparten su predio,
+con un ranking por cada criterio y un puntaje combinado. El resultado se
+cachea bajo la revisión de datos; filtrar y ordenar después es vectorizado.
+"""
+import numpy as np
+
+from .models import Escuela
+from .revision import cacheado, clave_cache
+
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Tamaño máximo (en elementos) de cada bloque de la matriz de distancias:
+# 4 millones de float64 son 32 MB por bloque
+MAX_ELEMENTOS_BLOQUE = 4_000_000
+
+ORDENES = {
+    'prioridad': 'Puntaje combinado',
+    'matricula': 'Matrícula',
+    'distancia': 'Distancia a escuela conectada',
+    'predio': 'Escuelas sin Internet en el predio',
+}
+
+
+# -------------------------------------------------------------------------
+# CARGA
+# -------------------------------------------------------------------------
+
+def cargar_tabla():
+    """Tabla de escuelas como arreglos paralelos (una sola consulta)."""
+    filas = list(Escuela.objects.values_list(
+        'cue', 'nombre', 'latitud', 'longitud', 'matricula',
+        'tiene_internet', 'region_id', 'distrito_id', 'predio_id',
+    ))
+    n = len(filas)
+    cue, nombre, lat, lng, matricula, internet, region, distrito, predio = (
+        zip(*filas) if filas else ([],) * 9
+    )
+
+    def enteros(valores):
+        return np.fromiter((-1 if v is None else v for v in valores), dtype=np.int64, count=n)
+
+    def reales(valores):
+        return np.fromiter((np.nan if v is None else float(v) for v in valores), dtype=np.float64, count=n)
+
+    return {
+        'cue': np.array(cue, dtype=object),
+        'nombre': np.array(nombre, dtype=object),
+        'latitud': reales(lat),
+        'longitud': reales(lng),
+        'matricula': enteros(matricula),
+        'tiene_internet': np.fromiter(internet, dtype=bool, count=n),
+        'region_id': enteros(region),
+        'distrito_id': enteros(distrito),
+        'predio_id': enteros(predio),
+    }
+
+
+# -------------------------------------------------------------------------
+# CÁLCULOS VECTORIZADOS
+# -------------------------------------------------------------------------
+
+def vectores_unitarios(lat, lng):
+    """Coordenadas en la esfera unitaria: la cuerda entre dos puntos crece con la distancia real."""
+    lat_r, lng_r = np.radians(lat), np.radians(lng)
+    cos_lat = np.cos(lat_r)
+    return np.column_stack((cos_lat * np.cos(lng_r), cos_lat * np.sin(lng_r), np.sin(lat_r)))
+
+
+def vecino_mas_cercano(origen, destino):
+    """
+    Para cada punto de 'origen' (n x 3, unitarios) devuelve el índice del
+    punto de 'destino' más cercano y la distancia en km.
+
+    Maximizar el producto escalar equivale a minimizar la distancia sobre la
+    esfera, así que cada bloque es un producto de matrices y un argmax; la
+    matriz completa n x m nunca se arma de una vez.
+    """
+    n, m = len(origen), len(destino)
+    indices = np.full(n, -1, dtype=np.int64)
+    distancias = np.full(n, np.nan)
+    if n == 0 or m == 0:
+        return indices, distancias
+
+    bloque = max(1, MAX_ELEMENTOS_BLOQUE // m)
+    destino_t = np.ascontiguousarray(destino.T)
+    for inicio in range(0, n, bloque):
+        productos = origen[inicio:inicio + bloque] @ destino_t
+        mejores = productos.argmax(axis=1)
+        indices[inicio:inicio + bloque] = mejores
+        coseno = productos[np.arange(len(mejores)), mejores]
+        cuerda = np.sqrt(np.clip(2.0 - 2.0 * coseno, 0.0, 4.0))
+        distancias[inicio:inicio + bloque] = 2 * RADIO_TIERRA_KM * np.arcsin(cuerda / 2)
+    return indices, distancias
+
+
+def ranking_descendente(valores):
+    """Posición 1 para el mayor valor; los NaN van al final."""
+    claves = np.where(np.isnan(valores), -np.inf, valores)
+    orden = np.argsort(-claves, kind='stable')
+    ranking = np.empty(len(valores), dtype=np.int64)
+    ranking[orden] = np.arange(1, len(valores) + 1)
+    return ranking
+
+
+def calcular_brechas(tabla):
+    """Indicadores y rankings de las escuelas sin Internet (arreglos paralelos)."""
+    internet = tabla['tiene_internet']
+    con_coordenadas = ~np.isnan(tabla['latitud']) & ~np.isnan(tabla['longitud'])
+    sin_internet = ~internet
+
+    # Distancia a la escuela conectada más cercana
+    unitarios = vectores_unitarios(
+        np.nan_to_num(tabla['latitud']), np.nan_to_num(tabla['longitud'])
+    )
+    origen = np.flatnonzero(sin_internet & con_coordenadas)
+    destino = np.flatnonzero(internet & con_coordenadas)
+    vecinos, distancias_origen = vecino_mas_cercano(unitarios[origen], unitarios[destino])
+
+    distancia = np.full(len(internet), np.nan)
+    distancia[origen] = distancias_origen
+    cue_vecina = np.full(len(internet), '', dtype=object)
+    if len(destino):
+        cue_vecina[origen] = tabla['cue'][destino[vecinos]]
+
+    # Escuelas sin Internet en el mismo predio (incluida la propia)
+    predio = tabla['predio_id']
+    validos = predio >= 0
+    conteo = np.bincount(predio[sin_internet & validos], minlength=(predio.max() + 1) if len(predio) else 0)
+    en_predio = np.zeros(len(predio), dtype=np.int64)
+    en_predio[validos] = conteo[predio[validos]]
+
+    filas = np.flatnonzero(sin_internet)
+    brechas = {clave: tabla[clave][filas] for clave in ('cue', 'nombre', 'matricula', 'region_id', 'distrito_id')}
+    brechas['distancia_km'] = distancia[filas]
+    brechas['cue_conectada'] = cue_vecina[filas]
+    brechas['sin_internet_predio'] = en_predio[filas]
+
+    total = len(filas)
+    brechas['rank_matricula'] = ranking_descendente(brechas['matricula'].astype(np.float64))
+    brechas['rank_distancia'] = ranking_descendente(brechas['distancia_km'])
+    brechas['rank_predio'] = ranking_descendente(brechas['sin_internet_predio'].astype(np.float64))
+
+    # Puntaje 0-100: promedio de los tres rankings normalizados (100 = primera en todos)
+    if total:
+        normalizados = [(total - brechas[clave]) / max(total - 1, 1)
+                        for clave in ('rank_matricula', 'rank_distancia', 'rank_predio')]
+        brechas['puntaje'] = np.round(100 * np.mean(normalizados, axis=0), 1)
+    else:
+        brechas['puntaje'] = np.zeros(0)
+    brechas['rank_prioridad'] = ranking_descendente(brechas['puntaje'].astype(np.float64))
+    return brechas
+
+
+# -------------------------------------------------------------------------
+# CONSULTA
+# -------------------------------------------------------------------------
+
+def brechas():
+    """Resultado de calcular_brechas para la revisión actual (cacheado)."""
+    return cacheado(clave_cache('brechas_cobertura'), lambda: calcular_brechas(cargar_tabla()))
+
+
+def consultar(region_id=None, distrito_id=None, orden='prioridad'):
+    """
+    Índices de las filas de brechas() que cumplen el filtro, en el orden
+    pedido ('prioridad', 'matricula', 'distancia' o 'predio').
+    """
+    datos = brechas()
+    mascara = np.ones(len(datos['cue']), dtype=bool)
+    if region_id is not None:
+        mascara &= datos['region_id'] == region_id
+    if distrito_id is not None:
+        mascara &= datos['distrito_id'] == distrito_id
+    filas = np.flatnonzero(mascara)
+    ranking = datos[f'rank_{orden if orden in ORDENES else "prioridad"}']
+    return datos, filas[np.argsort(ranking[filas], kind='stable')]
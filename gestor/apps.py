@@ -6,3 +6,9 @@ from django.apps import AppConfig
 class GestorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestor'
+
+    def ready(self):
+        # Registra los receptores del RegistroCambio
+        from . import signals  # noqa: F401
+        # Y los que cuentan requests y conexiones a la base (ver conexiones.py)
+        from . import conexiones  # noqa: F401
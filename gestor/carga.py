@@ -0,0 +1,356 @@
+#gestor/carga.py
+"""
+Prueba de carga contra un servidor en marcha.
+
+Cada usuario virtual (un hilo, con su conexión keep-alive como un
+navegador) repite sesiones como las de un usuario real, elegidas al azar
+según ESCENARIOS:
+  - mapa: abre el mapa, panea y hace zoom (hacia los grupos que ve) y abre
+    el popup de escuelas que aparecen en la ventana;
+  - búsqueda: búsqueda avanzada con filtros y paginado;
+  - dashboard y reportes: páginas de cifras, con y sin filtro de región.
+Entre acción y acción espera un tiempo de lectura (exponencial, con media
+'pausa'; 0 = sin pausa, máxima presión).
+
+Al final se informa, por tipo de pedido y en total, pedidos por segundo,
+latencias (p50, p95, p99) y errores. El resultado se puede guardar en JSON
+junto con los parámetros y el perfil del servidor (variables de gunicorn y
+de la base), y comparar con una corrida anterior.
+
+Flujo reproducible con datos sintéticos (ver sinteticos.py):
+    DATABASE_URL=sqlite:///carga.sqlite3 python manage.py migrate
+    DATABASE_URL=sqlite:///carga.sqlite3 python manage.py sembrar_datos_prueba --escuelas 5000
+    DATABASE_URL=sqlite:///carga.sqlite3 python manage.py prueba_carga --levantar \\
+        --usuarios 50 --duracion 60 --semilla 1 --guardar resultados_carga --etiqueta base
+"""
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.urls import reverse
+
+from .catalogos import arbol_geografico
+from .mapa import VISTA_INICIAL
+from .models import Escuela
+
+
+# Pantalla típica del mapa, en píxeles (para el tamaño de la ventana pedida)
+ANCHO_PANTALLA, ALTO_PANTALLA = 1200, 700
+ZOOM_MINIMO, ZOOM_MAXIMO = 6, 16
+ACCIONES_MAPA = (5, 15)
+MUESTRA_ESCUELAS = 500
+TIMEOUT_PEDIDO = 60
+ESPERA_SERVIDOR = 60
+
+# Variables de entorno que describen el perfil del servidor en los resultados
+VARIABLES_PERFIL = (
+    'GUNICORN_WORKER_CLASS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_PRELOAD',
+    'DB_CONN_MAX_AGE', 'DB_POOL', 'DB_POOL_SIZE', 'CACHE_DIR',
+)
+
+
+# -------------------------------------------------------------------------
+# ESCENARIOS
+# -------------------------------------------------------------------------
+# Cada escenario es un generador que produce (tipo de pedido, ruta) y recibe
+# el cuerpo de la respuesta (o None si falló), para decidir la acción siguiente.
+
+def ventana(lat, lng, zoom):
+    """Parámetros de la API de bounds para una pantalla centrada en (lat, lng)."""
+    grados_por_pixel = 360 / (256 * 2 ** zoom)
+    medio_ancho = ANCHO_PANTALLA * grados_por_pixel / 2
+    medio_alto = ALTO_PANTALLA * grados_por_pixel * math.cos(math.radians(lat)) / 2
+    return {
+        'minLat': round(lat - medio_alto, 6), 'maxLat': round(lat + medio_alto, 6),
+        'minLng': round(lng - medio_ancho, 6), 'maxLng': round(lng + medio_ancho, 6),
+        'zoom': zoom,
+    }
+
+
+def _json(cuerpo):
+    try:
+        return json.loads(cuerpo)
+    except (TypeError, ValueError):
+        return None
+
+
+def sesion_mapa(azar, datos):
+    lat = (VISTA_INICIAL['minLat'] + VISTA_INICIAL['maxLat']) / 2
+    lng = (VISTA_INICIAL['minLng'] + VISTA_INICIAL['maxLng']) / 2
+    zoom = VISTA_INICIAL['zoom']
+    yield 'mapa_pagina', reverse('mapa_escuelas_con_internet')
+
+    for _ in range(azar.randint(*ACCIONES_MAPA)):
+        parametros = dict(ventana(lat, lng, zoom), tiene_internet='1')
+        respuesta = _json((yield 'mapa_ventana', f"{reverse('api_escuelas_bounds')}?{urllib.parse.urlencode(parametros)}"))
+        items = respuesta.get('items', []) if isinstance(respuesta, dict) else []
+        agrupado = isinstance(respuesta, dict) and respuesta.get('modo') == 'grupos'
+
+        accion = azar.random()
+        if items and not agrupado and accion < 0.35:
+            # Popup de una escuela que está en la pantalla
+            yield 'popup', reverse('api_escuela', args=[azar.choice(items)['cue']])
+        elif items and accion < 0.65 and zoom < ZOOM_MAXIMO:
+            # Zoom hacia un grupo (los más poblados atraen más) o una escuela
+            destino = azar.choices(items, [item.get('cantidad', 1) for item in items])[0]
+            lat, lng = destino['latitud'], destino['longitud']
+            zoom = min(zoom + azar.randint(1, 2), ZOOM_MAXIMO)
+        elif accion < 0.75 and zoom > ZOOM_MINIMO:
+            zoom -= 1
+        else:
+            # Paneo de media pantalla, más o menos, en cualquier dirección
+            grados = ANCHO_PANTALLA * 360 / (256 * 2 ** zoom)
+            angulo = azar.uniform(0, 2 * math.pi)
+            distancia = azar.uniform(0.3, 0.7) * grados
+            lat = min(max(lat + distancia * math.sin(angulo) / 2, VISTA_INICIAL['minLat']), VISTA_INICIAL['maxLat'])
+            lng = min(max(lng + distancia * math.cos(angulo), VISTA_INICIAL['minLng']), VISTA_INICIAL['maxLng'])
+
+
+def sesion_busqueda(azar, datos):
+    yield 'busqueda', reverse('busqueda')
+    filtros = {}
+    if azar.random() < 0.5 and datos['regiones']:
+        filtros['region'] = azar.choice(datos['regiones'])
+    if azar.random() < 0.4:
+        filtros['tiene_internet'] = azar.choice(['si', 'no'])
+    if not filtros or azar.random() < 0.3:
+        # Parte de un nombre o de un CUE, como se tipea
+        filtros['nombre' if azar.random() < 0.5 else 'cue'] = azar.choice(datos['terminos'])
+    ruta = f"{reverse('resultados_busqueda')}?{urllib.parse.urlencode(filtros)}"
+    yield 'resultados', ruta
+    if azar.random() < 0.3:
+        yield 'resultados', f'{ruta}&page=2'
+    if datos['cues'] and azar.random() < 0.5:
+        yield 'detalle', reverse('detalle_escuela', args=[azar.choice(datos['cues'])])
+
+
+def sesion_dashboard(azar, datos):
+    yield 'inicio', reverse('home')
+    yield 'dashboard', reverse('dashboard')
+
+
+def sesion_reportes(azar, datos):
+    yield 'reportes', reverse('reportes_generales')
+    if datos['regiones']:
+        region = azar.choice(datos['regiones'])
+        yield 'reportes', f"{reverse('reportes_generales')}?{urllib.parse.urlencode({'region': region, 'distrito': ''})}"
+    yield 'reportes', reverse(azar.choice(['reporte_internet', 'reporte_piso']))
+
+
+# nombre -> (peso, generador)
+ESCENARIOS = {
+    'mapa': (6, sesion_mapa),
+    'busqueda': (2, sesion_busqueda),
+    'dashboard': (2, sesion_dashboard),
+    'reportes': (1, sesion_reportes),
+}
+
+
+def datos_de_prueba(semilla=None):
+    """
+    CUEs y regiones de la base (la misma que usa el servidor) y términos de
+    búsqueda. Las escuelas se leen en orden de CUE y se sortean con la
+    semilla: con la misma semilla y los mismos datos sale la misma muestra.
+    """
+    escuelas = list(Escuela.objects.order_by('cue').values_list('cue', 'nombre'))
+    muestra = random.Random(semilla).sample(escuelas, min(MUESTRA_ESCUELAS, len(escuelas)))
+    cues = [cue for cue, _ in muestra]
+    nombres = [nombre for _, nombre in muestra[:50]]
+    terminos = sorted({palabra for nombre in nombres for palabra in nombre.split() if len(palabra) > 3})
+    return {
+        'cues': cues,
+        'regiones': [region['id'] for region in arbol_geografico()['regiones']],
+        'terminos': terminos + [cue[:5] for cue in cues[:20]] or ['Escuela'],
+    }
+
+
+# -------------------------------------------------------------------------
+# EJECUCIÓN
+# -------------------------------------------------------------------------
+
+class Cliente:
+    """Conexión HTTP keep-alive de un usuario virtual; se reabre si se corta."""
+
+    def __init__(self, base):
+        url = urllib.parse.urlsplit(base)
+        self.clase = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.host = url.netloc
+        self.prefijo = url.path.rstrip('/')
+        self.conexion = None
+
+    def get(self, ruta):
+        """(código de estado o None si falló la conexión, segundos, cuerpo)."""
+        inicio = time.perf_counter()
+        try:
+            if self.conexion is None:
+                self.conexion = self.clase(self.host, timeout=TIMEOUT_PEDIDO)
+            self.conexion.request('GET', self.prefijo + ruta)
+            respuesta = self.conexion.getresponse()
+            cuerpo = respuesta.read()
+            estado = respuesta.status
+        except (OSError, http.client.HTTPException):
+            self.cerrar()
+            estado, cuerpo = None, None
+        return estado, time.perf_counter() - inicio, cuerpo
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+
+def correr(base, usuarios=10, duracion=30, escenarios=None, pausa=0.0, semilla=None):
+    """
+    Corre la prueba y devuelve (muestras, segundos), con muestras =
+    {tipo de pedido: [(estado, segundos), ...]}.
+    """
+    escenarios = {nombre: ESCENARIOS[nombre] for nombre in (escenarios or ESCENARIOS)}
+    nombres = list(escenarios)
+    pesos = [escenarios[nombre][0] for nombre in nombres]
+    datos = datos_de_prueba(semilla)
+    muestras = {}
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def usuario(numero):
+        azar = random.Random(None if semilla is None else semilla + numero)
+        cliente = Cliente(base)
+        propias = {}
+        while time.monotonic() < fin:
+            sesion = escenarios[azar.choices(nombres, pesos)[0]][1](azar, datos)
+            try:
+                tipo, ruta = next(sesion)
+                while time.monotonic() < fin:
+                    estado, segundos, cuerpo = cliente.get(ruta)
+                    propias.setdefault(tipo, []).append((estado, segundos))
+                    if pausa:
+                        time.sleep(azar.expovariate(1 / pausa))
+                    tipo, ruta = sesion.send(cuerpo if estado == 200 else None)
+            except StopIteration:
+                pass
+        cliente.cerrar()
+        with lock:
+            for tipo, lista in propias.items():
+                muestras.setdefault(tipo, []).extend(lista)
+
+    inicio = time.monotonic()
+    hilos = [threading.Thread(target=usuario, args=(n,)) for n in range(usuarios)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return muestras, time.monotonic() - inicio
+
+
+def levantar_servidor(puerto):
+    """Arranca gunicorn con gunicorn.conf.py y la configuración actual; espera a que responda."""
+    entorno = dict(os.environ, PORT=str(puerto))
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=settings.BASE_DIR, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    cliente = Cliente(f'http://127.0.0.1:{puerto}')
+    limite = time.monotonic() + ESPERA_SERVIDOR
+    while time.monotonic() < limite and proceso.poll() is None:
+        if cliente.get(reverse('home'))[0] == 200:
+            cliente.cerrar()
+            return proceso
+        time.sleep(0.5)
+    proceso.terminate()
+    raise RuntimeError('El servidor no respondió a tiempo (ver gunicorn.conf.py y DATABASE_URL).')
+
+
+# -------------------------------------------------------------------------
+# RESULTADOS
+# -------------------------------------------------------------------------
+
+def percentil(ordenados, p):
+    """Percentil (rango más cercano) de una lista ordenada."""
+    if not ordenados:
+        return None
+    return ordenados[max(1, math.ceil(p * len(ordenados) / 100)) - 1]
+
+
+def _resumir(lista, segundos):
+    tiempos = sorted(t for _, t in lista)
+    errores = sum(1 for estado, _ in lista if estado is None or estado >= 400)
+    milisegundos = lambda valor: round(valor * 1000, 1) if valor is not None else None
+    return {
+        'pedidos': len(lista),
+        'por_segundo': round(len(lista) / segundos, 1) if segundos else 0,
+        'errores': errores,
+        'porcentaje_errores': round(100 * errores / len(lista), 2) if lista else 0,
+        'p50_ms': milisegundos(percentil(tiempos, 50)),
+        'p95_ms': milisegundos(percentil(tiempos, 95)),
+        'p99_ms': milisegundos(percentil(tiempos, 99)),
+    }
+
+
+def resumen(muestras, segundos):
+    """{'rutas': {tipo: cifras}, 'total': cifras}"""
+    return {
+        'rutas': {tipo: _resumir(lista, segundos) for tipo, lista in sorted(muestras.items())},
+        'total': _resumir([m for lista in muestras.values() for m in lista], segundos),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def guardar(directorio, datos, parametros, etiqueta=''):
+    """Guarda la corrida en <directorio>/carga-<fecha>[-etiqueta].json y devuelve la ruta."""
+    ahora = datetime.now()
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    nombre = f"carga-{ahora:%Y%m%d-%H%M%S}{'-' + etiqueta if etiqueta else ''}.json"
+    contenido = {
+        'fecha': ahora.isoformat(timespec='seconds'),
+        'etiqueta': etiqueta,
+        'commit': _commit(),
+        'parametros': parametros,
+        'perfil': {variable: os.environ[variable] for variable in VARIABLES_PERFIL if variable in os.environ},
+        'escuelas': Escuela.objects.count(),
+        'resultado': datos,
+    }
+    ruta = directorio / nombre
+    ruta.write_text(json.dumps(contenido, indent=2, ensure_ascii=False), encoding='utf-8')
+    return ruta
+
+
+def leer(ruta):
+    return json.loads(Path(ruta).read_text(encoding='utf-8'))
+
+
+def comparar(anterior, actual):
+    """
+    Diferencias por tipo de pedido entre dos resultados (resumen()):
+    [(tipo, {'cifra': (antes, ahora, variación %)})] para pedidos/s, p50, p95,
+    p99 y errores.
+    """
+    cifras = ('por_segundo', 'p50_ms', 'p95_ms', 'p99_ms', 'porcentaje_errores')
+    filas = dict(anterior['rutas'], TOTAL=anterior['total'])
+    nuevas = dict(actual['rutas'], TOTAL=actual['total'])
+    resultado = []
+    for tipo in [t for t in nuevas if t in filas]:
+        fila = {}
+        for cifra in cifras:
+            antes, ahora = filas[tipo].get(cifra), nuevas[tipo].get(cifra)
+            variacion = round(100 * (ahora - antes) / antes, 1) if antes and ahora is not None else None
+            fila[cifra] = (antes, ahora, variacion)
+        resultado.append((tipo, fila))
+    return resultado
@@ -0,0 +1,37 @@
+#gestor/catalogos.py
+"""
+Catálogos precalculados y cacheados bajo la versión de los catálogos (ver
+revision.py): no dependen de las escuelas, así que un cambio de datos no los
+recalcula, y el alta, modificación o baja de una región, distrito o ciudad
+los deja obsoletos en todos los procesos.
+"""
+import hashlib
+import json
+
+from .models import Ciudad, Distrito, Region
+from .revision import cacheado, version_catalogos
+
+
+def arbol_geografico():
+    """
+    Jerarquía Región -> Distrito -> Ciudad en listas planas, lista para
+    filtrar en el navegador:
+        {'regiones': [{id, nombre}], 'distritos': [{id, nombre, region_id}],
+         'ciudades': [{id, nombre, distrito_id}], 'version': str}
+    'version' cambia cuando cambia el contenido y sirve para versionar la URL.
+    Son tres consultas la primera vez; después sale de la caché.
+    """
+    return cacheado(f'gestor:arbol_geografico:{version_catalogos()}', _calcular_arbol)
+
+
+def _calcular_arbol():
+    arbol = {
+        'regiones': list(Region.objects.order_by('nombre').values('id', 'nombre')),
+        'distritos': list(Distrito.objects.order_by('nombre').values('id', 'nombre', 'region_id')),
+        'ciudades': list(Ciudad.objects.order_by('nombre').values('id', 'nombre', 'distrito_id')),
+    }
+    arbol['version'] = hashlib.sha1(
+        json.dumps(arbol, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:12]
+    return arbol
+
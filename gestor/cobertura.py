@@ -0,0 +1,116 @@
+#gestor/cobertura.py
+"""
+Indicadores de cobertura para el dashboard y los reportes generales.
+
+Además de contar escuelas, pondera por matrícula: cuántos alumnos asisten a
+escuelas con Internet o con piso tecnológico. Cantidades y matrícula salen
+de la misma pasada de agregación (Count y Sum con filter=), así agregar la
+métrica ponderada no suma consultas. Las cifras de cada página se cachean
+bajo la revisión de datos (y los filtros), con las mismas claves que usa
+el precalentamiento (ver precalentar.py).
+"""
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Categoria, Escuela
+from .revision import cacheado, clave_cache
+
+
+CON_INTERNET = Q(tiene_internet=True)
+CON_PISO = Q(tiene_piso_tecnologico=True)
+
+# 'matricula' ya es un campo de Escuela: la suma lleva otro nombre
+COMPONENTES = {
+    'total_escuelas': Count('id'),
+    'con_internet': Count('id', filter=CON_INTERNET),
+    'con_piso': Count('id', filter=CON_PISO),
+    'matricula_total': Coalesce(Sum('matricula'), 0),
+    'matricula_con_internet': Coalesce(Sum('matricula', filter=CON_INTERNET), 0),
+    'matricula_con_piso': Coalesce(Sum('matricula', filter=CON_PISO), 0),
+}
+
+
+def porcentaje(parte, total, decimales=1):
+    return round(100.0 * parte / total, decimales) if total else 0.0
+
+
+def completar(conteos, decimales=1):
+    """Agrega a los componentes los complementos y los porcentajes (por escuelas y por matrícula)."""
+    total, matricula = conteos['total_escuelas'], conteos['matricula_total']
+    conteos.update(
+        sin_internet=total - conteos['con_internet'],
+        sin_piso=total - conteos['con_piso'],
+        matricula_sin_internet=matricula - conteos['matricula_con_internet'],
+        matricula_sin_piso=matricula - conteos['matricula_con_piso'],
+        porcentaje_internet=porcentaje(conteos['con_internet'], total, decimales),
+        porcentaje_piso=porcentaje(conteos['con_piso'], total, decimales),
+        porcentaje_matricula_internet=porcentaje(conteos['matricula_con_internet'], matricula, decimales),
+        porcentaje_matricula_piso=porcentaje(conteos['matricula_con_piso'], matricula, decimales),
+    )
+    return conteos
+
+
+def totales(queryset, decimales=1, **extras):
+    """
+    Totales de cobertura del queryset en una sola consulta. 'extras' son
+    agregados adicionales que viajan en la misma pasada (por ejemplo, conteos
+    por programa en el dashboard).
+    """
+    return completar(queryset.aggregate(**COMPONENTES, **extras), decimales)
+
+
+def por_categoria(queryset):
+    """Cobertura por categoría (las que tienen escuelas en el queryset), en una consulta."""
+    filas = (
+        queryset.filter(categoria__isnull=False)
+        .values('categoria_id', 'categoria__nombre')
+        .annotate(**COMPONENTES)
+        .order_by('categoria__nombre')
+    )
+    # 'nombre' también es un campo de Escuela: se renombra fuera de la consulta
+    return [completar(dict(fila, nombre=fila.pop('categoria__nombre'))) for fila in filas]
+
+
+# -------------------------------------------------------------------------
+# CIFRAS CACHEADAS DE CADA PÁGINA
+# -------------------------------------------------------------------------
+
+# Conectadas por PNCE: estado de conectividad EXACTAMENTE 'PNCE'.
+# Conectadas por PBA: 'PBA' o 'PNCE - PBA'.
+PROGRAMAS = {
+    'conectadas_pnce': Count('id', filter=CON_INTERNET & Q(internet_estado__nombre__iexact='PNCE')),
+    'conectadas_pba': Count('id', filter=CON_INTERNET & (
+        Q(internet_estado__nombre__iexact='PBA') | Q(internet_estado__nombre__iexact='PNCE - PBA')
+    )),
+}
+
+
+def dashboard():
+    """Totales globales y por programa (una consulta, porcentajes con dos decimales)."""
+    return cacheado(clave_cache('dashboard_totales'),
+                    lambda: totales(Escuela.objects.all(), decimales=2, **PROGRAMAS))
+
+
+def conectadas_por_categoria():
+    """Escuelas conectadas por categoría, para la gráfica de barras del dashboard."""
+    return cacheado(clave_cache('dashboard_categorias'), lambda: list(
+        Categoria.objects.filter(escuela__tiene_internet=True)
+        .annotate(total_conectadas=Count('escuela'))
+        .values('nombre', 'total_conectadas')
+    ))
+
+
+def generales():
+    """Totales de toda la provincia (reportes de Internet y de piso)."""
+    return cacheado(clave_cache('cobertura_totales'), lambda: totales(Escuela.objects.all()))
+
+
+def reporte_general(region_id=None, distrito_id=None):
+    """(totales, por_categoria) del reporte general con los filtros tal como llegan del GET."""
+    queryset = Escuela.objects.all()
+    if region_id:
+        queryset = queryset.filter(region_id=region_id)
+    if distrito_id:
+        queryset = queryset.filter(distrito_id=distrito_id)
+    return cacheado(clave_cache('reporte_general', region_id or '', distrito_id or ''),
+                    lambda: (totales(queryset), por_categoria(queryset)))
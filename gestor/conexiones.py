@@ -0,0 +1,86 @@
+#gestor/conexiones.py
+"""
+Estadísticas de las conexiones a la base de datos, por proceso.
+
+Cuenta los requests atendidos, las conexiones nuevas que abrió Django (con
+pool, cada vez que toma una del pool) y el máximo de requests simultáneos.
+Con eso se ve si las conexiones se están reusando (conexiones por request
+cerca de 0) y cuántas hacen falta por worker para dimensionar los procesos
+y el pool. Los contadores son del proceso que atiende el pedido: cada
+worker tiene los suyos (la respuesta incluye el pid).
+"""
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+_lock = threading.Lock()
+_contadores = {'pedidos': 0, 'activos': 0, 'max_activos': 0, 'conexiones_nuevas': 0}
+# Conexiones (DatabaseWrapper) creadas en este proceso, en cualquier hilo
+_conexiones = weakref.WeakSet()
+_inicio = time.monotonic()
+
+
+@receiver(request_started)
+def _pedido_iniciado(sender, **kwargs):
+    with _lock:
+        _contadores['pedidos'] += 1
+        _contadores['activos'] += 1
+        _contadores['max_activos'] = max(_contadores['max_activos'], _contadores['activos'])
+
+
+@receiver(request_finished)
+def _pedido_terminado(sender, **kwargs):
+    with _lock:
+        _contadores['activos'] = max(_contadores['activos'] - 1, 0)
+
+
+@receiver(connection_created)
+def _conexion_creada(sender, connection, **kwargs):
+    with _lock:
+        _contadores['conexiones_nuevas'] += 1
+        _conexiones.add(connection)
+
+
+def reiniciar():
+    """Contadores en cero (un worker recién creado no hereda los del proceso padre)."""
+    global _inicio
+    with _lock:
+        for clave in _contadores:
+            _contadores[clave] = 0
+        _conexiones.clear()
+        _inicio = time.monotonic()
+
+
+def _pool():
+    """Estadísticas del pool nativo de PostgreSQL, si está en uso."""
+    pool = getattr(connections['default'], 'pool', None)
+    return pool.get_stats() if pool is not None and hasattr(pool, 'get_stats') else None
+
+
+def estadisticas():
+    with _lock:
+        datos = dict(_contadores)
+        abiertas = sum(1 for conexion in _conexiones if conexion.connection is not None)
+    pedidos = datos['pedidos']
+    datos.update(
+        pid=os.getpid(),
+        segundos_activo=round(time.monotonic() - _inicio),
+        conexiones_abiertas=abiertas,
+        conexiones_por_pedido=round(datos['conexiones_nuevas'] / pedidos, 3) if pedidos else None,
+        configuracion={
+            'motor': settings.DATABASES['default'].get('ENGINE'),
+            'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE'),
+            'conn_health_checks': settings.DATABASES['default'].get('CONN_HEALTH_CHECKS'),
+            'pool': getattr(settings, 'DB_POOL', False),
+        },
+        pool=_pool(),
+    )
+    return datos
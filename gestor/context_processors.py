@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .revision import TTL_CACHE, revision_cache
+
+
+def revision(request):
+    """
+    Revisión de datos y catálogos y plazo para los {% cache %} de las
+    plantillas: los fragmentos se guardan por revisión y quedan obsoletos
+    cuando cambia. La revisión se lee solo si la plantilla la usa.
+    """
+    return {'revision_cache': SimpleLazyObject(revision_cache), 'ttl_cache': TTL_CACHE}
@@ -0,0 +1,105 @@
+#gestor/desnormalizacion.py
+"""
+Columnas de Escuela que apuntan a su servicio de conectividad y su piso
+tecnológico vigentes (servicio_vigente, piso_vigente) y copian sus datos,
+para que búsqueda, mapas y dashboard filtren sobre una sola tabla (sin joins
+a las relaciones inversas ni DISTINCT) y los lectores traigan el servicio y
+el piso con select_related.
+
+Vigente es la fila más reciente (mayor id) de cada escuela, salvo que esté
+dada de baja (fecha_baja): entonces la escuela no tiene servicio o piso
+vigente. Las filas anteriores y las dadas de baja se conservan como historial.
+
+sincronizar_escuelas() es el único lugar que las escribe. La llaman las
+señales de ServicioConectividad/PisoTecnologico (save y delete) y los
+caminos masivos de SeguimientoQuerySet (update, bulk_create, bulk_update),
+así que cualquier escritura de servicios o pisos las deja al día.
+
+También ajusta las banderas tiene_internet / tiene_piso_tecnologico al
+vínculo: una escuela tiene Internet si y solo si tiene un servicio vigente
+(el historial no cuenta). Las banderas son contenido de la escuela (cambian su hash y se
+registran en el RegistroCambio); las columnas derivadas no.
+"""
+from django.db.models import Case, F, OuterRef, Subquery, When
+from django.db.models.functions import ExtractYear
+
+from .models import TAMANO_LOTE, Escuela, PisoTecnologico, ServicioConectividad
+
+
+# Servicio y piso vigentes con sus catálogos, para select_related sobre Escuela
+RELACIONES_VIGENTES = (
+    'servicio_vigente__proveedor', 'servicio_vigente__estado_conectividad',
+    'servicio_vigente__metodo_solicitud',
+    'piso_vigente__proveedor', 'piso_vigente__plan_piso', 'piso_vigente__tipo_piso_instalado',
+)
+
+
+def _de_la_vigente(modelo, expresion):
+    """Valor de 'expresion' en la fila más reciente de la escuela, o NULL si está dada de baja."""
+    ultima = modelo.objects.filter(escuela=OuterRef('pk')).order_by('-pk')
+    valor = Case(When(fecha_baja__isnull=True, then=expresion), default=None)
+    return Subquery(ultima.annotate(valor=valor).values('valor')[:1])
+
+
+def valores_derivados():
+    """Expresiones para Escuela.update(): una subconsulta correlacionada por columna."""
+    def servicio(expresion):
+        return _de_la_vigente(ServicioConectividad, expresion)
+
+    def piso(expresion):
+        return _de_la_vigente(PisoTecnologico, expresion)
+
+    return {
+        'servicio_vigente_id': servicio(F('pk')),
+        'piso_vigente_id': piso(F('pk')),
+        'internet_estado_id': servicio(F('estado_conectividad_id')),
+        'internet_proveedor_id': servicio(F('proveedor_id')),
+        'internet_velocidad': servicio(F('velocidad_mbps')),
+        'internet_ano_instalacion': servicio(ExtractYear('fecha_instalacion')),
+        'internet_ano_mejora': servicio(ExtractYear('fecha_mejora')),
+        'piso_plan_id': piso(F('plan_piso_id')),
+        'piso_proveedor_id': piso(F('proveedor_id')),
+        'piso_ano_terminado': piso(ExtractYear('fecha_terminado')),
+    }
+
+
+def _sincronizar_banderas(lote):
+    """
+    Ajusta tiene_internet / tiene_piso_tecnologico al servicio y piso
+    vigentes (ya recalculados); solo actualiza las filas que difieren.
+    """
+    filas = Escuela.objects.filter(pk__in=lote).values_list(
+        'pk', 'tiene_internet', 'servicio_vigente_id', 'tiene_piso_tecnologico', 'piso_vigente_id',
+    )
+    cambios = {}
+    for pk, tiene_internet, servicio_id, tiene_piso, piso_id in filas:
+        con_servicio, con_piso = servicio_id is not None, piso_id is not None
+        if tiene_internet != con_servicio:
+            cambios.setdefault(('tiene_internet', con_servicio), []).append(pk)
+        if tiene_piso != con_piso:
+            cambios.setdefault(('tiene_piso_tecnologico', con_piso), []).append(pk)
+    corregidas = 0
+    for (campo, valor), pks in cambios.items():
+        # Update de SeguimientoQuerySet: refresca el hash y registra el cambio
+        corregidas += Escuela.objects.filter(pk__in=pks).update(**{campo: valor})
+    return corregidas
+
+
+def sincronizar_escuelas(escuela_ids):
+    """
+    Recalcula banderas y columnas derivadas de las escuelas indicadas.
+    Devuelve cuántas banderas se corrigieron.
+    """
+    escuela_ids = sorted(set(escuela_ids) - {None})
+    corregidas = 0
+    for i in range(0, len(escuela_ids), TAMANO_LOTE):
+        lote = escuela_ids[i:i + TAMANO_LOTE]
+        # _base_manager: las derivadas no cambian el hash ni la fecha de la escuela
+        Escuela._base_manager.filter(pk__in=lote).update(**valores_derivados())
+        corregidas += _sincronizar_banderas(lote)
+    return corregidas
+
+
+def sincronizar_todas():
+    """Recalcula todas las escuelas (después de cargas que esquivan el ORM)."""
+    return sincronizar_escuelas(Escuela.objects.values_list('pk', flat=True))
@@ -0,0 +1,191 @@
+#gestor/en_vuelo.py
+"""
+Cálculos compartidos ("single flight") para las consultas cacheadas.
+
+Cuando muchos usuarios abren el mapa o el dashboard a la vez, todos
+encuentran la caché vacía y lanzan la misma consulta en paralelo. Acá el
+primero que llega calcula y los demás esperan su turno; al entrar vuelven a
+mirar la caché y se llevan el resultado ya guardado, sin consultar la base.
+
+La clave de caché es la que identifica el cálculo: incluye la revisión de
+datos y los parámetros normalizados (ver revision.clave_cache).
+
+Dentro de un proceso, la espera es un Lock por clave (en las vistas
+síncronas) o una tarea asyncio compartida (en las asíncronas). Entre
+procesos se usa además un bloqueo de archivo en BLOQUEOS_DIR (un archivo
+por clave, que se borra al terminar), que tiene sentido cuando la caché
+también es compartida (CACHE_DIR); sin esa configuración, o en sistemas sin
+fcntl, cada proceso coalesce lo suyo. Nadie espera más de ESPERA_MAXIMA
+segundos: pasado ese plazo calcula por su cuenta.
+
+Un cálculo puede pedir otros valores compartidos (un reporte que usa el
+árbol geográfico): como cada clave tiene su propio bloqueo, solo espera a
+quien calcula esa misma clave.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo coalescencia dentro del proceso
+    fcntl = None
+
+
+ESPERA_MAXIMA = 30
+INTERVALO_ESPERA = 0.05
+
+_registro = threading.Lock()
+_candados = {}  # clave -> [Lock, cantidad de hilos que lo usan]
+_tareas = {}    # (id del event loop, clave) -> tarea en curso
+
+
+# -------------------------------------------------------------------------
+# BLOQUEOS
+# -------------------------------------------------------------------------
+
+@contextmanager
+def _candado_local(clave):
+    with _registro:
+        entrada = _candados.setdefault(clave, [threading.Lock(), 0])
+        entrada[1] += 1
+    adquirido = entrada[0].acquire(timeout=ESPERA_MAXIMA)
+    try:
+        yield
+    finally:
+        if adquirido:
+            entrada[0].release()
+        with _registro:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _candados[clave]
+
+
+def _ruta_archivo(clave):
+    """Archivo de bloqueo de la clave, o None si no hay bloqueo entre procesos."""
+    directorio = getattr(settings, 'BLOQUEOS_DIR', None)
+    if not directorio or fcntl is None:
+        return None
+    os.makedirs(directorio, exist_ok=True)
+    return os.path.join(directorio, hashlib.sha1(clave.encode('utf-8')).hexdigest() + '.lock')
+
+
+def _intentar(ruta):
+    """
+    Abre el archivo y toma el bloqueo sin esperar. Devuelve el archivo
+    bloqueado o None. El archivo se borra al liberar, así que un bloqueo
+    tomado sobre un archivo que ya no está en 'ruta' no vale.
+    """
+    archivo = open(ruta, 'a')
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if os.path.exists(ruta) and os.path.samestat(os.fstat(archivo.fileno()), os.stat(ruta)):
+            return archivo
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    archivo.close()
+    return None
+
+
+def _liberar(ruta, archivo):
+    if archivo is None:
+        return
+    # Se borra antes de soltar el bloqueo: quien lo abrió antes lo detecta en _intentar
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+    archivo.close()
+
+
+@contextmanager
+def _candado_archivo(clave):
+    ruta = _ruta_archivo(clave)
+    if ruta is None:
+        yield
+        return
+    limite = time.monotonic() + ESPERA_MAXIMA
+    archivo = _intentar(ruta)
+    while archivo is None and time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        archivo = _intentar(ruta)
+    try:
+        yield
+    finally:
+        _liberar(ruta, archivo)
+
+
+@asynccontextmanager
+async def _acandado_archivo(clave):
+    ruta = _ruta_archivo(clave)
+    if ruta is None:
+        yield
+        return
+    limite = time.monotonic() + ESPERA_MAXIMA
+    archivo = _intentar(ruta)
+    while archivo is None and time.monotonic() < limite:
+        await asyncio.sleep(INTERVALO_ESPERA)
+        archivo = _intentar(ruta)
+    try:
+        yield
+    finally:
+        _liberar(ruta, archivo)
+
+
+@contextmanager
+def turno(clave):
+    """
+    Sección exclusiva para calcular 'clave': un hilo por proceso y, si está
+    configurado, un proceso a la vez. Adentro hay que volver a mirar la caché.
+    """
+    with _candado_local(clave), _candado_archivo(clave):
+        yield
+
+
+# -------------------------------------------------------------------------
+# CÁLCULO COMPARTIDO
+# -------------------------------------------------------------------------
+
+def compartido(clave, calcular, ttl):
+    """Valor cacheado bajo 'clave'; si falta, lo calcula una sola vez entre los que lo piden."""
+    valor = cache.get(clave)
+    if valor is None:
+        with turno(clave):
+            valor = cache.get(clave)
+            if valor is None:
+                valor = calcular()
+                cache.set(clave, valor, ttl)
+    return valor
+
+
+async def _acalcular(clave, calcular, ttl):
+    async with _acandado_archivo(clave):
+        valor = await cache.aget(clave)
+        if valor is None:
+            valor = await calcular()
+            await cache.aset(clave, valor, ttl)
+    return valor
+
+
+async def acompartido(clave, calcular, ttl):
+    """
+    Versión asíncrona de compartido(): 'calcular' es una función async. Los
+    pedidos concurrentes del mismo proceso esperan la misma tarea.
+    """
+    valor = await cache.aget(clave)
+    if valor is not None:
+        return valor
+    llave = (id(asyncio.get_running_loop()), clave)
+    tarea = _tareas.get(llave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_acalcular(clave, calcular, ttl))
+        _tareas[llave] = tarea
+        tarea.add_done_callback(lambda _: _tareas.pop(llave, None))
+    # shield: si un pedido se cancela (el cliente cortó), la tarea sigue para los demás
+    return await asyncio.shield(tarea)
@@ -0,0 +1,218 @@
+#gestor/espacial.py
+"""
+Índice espacial en memoria para búsquedas por cercanía.
+
+Las escuelas se reparten en una grilla de celdas de TAMANO_CELDA grados;
+una búsqueda solo recorre las celdas alrededor del punto, no toda la tabla.
+El índice se arma con una consulta y vive en memoria del proceso hasta que
+cambia la revisión de datos (no va a la caché compartida: serializar miles
+de escuelas en cada pedido costaría más que la búsqueda).
+"""
+import math
+import threading
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import Escuela
+from .revision import revision_datos
+
+
+# ~5,5 km de lado en latitud; en la provincia, ~4,5 km en longitud
+TAMANO_CELDA = 0.05
+
+RADIO_TIERRA_KM = 6371.0088
+KM_POR_GRADO = math.pi * RADIO_TIERRA_KM / 180
+
+MAX_VECINOS = 200
+MAX_RADIO_KM = 300
+MAX_RESULTADOS_RADIO = 1000
+
+
+def distancia_km(lat1, lng1, lat2, lng2):
+    """Distancia en km por la fórmula del haversine."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _celda(lat, lng):
+    return math.floor(lat / TAMANO_CELDA), math.floor(lng / TAMANO_CELDA)
+
+
+class IndiceEspacial:
+    """Grilla de escuelas con coordenadas. Los filtros se aplican al recorrer."""
+
+    def __init__(self, filas):
+        self.escuelas = []
+        self.celdas = defaultdict(list)
+        self.por_cue = {}
+        self.por_predio = defaultdict(list)
+        max_lat_abs = 0.0
+        for fila in filas:
+            escuela = dict(fila)
+            escuela['latitud'] = float(escuela['latitud'])
+            escuela['longitud'] = float(escuela['longitud'])
+            indice = len(self.escuelas)
+            self.escuelas.append(escuela)
+            self.celdas[_celda(escuela['latitud'], escuela['longitud'])].append(indice)
+            self.por_cue[escuela['cue']] = indice
+            self.por_predio[escuela.pop('numero_predio')].append(indice)
+            max_lat_abs = max(max_lat_abs, abs(escuela['latitud']))
+
+        # Km mínimos que separan dos anillos de celdas (la longitud se achica con la latitud)
+        self.km_por_anillo = TAMANO_CELDA * KM_POR_GRADO * math.cos(math.radians(min(max_lat_abs, 89)))
+        if self.celdas:
+            filas_celda = [c[0] for c in self.celdas]
+            columnas_celda = [c[1] for c in self.celdas]
+            self.extension = (min(filas_celda), max(filas_celda), min(columnas_celda), max(columnas_celda))
+        else:
+            self.extension = None
+
+    @classmethod
+    def construir(cls):
+        return cls(
+            Escuela.objects.exclude(latitud=None).exclude(longitud=None)
+            .values('cue', 'nombre', 'latitud', 'longitud', 'tiene_internet',
+                    'tiene_piso_tecnologico', 'region_id', 'distrito_id', 'internet_estado_id',
+                    numero_predio=F('predio__numero_predio'))
+        )
+
+    # ---------------------------------------------------------------------
+
+    def _anillo(self, centro, r):
+        """Celdas a distancia de Chebyshev exactamente r de la celda centro."""
+        fila, columna = centro
+        if r == 0:
+            yield centro
+            return
+        for dc in range(-r, r + 1):
+            yield fila - r, columna + dc
+            yield fila + r, columna + dc
+        for df in range(-r + 1, r):
+            yield fila + df, columna - r
+            yield fila + df, columna + r
+
+    def _anillos_hasta_cubrir(self, centro):
+        """Cantidad de anillos necesaria para recorrer toda la grilla desde el centro."""
+        if not self.extension:
+            return 0
+        min_f, max_f, min_c, max_c = self.extension
+        return max(abs(centro[0] - min_f), abs(centro[0] - max_f),
+                   abs(centro[1] - min_c), abs(centro[1] - max_c))
+
+    def _primer_anillo_con_celdas(self, centro):
+        """Anillos más cercanos que este están fuera de la grilla: se saltean."""
+        if not self.extension:
+            return 0
+        min_f, max_f, min_c, max_c = self.extension
+        return max(min_f - centro[0], centro[0] - max_f, min_c - centro[1], centro[1] - max_c, 0)
+
+    def _candidatos(self, celdas, filtro, excluir):
+        for celda in celdas:
+            for indice in self.celdas.get(celda, ()):
+                if indice == excluir:
+                    continue
+                escuela = self.escuelas[indice]
+                if filtro(escuela):
+                    yield escuela
+
+    def cercanas(self, lat, lng, k, filtro, excluir=None):
+        """Las k escuelas más cercanas que cumplen el filtro, ordenadas por distancia."""
+        centro = _celda(lat, lng)
+        encontrados = []
+        limite = self._anillos_hasta_cubrir(centro)
+        r = self._primer_anillo_con_celdas(centro)
+        while r <= limite:
+            for escuela in self._candidatos(self._anillo(centro, r), filtro, excluir):
+                encontrados.append((distancia_km(lat, lng, escuela['latitud'], escuela['longitud']), escuela))
+            # Todo lo que quede fuera del anillo r está a más de r anillos de distancia
+            if len(encontrados) >= k:
+                encontrados.sort(key=lambda par: par[0])
+                encontrados = encontrados[:k]
+                if encontrados[-1][0] <= r * self.km_por_anillo:
+                    break
+            r += 1
+        encontrados.sort(key=lambda par: par[0])
+        return encontrados[:k]
+
+    def en_radio(self, lat, lng, km, filtro, excluir=None):
+        """Escuelas a menos de km kilómetros que cumplen el filtro, ordenadas por distancia."""
+        dlat = km / KM_POR_GRADO
+        dlng = km / (KM_POR_GRADO * max(math.cos(math.radians(lat)), 0.01))
+        f0, c0 = _celda(lat - dlat, lng - dlng)
+        f1, c1 = _celda(lat + dlat, lng + dlng)
+        if self.extension:
+            f0, f1 = max(f0, self.extension[0]), min(f1, self.extension[1])
+            c0, c1 = max(c0, self.extension[2]), min(c1, self.extension[3])
+        celdas = ((f, c) for f in range(f0, f1 + 1) for c in range(c0, c1 + 1))
+        resultado = []
+        for escuela in self._candidatos(celdas, filtro, excluir):
+            distancia = distancia_km(lat, lng, escuela['latitud'], escuela['longitud'])
+            if distancia <= km:
+                resultado.append((distancia, escuela))
+        resultado.sort(key=lambda par: par[0])
+        return resultado
+
+    def centro_predio(self, numero_predio):
+        """Centroide de las escuelas del predio, o None si no tiene escuelas ubicadas."""
+        indices = self.por_predio.get(numero_predio)
+        if not indices:
+            return None
+        lat = sum(self.escuelas[i]['latitud'] for i in indices) / len(indices)
+        lng = sum(self.escuelas[i]['longitud'] for i in indices) / len(indices)
+        return lat, lng
+
+
+# -------------------------------------------------------------------------
+# FILTROS
+# -------------------------------------------------------------------------
+
+def filtro_desde_parametros(params):
+    """
+    Arma el filtro con los mismos parámetros que los mapas: region, distrito,
+    tiene_internet, tiene_piso, estado_conectividad. Lanza ValueError si
+    algún id no es numérico.
+    """
+    condiciones = []
+    for parametro, campo in (('region', 'region_id'), ('distrito', 'distrito_id')):
+        valor = params.get(parametro)
+        if valor:
+            if not valor.isdigit():
+                raise ValueError(f'Valor inválido para {parametro}')
+            valor = int(valor)
+            condiciones.append(lambda e, campo=campo, valor=valor: e[campo] == valor)
+    for parametro, campo in (('tiene_internet', 'tiene_internet'), ('tiene_piso', 'tiene_piso_tecnologico')):
+        valor = params.get(parametro)
+        if valor in ('1', '0'):
+            condiciones.append(lambda e, campo=campo, valor=(valor == '1'): bool(e[campo]) == valor)
+    estado = params.get('estado_conectividad')
+    if estado:
+        if not estado.isdigit():
+            raise ValueError('Valor inválido para estado_conectividad')
+        estado = int(estado)
+        condiciones.append(lambda e: e['internet_estado_id'] == estado)
+    return lambda escuela: all(condicion(escuela) for condicion in condiciones)
+
+
+# -------------------------------------------------------------------------
+# ÍNDICE POR REVISIÓN
+# -------------------------------------------------------------------------
+
+_indice = None
+_revision_indice = None
+_lock = threading.Lock()
+
+
+def indice():
+    """Índice vigente para la revisión actual; se reconstruye cuando cambian los datos."""
+    global _indice, _revision_indice
+    revision = revision_datos()
+    if _indice is None or _revision_indice != revision:
+        with _lock:
+            if _indice is None or _revision_indice != revision:
+                _indice = IndiceEspacial.construir()
+                _revision_indice = revision
+    return _indice
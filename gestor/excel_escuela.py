@@ -0,0 +1,187 @@
+#gestor/excel_escuela.py
+"""
+Generación del Excel de detalle de una escuela a partir de una plantilla.
+
+La plantilla (estilos con nombre, bloque de información general y anchos de
+columna) se arma una sola vez por proceso y se guarda en memoria como bytes;
+cada reporte la carga y solo completa los valores. Este módulo no usa el ORM:
+recibe diccionarios con tipos simples para poder renderizar en procesos
+separados (ver generar_zip).
+"""
+import io
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+import openpyxl
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+TITULO_HOJA = "Reporte de Escuela"
+
+ETIQUETAS_GENERALES = [
+    ('nombre', "Nombre"),
+    ('cue', "CUE"),
+    ('clave_provincial', "Clave Provincial"),
+    ('direccion', "Dirección"),
+    ('matricula', "Matrícula"),
+    ('dependencia', "Dependencia"),
+    ('ambito', "Ámbito"),
+    ('turno', "Turno"),
+    ('categoria', "Categoría"),
+    ('tipo_establecimiento', "Tipo de Establecimiento"),
+    ('region', "Región"),
+    ('distrito', "Distrito"),
+    ('ciudad', "Ciudad"),
+    ('predio', "Predio"),
+    ('latitud', "Latitud"),
+    ('longitud', "Longitud"),
+    ('tiene_internet', "Tiene Internet"),
+    ('tiene_piso_tecnologico', "Tiene Piso Tecnológico"),
+]
+
+HEADERS_CONECTIVIDAD = ["Proveedor", "Estado", "Velocidad (Mbps)", "Método de Solicitud", "Fecha de Instalación", "Fecha de Mejora", "Observaciones"]
+HEADERS_PISO = ["Proveedor", "Tipo de Piso", "Plan de Piso", "Tipo de Mejora", "Fecha de Finalización", "Fecha de Mejora", "Observaciones"]
+
+COLUMNAS = 7
+FILA_PRIMER_DATO = 2
+FILA_CONECTIVIDAD = FILA_PRIMER_DATO + len(ETIQUETAS_GENERALES) + 2
+
+# Máximo de procesos para el modo lote (configurable por entorno)
+MAX_PROCESOS = int(os.getenv('EXCEL_LOTE_PROCESOS', min(4, os.cpu_count() or 1)))
+
+
+# -------------------------------------------------------------------------
+# PLANTILLA
+# -------------------------------------------------------------------------
+
+def _estilos():
+    borde_fino = Border(left=Side(style='thin'),
+                        right=Side(style='thin'),
+                        top=Side(style='thin'),
+                        bottom=Side(style='thin'))
+    relleno_cabecera = PatternFill(start_color="D6EAF8", end_color="D6EAF8", fill_type="solid")
+    return [
+        NamedStyle(name='gestor_titulo', font=Font(bold=True), fill=relleno_cabecera,
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle(name='gestor_etiqueta', font=Font(bold=True)),
+        NamedStyle(name='gestor_cabecera', font=Font(bold=True), fill=relleno_cabecera, border=borde_fino),
+        NamedStyle(name='gestor_celda', border=borde_fino),
+        NamedStyle(name='gestor_vacio', font=Font(italic=True), alignment=Alignment(horizontal='center')),
+    ]
+
+
+@lru_cache(maxsize=1)
+def plantilla():
+    """Arma la plantilla una vez por proceso y la devuelve serializada."""
+    workbook = openpyxl.Workbook()
+    for estilo in _estilos():
+        workbook.add_named_style(estilo)
+
+    hoja = workbook.active
+    hoja.title = TITULO_HOJA
+
+    # Bloque de Información General (etiquetas fijas)
+    hoja.merge_cells(start_row=1, start_column=1, end_row=1, end_column=2)
+    hoja['A1'] = "INFORMACIÓN GENERAL"
+    hoja['A1'].style = 'gestor_titulo'
+    for fila, (_, etiqueta) in enumerate(ETIQUETAS_GENERALES, FILA_PRIMER_DATO):
+        hoja.cell(row=fila, column=1, value=etiqueta).style = 'gestor_etiqueta'
+
+    # Ajustar ancho de columnas
+    for col in range(1, COLUMNAS + 1):
+        hoja.column_dimensions[get_column_letter(col)].width = 25
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# -------------------------------------------------------------------------
+# RENDERIZADO
+# -------------------------------------------------------------------------
+
+def _seccion(hoja, fila, titulo, headers, filas, mensaje_vacio):
+    """Escribe un bloque (título, cabecera y filas) y devuelve la siguiente fila libre."""
+    hoja.merge_cells(start_row=fila, start_column=1, end_row=fila, end_column=COLUMNAS)
+    hoja.cell(row=fila, column=1, value=titulo).style = 'gestor_titulo'
+    fila += 1
+
+    for col_num, header in enumerate(headers, 1):
+        hoja.cell(row=fila, column=col_num, value=header).style = 'gestor_cabecera'
+    fila += 1
+
+    if filas:
+        for valores in filas:
+            for col_num, valor in enumerate(valores, 1):
+                # El estilo va antes del valor: así openpyxl conserva el formato de las fechas
+                celda = hoja.cell(row=fila, column=col_num)
+                celda.style = 'gestor_celda'
+                celda.value = valor
+            fila += 1
+    else:
+        hoja.merge_cells(start_row=fila, start_column=1, end_row=fila, end_column=COLUMNAS)
+        hoja.cell(row=fila, column=1, value=mensaje_vacio).style = 'gestor_vacio'
+        fila += 1
+    return fila
+
+
+def renderizar(datos):
+    """Completa la plantilla con los datos de una escuela (ver views._datos_excel_escuela)."""
+    workbook = openpyxl.load_workbook(io.BytesIO(plantilla()))
+    hoja = workbook[TITULO_HOJA]
+
+    for fila, (clave, _) in enumerate(ETIQUETAS_GENERALES, FILA_PRIMER_DATO):
+        hoja.cell(row=fila, column=2, value=datos['general'][clave])
+
+    fila = _seccion(hoja, FILA_CONECTIVIDAD, "DETALLES DE CONECTIVIDAD", HEADERS_CONECTIVIDAD,
+                    datos['servicios'], "No hay datos de conectividad.")
+    _seccion(hoja, fila + 2, "DETALLES DE PISO TECNOLÓGICO", HEADERS_PISO,
+             datos['pisos'], "No hay datos de piso tecnológico.")
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# -------------------------------------------------------------------------
+# MODO LOTE
+# -------------------------------------------------------------------------
+
+_pool = None
+
+
+def _obtener_pool():
+    """Pool de procesos compartido; 'spawn' evita heredar conexiones del proceso web."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=MAX_PROCESOS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=plantilla,
+        )
+    return _pool
+
+
+def generar_zip(lista_datos):
+    """Devuelve un ZIP (bytes) con un Excel por escuela, renderizados en paralelo."""
+    global _pool
+    if len(lista_datos) <= 1 or MAX_PROCESOS <= 1:
+        libros = [renderizar(datos) for datos in lista_datos]
+    else:
+        try:
+            libros = list(_obtener_pool().map(renderizar, lista_datos, chunksize=8))
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. por memoria): se descarta el pool y se renderiza aquí
+            _pool = None
+            libros = [renderizar(datos) for datos in lista_datos]
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+        for datos, libro in zip(lista_datos, libros):
+            archivo_zip.writestr(f"escuela_{datos['general']['cue']}.xlsx", libro)
+    return buffer.getvalue()
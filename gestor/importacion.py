@@ -0,0 +1,450 @@
+#gestor/importacion.py
+"""
+Lógica compartida de la carga masiva por CSV.
+
+Cada fila del archivo (y cada escuela ya guardada) se lleva a un "registro
+normalizado": un diccionario de strings con el mismo formato de la
+exportación. Comparando el hash de ambos registros se clasifica la fila como
+nueva, modificada o sin cambios, y solo se escriben las que realmente cambian.
+"""
+import csv
+import hashlib
+import io
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .desnormalizacion import RELACIONES_VIGENTES
+from .models import (
+    Escuela, Region, Predio, Distrito, TipoEstablecimiento, Categoria,
+    ServicioConectividad, PisoTecnologico, Dependencia, Ambito, Turno,
+    Ciudad, PlanPiso, EstadoConectividad,
+    ProveedorInternet, ProveedorPisoTecnologico,
+    TipoPisoTecnologico, MetodoSolicitud, ImportacionPendiente, calcular_hash_contenido,
+)
+
+
+# Orden de las columnas del CSV (igual que en exportar_datos y la plantilla)
+CAMPOS_FILA = [
+    'cue', 'clave_provincial', 'nombre', 'direccion', 'matricula',
+    'latitud', 'longitud',
+
+    'region', 'distrito', 'ciudad', 'ambito', 'dependencia', 'turno', 'categoria',
+    'tipo_establecimiento', 'numero_predio',
+
+    'internet_tiene', 'internet_proveedor', 'internet_velocidad',
+    'internet_estado', 'internet_fecha', 'internet_metodo', 'internet_obs',
+
+    'piso_tiene', 'piso_proveedor', 'piso_plan',
+    'piso_tipo', 'piso_fecha', 'piso_mejora', 'piso_obs',
+]
+
+# Campos de catálogo de la escuela y el modelo al que apuntan
+CATALOGOS_ESCUELA = {
+    'region': Region,
+    'distrito': Distrito,
+    'ciudad': Ciudad,
+    'ambito': Ambito,
+    'dependencia': Dependencia,
+    'turno': Turno,
+    'categoria': Categoria,
+    'tipo_establecimiento': TipoEstablecimiento,
+}
+
+CAMPOS_INTERNET = [c for c in CAMPOS_FILA if c.startswith('internet_') and c != 'internet_tiene']
+CAMPOS_PISO = [c for c in CAMPOS_FILA if c.startswith('piso_') and c != 'piso_tiene']
+
+SEIS_DECIMALES = Decimal('0.000001')
+
+
+# -------------------------------------------------------------------------
+# NORMALIZACIÓN
+# -------------------------------------------------------------------------
+
+def _texto(valor):
+    """Convierte a string sin espacios; None pasa a cadena vacía."""
+    if valor is None:
+        return ''
+    return str(valor).strip()
+
+
+def _entero(valor):
+    return str(int(_texto(valor) or 0))
+
+
+def _coordenada(valor):
+    valor = _texto(valor)
+    if not valor:
+        return ''
+    try:
+        return str(Decimal(valor).quantize(SEIS_DECIMALES))
+    except InvalidOperation:
+        raise ValueError(f"Coordenada inválida: '{valor}'")
+
+
+def _fecha(valor):
+    valor = _texto(valor)
+    if not valor:
+        return ''
+    return datetime.strptime(valor, '%Y-%m-%d').date().isoformat()
+
+
+def _si_no(valor):
+    return '1' if _texto(valor).upper() in ('SÍ', 'SI', 'TRUE') else '0'
+
+
+def normalizar_fila(row):
+    """
+    Convierte una fila cruda del CSV en un registro normalizado.
+    Lanza ValueError/IndexError si la fila no es válida.
+    """
+    registro = {campo: _texto(row[i]) for i, campo in enumerate(CAMPOS_FILA)}
+
+    if not registro['numero_predio']:
+        raise ValueError("El número de predio no puede estar vacío.")
+
+    registro['matricula'] = _entero(registro['matricula'])
+    registro['numero_predio'] = _entero(registro['numero_predio'])
+    registro['latitud'] = _coordenada(registro['latitud'])
+    registro['longitud'] = _coordenada(registro['longitud'])
+
+    registro['internet_tiene'] = _si_no(registro['internet_tiene'])
+    if registro['internet_tiene'] == '1':
+        registro['internet_velocidad'] = _entero(registro['internet_velocidad'])
+        registro['internet_fecha'] = _fecha(registro['internet_fecha'])
+    else:
+        # La importación descarta los datos de servicio si no hay internet
+        for campo in CAMPOS_INTERNET:
+            registro[campo] = ''
+
+    registro['piso_tiene'] = _si_no(registro['piso_tiene'])
+    if registro['piso_tiene'] == '1':
+        registro['piso_fecha'] = _fecha(registro['piso_fecha'])
+    else:
+        for campo in CAMPOS_PISO:
+            registro[campo] = ''
+
+    return registro
+
+
+def _nombre(obj):
+    return obj.nombre if obj is not None else ''
+
+
+def registro_desde_bd(escuela, servicio, piso):
+    """Arma el registro normalizado del estado actual de una escuela."""
+    registro = {
+        'cue': _texto(escuela.cue),
+        'clave_provincial': _texto(escuela.clave_provincial),
+        'nombre': _texto(escuela.nombre),
+        'direccion': _texto(escuela.direccion),
+        'matricula': str(escuela.matricula or 0),
+        'latitud': _coordenada(escuela.latitud),
+        'longitud': _coordenada(escuela.longitud),
+        'numero_predio': str(escuela.predio.numero_predio) if escuela.predio else '',
+        # Se compara contra la existencia real de la fila de servicio/piso,
+        # así una escuela marcada sin internet pero con servicio cuenta como cambio.
+        'internet_tiene': '1' if escuela.tiene_internet and servicio else '0',
+        'piso_tiene': '1' if escuela.tiene_piso_tecnologico and piso else '0',
+    }
+    for campo in CATALOGOS_ESCUELA:
+        registro[campo] = _nombre(getattr(escuela, campo))
+
+    for campo in CAMPOS_INTERNET + CAMPOS_PISO:
+        registro[campo] = ''
+
+    if registro['internet_tiene'] == '1':
+        registro.update({
+            'internet_proveedor': _nombre(servicio.proveedor),
+            'internet_velocidad': str(servicio.velocidad_mbps or 0),
+            'internet_estado': _nombre(servicio.estado_conectividad),
+            'internet_fecha': servicio.fecha_instalacion.isoformat() if servicio.fecha_instalacion else '',
+            'internet_metodo': _nombre(servicio.metodo_solicitud),
+            'internet_obs': _texto(servicio.observaciones),
+        })
+    elif escuela.tiene_internet != bool(servicio):
+        registro['internet_tiene'] = 'inconsistente'
+
+    if registro['piso_tiene'] == '1':
+        registro.update({
+            'piso_proveedor': _nombre(piso.proveedor),
+            'piso_plan': _nombre(piso.plan_piso),
+            'piso_tipo': _nombre(piso.tipo_piso_instalado),
+            'piso_fecha': piso.fecha_terminado.isoformat() if piso.fecha_terminado else '',
+            'piso_mejora': _texto(piso.tipo_mejora),
+            'piso_obs': _texto(piso.observaciones),
+        })
+    elif escuela.tiene_piso_tecnologico != bool(piso):
+        registro['piso_tiene'] = 'inconsistente'
+
+    return registro
+
+
+def hash_registro(registro):
+    """Hash estable de un registro normalizado."""
+    contenido = '\x1f'.join(registro[campo] for campo in CAMPOS_FILA)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+# -------------------------------------------------------------------------
+# ESTADO ACTUAL Y DIFERENCIAS
+# -------------------------------------------------------------------------
+
+def cargar_estado_actual():
+    """
+    Carga en bloque todas las escuelas con su servicio y piso vigentes y
+    devuelve {cue: hash}. Es una sola consulta (joins), sin importar la
+    cantidad de escuelas.
+    """
+    escuelas = Escuela.objects.select_related(
+        'region', 'distrito', 'ciudad', 'ambito', 'dependencia', 'turno',
+        'categoria', 'tipo_establecimiento', 'predio', *RELACIONES_VIGENTES
+    )
+
+    estado = {}
+    for escuela in escuelas.iterator(chunk_size=2000):
+        registro = registro_desde_bd(escuela, escuela.servicio_vigente, escuela.piso_vigente)
+        estado[escuela.cue] = hash_registro(registro)
+    return estado
+
+
+def leer_csv(contenido):
+    """
+    Lee el texto del CSV (con encabezado) y devuelve (registros, errores).
+    Si un CUE se repite, gana la última fila, igual que en la carga anterior.
+    """
+    reader = csv.reader(io.StringIO(contenido), delimiter=',')
+    next(reader, None)  # Encabezado
+
+    registros = {}
+    errores = []
+    for i, row in enumerate(reader):
+        if not row or not row[0].strip():
+            continue
+        cue = row[0].strip()
+        try:
+            registros[cue] = normalizar_fila(row)
+        except Exception as e:
+            errores.append(f"Fila {i+2} (CUE: {cue}): Error al procesar - {e}")
+    return registros, errores
+
+
+def calcular_diferencias(registros):
+    """
+    Clasifica los registros del archivo contra el estado actual de la base.
+    Devuelve un dict con las listas de CUE 'nuevas', 'modificadas',
+    'sin_cambios' y 'eliminadas' (presentes en la base pero no en el archivo).
+    """
+    estado = cargar_estado_actual()
+
+    diferencias = {'nuevas': [], 'modificadas': [], 'sin_cambios': [], 'eliminadas': []}
+    for cue, registro in registros.items():
+        hash_actual = estado.get(cue)
+        if hash_actual is None:
+            diferencias['nuevas'].append(cue)
+        elif hash_actual != hash_registro(registro):
+            diferencias['modificadas'].append(cue)
+        else:
+            diferencias['sin_cambios'].append(cue)
+
+    diferencias['eliminadas'] = sorted(set(estado) - set(registros))
+    return diferencias
+
+
+# -------------------------------------------------------------------------
+# ESCRITURA
+# -------------------------------------------------------------------------
+
+class CacheCatalogos:
+    """Evita repetir get_or_create para el mismo nombre de catálogo."""
+
+    def __init__(self):
+        self._objetos = {}
+
+    def obtener(self, model, nombre):
+        if not nombre:
+            return None
+        clave = (model, nombre)
+        if clave not in self._objetos:
+            self._objetos[clave], _ = model.objects.get_or_create(nombre=nombre)
+        return self._objetos[clave]
+
+    def predio(self, numero):
+        clave = (Predio, numero)
+        if clave not in self._objetos:
+            self._objetos[clave], _ = Predio.objects.get_or_create(numero_predio=int(numero))
+        return self._objetos[clave]
+
+
+def _fecha_o_none(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+
+
+def _completar_jerarquia(region, distrito, ciudad):
+    """Vincula distrito->región y ciudad->distrito la primera vez que aparecen juntos."""
+    if distrito and region and distrito.region_id is None:
+        distrito.region = region
+        distrito.save(update_fields=['region'])
+    if ciudad and distrito and ciudad.distrito_id is None:
+        ciudad.distrito = distrito
+        ciudad.save(update_fields=['distrito'])
+
+
+def _guardar_vigente(modelo, escuela, vigente_id, valores):
+    """
+    Guarda el servicio/piso de la escuela. Si el contenido cambia respecto
+    del vigente se crea una fila nueva (copia del vigente con 'valores'),
+    que pasa a ser la vigente por tener el mayor id; la anterior queda como
+    historial. Sin cambios no se escribe nada.
+    """
+    vigente = modelo.objects.filter(pk=vigente_id).first() if vigente_id is not None else None
+    if vigente is None:
+        modelo.objects.create(escuela=escuela, **valores)
+        return
+    nuevo = modelo(**{
+        field.attname: getattr(vigente, field.attname)
+        for field in modelo._meta.concrete_fields
+        if not field.primary_key
+    })
+    for campo, valor in valores.items():
+        setattr(nuevo, campo, valor)
+    if calcular_hash_contenido(nuevo) != vigente.hash_contenido:
+        nuevo.save()
+
+
+def _dar_de_baja(modelo, vigente_id):
+    """
+    La escuela dejó de tener servicio/piso: el vigente se da de baja (queda
+    como historial) y la escuela se queda sin vigente. Si lo vuelve a tener,
+    _guardar_vigente crea una fila nueva.
+    """
+    if vigente_id is not None:
+        # Update de SeguimientoQuerySet: registra el cambio y sincroniza la escuela
+        modelo.objects.filter(pk=vigente_id).update(fecha_baja=timezone.localdate())
+
+
+def aplicar_registro(registro, catalogos):
+    """Escribe un registro normalizado (escuela, servicio y piso). Devuelve (escuela, creada)."""
+    escuela_data = {
+        'clave_provincial': registro['clave_provincial'] or None,
+        'nombre': registro['nombre'],
+        'direccion': registro['direccion'],
+        'matricula': int(registro['matricula']),
+        'latitud': registro['latitud'] or None,
+        'longitud': registro['longitud'] or None,
+        'tiene_internet': registro['internet_tiene'] == '1',
+        'tiene_piso_tecnologico': registro['piso_tiene'] == '1',
+        'predio': catalogos.predio(registro['numero_predio']),
+    }
+    for campo, model in CATALOGOS_ESCUELA.items():
+        escuela_data[campo] = catalogos.obtener(model, registro[campo])
+    _completar_jerarquia(escuela_data['region'], escuela_data['distrito'], escuela_data['ciudad'])
+
+    escuela, created = Escuela.objects.update_or_create(
+        cue=registro['cue'],
+        defaults=escuela_data
+    )
+
+    # --- ServicioConectividad ---
+    if escuela.tiene_internet:
+        _guardar_vigente(
+            ServicioConectividad, escuela, escuela.servicio_vigente_id,
+            {
+                'proveedor': catalogos.obtener(ProveedorInternet, registro['internet_proveedor']),
+                'velocidad_mbps': int(registro['internet_velocidad'] or 0),
+                'estado_conectividad': catalogos.obtener(EstadoConectividad, registro['internet_estado']),
+                'fecha_instalacion': _fecha_o_none(registro['internet_fecha']),
+                'metodo_solicitud': catalogos.obtener(MetodoSolicitud, registro['internet_metodo']),
+                'observaciones': registro['internet_obs'],
+            }
+        )
+    else:
+        _dar_de_baja(ServicioConectividad, escuela.servicio_vigente_id)
+
+    # --- PisoTecnologico ---
+    if escuela.tiene_piso_tecnologico:
+        _guardar_vigente(
+            PisoTecnologico, escuela, escuela.piso_vigente_id,
+            {
+                'proveedor': catalogos.obtener(ProveedorPisoTecnologico, registro['piso_proveedor']),
+                'plan_piso': catalogos.obtener(PlanPiso, registro['piso_plan']),
+                'tipo_piso_instalado': catalogos.obtener(TipoPisoTecnologico, registro['piso_tipo']),
+                'fecha_terminado': _fecha_o_none(registro['piso_fecha']),
+                'tipo_mejora': registro['piso_mejora'],
+                'observaciones': registro['piso_obs'],
+            }
+        )
+    else:
+        _dar_de_baja(PisoTecnologico, escuela.piso_vigente_id)
+
+    return escuela, created
+
+
+def aplicar_diferencias(registros, diferencias):
+    """
+    Escribe solo las filas nuevas y modificadas.
+    Devuelve (creadas, actualizadas, errores).
+    """
+    catalogos = CacheCatalogos()
+    creadas = 0
+    actualizadas = 0
+    errores = []
+
+    for cue in diferencias['nuevas'] + diferencias['modificadas']:
+        try:
+            # Savepoint por fila: un error no invalida el resto de la carga
+            with transaction.atomic():
+                _, created = aplicar_registro(registros[cue], catalogos)
+        except Exception as e:
+            errores.append(f"CUE {cue}: Error al guardar - {e}")
+            continue
+        if created:
+            creadas += 1
+        else:
+            actualizadas += 1
+
+    return creadas, actualizadas, errores
+
+
+# -------------------------------------------------------------------------
+# ARCHIVOS PENDIENTES DE CONFIRMACIÓN
+# -------------------------------------------------------------------------
+
+# Una previsualización sin confirmar en este plazo se descarta
+VIGENCIA_PENDIENTE = timedelta(hours=6)
+
+
+def _pendientes(token):
+    """Queryset con la importación pendiente vigente del token (None si el token no es válido)."""
+    # El token viene de la sesión; se valida antes de consultar
+    try:
+        token = uuid.UUID(hex=token)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return ImportacionPendiente.objects.filter(token=token, fecha__gte=timezone.now() - VIGENCIA_PENDIENTE)
+
+
+def limpiar_pendientes():
+    """Borra las importaciones pendientes vencidas. Devuelve cuántas se borraron."""
+    return ImportacionPendiente.objects.filter(fecha__lt=timezone.now() - VIGENCIA_PENDIENTE).delete()[0]
+
+
+def guardar_pendiente(contenido):
+    """Guarda el CSV previsualizado hasta que el usuario confirme. Devuelve el token."""
+    limpiar_pendientes()
+    return ImportacionPendiente.objects.create(contenido=contenido).token.hex
+
+
+def leer_pendiente(token):
+    """Devuelve el contenido guardado o None si no existe o venció."""
+    pendientes = _pendientes(token)
+    return pendientes.values_list('contenido', flat=True).first() if pendientes is not None else None
+
+
+def borrar_pendiente(token):
+    pendientes = _pendientes(token)
+    if pendientes is not None:
+        pendientes.delete()
@@ -0,0 +1,29 @@
+#gestor/management/commands/generar_teselas.py
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import teselas
+
+
+class Command(BaseCommand):
+    help = 'Genera por adelantado las teselas PNG del mapa de escuelas en la caché de disco.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zoom-min', type=int, default=0, help='Primer nivel de zoom a generar')
+        parser.add_argument('--zoom-max', type=int, default=teselas.ZOOM_MAX_TESELAS,
+                            help='Último nivel de zoom a generar')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Borra todas las teselas guardadas antes de generar')
+
+    def handle(self, *args, **options):
+        zoom_min, zoom_max = options['zoom_min'], options['zoom_max']
+        if not 0 <= zoom_min <= zoom_max <= teselas.ZOOM_MAX_TESELAS:
+            raise CommandError(f'Los niveles de zoom deben estar entre 0 y {teselas.ZOOM_MAX_TESELAS}.')
+
+        if options['limpiar']:
+            teselas.limpiar()
+            self.stdout.write('Teselas anteriores eliminadas.')
+
+        escritas = teselas.generar(zoom_min, zoom_max)
+        self.stdout.write(self.style.SUCCESS(
+            f'{escritas} teselas generadas (zoom {zoom_min}-{zoom_max}) en {teselas.directorio()}'
+        ))
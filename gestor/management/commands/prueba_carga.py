@@ -0,0 +1,88 @@
+#gestor/management/commands/prueba_carga.py
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import carga
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga: usuarios simultáneos que repiten sesiones reales (mapa con paneos, zoom '
+        'y popups, búsquedas, dashboard y reportes) contra un servidor en marcha, o contra uno que '
+        'levanta con --levantar. Informa pedidos por segundo, latencias p50/p95/p99 y errores; '
+        'con --guardar deja el resultado en JSON y con --comparar lo compara con otra corrida.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='URL base del servidor')
+        parser.add_argument('--levantar', action='store_true',
+                            help='Levanta gunicorn (gunicorn.conf.py) con esta configuración y lo apaga al terminar')
+        parser.add_argument('--puerto', type=int, default=8765, help='Puerto del servidor de --levantar')
+        parser.add_argument('--usuarios', type=int, default=10, help='Usuarios simultáneos')
+        parser.add_argument('--duracion', type=int, default=30, help='Segundos de prueba')
+        parser.add_argument('--escenario', action='append', choices=list(carga.ESCENARIOS),
+                            help='Escenario a correr (se puede repetir; por defecto, la mezcla completa)')
+        parser.add_argument('--pausa', type=float, default=0.0,
+                            help='Segundos medios de lectura entre acciones (0 = sin pausa)')
+        parser.add_argument('--semilla', type=int, help='Semilla para repetir la misma secuencia de pedidos')
+        parser.add_argument('--guardar', metavar='DIRECTORIO', help='Guarda el resultado en JSON en este directorio')
+        parser.add_argument('--etiqueta', default='', help='Nombre corto de la corrida (va en el archivo)')
+        parser.add_argument('--comparar', metavar='ARCHIVO', help='Resultado anterior (JSON) para comparar')
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['duracion'] < 1:
+            raise CommandError('--usuarios y --duracion deben ser mayores a 0.')
+        anterior = None
+        if options['comparar']:
+            try:
+                anterior = carga.leer(options['comparar'])['resultado']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {e}')
+
+        url = f"http://127.0.0.1:{options['puerto']}" if options['levantar'] else options['url']
+        servidor = None
+        if options['levantar']:
+            self.stdout.write(f'Levantando el servidor en {url}...')
+            try:
+                servidor = carga.levantar_servidor(options['puerto'])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(f"{options['usuarios']} usuarios durante {options['duracion']} s contra {url}...")
+        try:
+            muestras, segundos = carga.correr(
+                url, options['usuarios'], options['duracion'], escenarios=options['escenario'],
+                pausa=options['pausa'], semilla=options['semilla'],
+            )
+        finally:
+            if servidor is not None:
+                servidor.terminate()
+                servidor.wait()
+        datos = carga.resumen(muestras, segundos)
+        self._tabla(datos)
+
+        if options['guardar']:
+            parametros = {clave: options[clave] for clave in ('usuarios', 'duracion', 'escenario', 'pausa', 'semilla')}
+            parametros['url'] = url
+            ruta = carga.guardar(options['guardar'], datos, parametros, options['etiqueta'])
+            self.stdout.write(f'Resultado guardado en {ruta}')
+        if anterior is not None:
+            self._comparacion(carga.comparar(anterior, datos))
+        if datos['total']['errores']:
+            self.stdout.write(self.style.WARNING(f"{datos['total']['porcentaje_errores']} % de errores."))
+
+    def _tabla(self, datos):
+        self.stdout.write(f"{'pedido':<14}{'pedidos':>9}{'ped/s':>9}{'errores':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for tipo, cifras in list(datos['rutas'].items()) + [('TOTAL', datos['total'])]:
+            self.stdout.write(
+                f"{tipo:<14}{cifras['pedidos']:>9}{cifras['por_segundo']:>9}{cifras['errores']:>9}"
+                f"{str(cifras['p50_ms']):>10}{str(cifras['p95_ms']):>10}{str(cifras['p99_ms']):>10}"
+            )
+
+    def _comparacion(self, filas):
+        self.stdout.write('\nContra la corrida anterior (antes -> ahora, variación %):')
+        for tipo, cifras in filas:
+            partes = []
+            for cifra, (antes, ahora, variacion) in cifras.items():
+                cambio = f' ({variacion:+}%)' if variacion is not None else ''
+                partes.append(f'{cifra} {antes} -> {ahora}{cambio}')
+            self.stdout.write(f'{tipo:<14}' + '  '.join(partes))
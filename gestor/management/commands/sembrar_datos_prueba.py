@@ -0,0 +1,36 @@
+#gestor/management/commands/sembrar_datos_prueba.py
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga escuelas sintéticas (CUE con prefijo "%s") para las pruebas de carga. Pensado para '
+        'una base local propia: se niega a sembrar si ya hay escuelas reales, salvo con --forzar.'
+        % sinteticos.PREFIJO_CUE
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escuelas', type=int, default=5000, help='Cantidad de escuelas')
+        parser.add_argument('--semilla', type=int, default=0, help='Misma semilla, mismos datos')
+        parser.add_argument('--borrar', action='store_true', help='Borra las escuelas sintéticas y termina')
+        parser.add_argument('--forzar', action='store_true', help='Siembra aunque la base tenga escuelas reales')
+
+    def handle(self, *args, **options):
+        if options['borrar']:
+            cantidad = sinteticos.borrar()
+            self.stdout.write(self.style.SUCCESS(f'{cantidad} escuelas sintéticas borradas.'))
+            return
+        if options['escuelas'] < 1:
+            raise CommandError('--escuelas debe ser mayor a 0.')
+        if sinteticos.hay_datos_reales() and not options['forzar']:
+            raise CommandError('La base tiene escuelas reales. Usá una base propia para la prueba o --forzar.')
+
+        self.stdout.write(f"Sembrando {options['escuelas']} escuelas (semilla {options['semilla']})...")
+        creadas, actualizadas, errores = sinteticos.sembrar(options['escuelas'], options['semilla'])
+        for error in errores[:10]:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'{creadas} escuelas creadas, {actualizadas} actualizadas, {len(errores)} errores.'
+        ))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import tendencias
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda la instantánea diaria de cobertura (conteos por región, distrito y categoría). '
+        'Pensado para correr una vez por noche desde cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de la instantánea (AAAA-MM-DD); por defecto, hoy')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            try:
+                fecha = date.fromisoformat(options['fecha'])
+            except ValueError:
+                raise CommandError('La fecha debe tener el formato AAAA-MM-DD.')
+
+        filas = tendencias.tomar_instantanea(fecha)
+        self.stdout.write(self.style.SUCCESS(
+            f'Instantánea de cobertura guardada: {filas} filas ({fecha or "hoy"}).'
+        ))
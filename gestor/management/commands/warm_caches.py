@@ -0,0 +1,27 @@
+#gestor/management/commands/warm_caches.py
+from django.core.management.base import BaseCommand, CommandError
+
+from gestor import precalentar
+
+
+class Command(BaseCommand):
+    help = (
+        'Precalienta las cachés (catálogos, cifras y páginas de reportes, índice espacial, '
+        'mapas) para que los primeros pedidos después de un deploy o una importación no '
+        'paguen la caché fría. Fuera del proceso web solo aprovecha lo que se comparte: '
+        'la caché en disco (CACHE_DIR) y las teselas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--omitir', action='append', default=[], choices=list(precalentar.PASOS),
+                            help='Paso a omitir (se puede repetir)')
+
+    def handle(self, *args, **options):
+        tiempos = precalentar.precalentar(omitir=options['omitir'])
+        fallidos = [descripcion for descripcion, segundos in tiempos if segundos is None]
+        for descripcion, segundos in tiempos:
+            if segundos is not None:
+                self.stdout.write(f'  {descripcion}: {segundos:.2f} s')
+        if fallidos:
+            raise CommandError(f'Falló el precalentamiento de: {", ".join(fallidos)} (ver el log).')
+        self.stdout.write(self.style.SUCCESS('Cachés precalentadas.'))
@@ -0,0 +1,228 @@
+#gestor/mapa.py
+"""
+Datos de los mapas por ventana visible (bounds) y nivel de zoom.
+
+Con poco zoom las escuelas se agrupan en una grilla en la base de datos
+(un GROUP BY por celda), así el tamaño de la respuesta depende de la
+pantalla y no de la cantidad de escuelas. Con zoom alto, o si en la ventana
+hay pocas escuelas, se devuelven los puntos individuales.
+
+aconsultar() es la versión asíncrona (ORM async) que usa la API del mapa:
+las consultas son las mismas y el armado de cada fila se comparte. La API
+pasa por las versiones *_compartido: pedidos simultáneos con los mismos
+parámetros (la vista inicial, por ejemplo) hacen una sola consulta, y el
+resultado se guarda unos segundos.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.db.models import Avg, Count, FloatField, Max, Min, Sum
+from django.db.models.functions import Cast, Floor
+
+from . import en_vuelo
+from .models import Escuela
+from .revision import cacheado, clave_cache
+
+
+# Desde este zoom siempre se muestran escuelas individuales
+ZOOM_DETALLE = 13
+
+# Debajo de ZOOM_DETALLE se agrupa solo si la ventana tiene más escuelas que esto
+MAX_PUNTOS = 400
+
+# Lado de cada celda de la grilla, en píxeles de pantalla
+PIXELES_CELDA = 60
+
+# Vista inicial: la provincia de Buenos Aires completa
+VISTA_INICIAL = {
+    'minLat': -41.2, 'maxLat': -33.2,
+    'minLng': -63.5, 'maxLng': -56.6,
+    'zoom': 6,
+}
+
+# Parámetros que cambian la respuesta; el resto no entra en la clave
+PARAMETROS_CONSULTA = (
+    'minLat', 'maxLat', 'minLng', 'maxLng', 'zoom', 'region', 'distrito',
+    'tiene_internet', 'tiene_piso', 'estado_conectividad', 'cue', 'predio',
+)
+
+# Segundos que se guarda la respuesta de una ventana: las ventanas posibles
+# son muchas, alcanza con absorber los picos de pedidos iguales
+TTL_VENTANA = 30
+
+CAMPOS_PUNTO = (
+    'cue', 'nombre', 'latitud', 'longitud', 'tiene_internet',
+    'tiene_piso_tecnologico', 'region_id', 'distrito_id',
+)
+
+
+def leer_bounds(params):
+    """Devuelve (min_lat, max_lat, min_lng, max_lng) o lanza ValueError."""
+    try:
+        return tuple(float(params.get(clave)) for clave in ('minLat', 'maxLat', 'minLng', 'maxLng'))
+    except (TypeError, ValueError):
+        raise ValueError('Parámetros de bounds inválidos')
+
+
+def filtrar_escuelas(bounds, params):
+    """Escuelas dentro de la ventana con los filtros opcionales de los mapas."""
+    min_lat, max_lat, min_lng, max_lng = bounds
+    qs = Escuela.objects.filter(
+        latitud__gte=min_lat,
+        latitud__lte=max_lat,
+        longitud__gte=min_lng,
+        longitud__lte=max_lng,
+    )
+
+    region_id = params.get('region')
+    distrito_id = params.get('distrito')
+    tiene_internet = params.get('tiene_internet')
+    tiene_piso = params.get('tiene_piso')
+    estado_id = params.get('estado_conectividad')
+    cue = params.get('cue')
+    predio = params.get('predio')
+
+    if region_id:
+        qs = qs.filter(region_id=region_id)
+    if distrito_id:
+        qs = qs.filter(distrito_id=distrito_id)
+    if tiene_internet in ('1', '0'):
+        qs = qs.filter(tiene_internet=(tiene_internet == '1'))
+    if tiene_piso in ('1', '0'):
+        qs = qs.filter(tiene_piso_tecnologico=(tiene_piso == '1'))
+    if estado_id:
+        # Columna copiada del servicio vigente: el GROUP BY de la grilla queda sobre una sola tabla
+        qs = qs.filter(internet_estado_id=estado_id)
+    if cue:
+        qs = qs.filter(cue__icontains=cue)
+    if predio:
+        qs = qs.filter(predio__numero_predio__icontains=predio)
+    return qs
+
+
+def _punto(fila):
+    fila['latitud'] = float(fila['latitud'])
+    fila['longitud'] = float(fila['longitud'])
+    return fila
+
+
+def puntos(qs):
+    """Escuelas individuales como diccionarios (sin cargar modelos ni relaciones)."""
+    return [_punto(fila) for fila in qs.values(*CAMPOS_PUNTO)]
+
+
+async def apuntos(qs):
+    return [_punto(fila) async for fila in qs.values(*CAMPOS_PUNTO)]
+
+
+def tamano_celda(zoom):
+    """Lado de la celda en grados para el zoom dado (proyección web mercator)."""
+    return 360.0 / (2 ** zoom) * PIXELES_CELDA / 256
+
+
+def _consulta_grupos(qs, zoom):
+    tam = tamano_celda(zoom)
+    return (
+        qs.annotate(
+            celda_lat=Floor(Cast('latitud', FloatField()) / tam),
+            celda_lng=Floor(Cast('longitud', FloatField()) / tam),
+        )
+        .values('celda_lat', 'celda_lng')
+        .annotate(
+            cantidad=Count('id'),
+            con_internet=Sum(Cast('tiene_internet', FloatField())),
+            lat=Avg(Cast('latitud', FloatField())),
+            lng=Avg(Cast('longitud', FloatField())),
+            min_lat=Min('latitud'), max_lat=Max('latitud'),
+            min_lng=Min('longitud'), max_lng=Max('longitud'),
+        )
+        .order_by()
+    )
+
+
+def _grupo(fila):
+    return {
+        'latitud': fila['lat'],
+        'longitud': fila['lng'],
+        'cantidad': fila['cantidad'],
+        'con_internet': int(fila['con_internet'] or 0),
+        'bounds': [[float(fila['min_lat']), float(fila['min_lng'])],
+                   [float(fila['max_lat']), float(fila['max_lng'])]],
+    }
+
+
+def grupos(qs, zoom):
+    """Agrupa las escuelas en celdas de la grilla, todo en una consulta."""
+    return [_grupo(fila) for fila in _consulta_grupos(qs, zoom)]
+
+
+async def agrupos(qs, zoom):
+    return [_grupo(fila) async for fila in _consulta_grupos(qs, zoom)]
+
+
+def _leer_zoom(params):
+    try:
+        return int(params.get('zoom'))
+    except (TypeError, ValueError):
+        return ZOOM_DETALLE
+
+
+def _agrupar(zoom, total):
+    return zoom < ZOOM_DETALLE and total > MAX_PUNTOS
+
+
+def consultar(params):
+    """
+    Respuesta de la API de mapas para una ventana y un zoom:
+        {'modo': 'escuelas' | 'grupos', 'total': int, 'items': [...]}
+    """
+    bounds = leer_bounds(params)
+    zoom = _leer_zoom(params)
+    qs = filtrar_escuelas(bounds, params)
+    total = qs.count()
+    if not _agrupar(zoom, total):
+        return {'modo': 'escuelas', 'total': total, 'items': puntos(qs)}
+    return {'modo': 'grupos', 'total': total, 'items': grupos(qs, zoom)}
+
+
+async def aconsultar(params):
+    """Igual que consultar(), con el ORM asíncrono."""
+    bounds = leer_bounds(params)
+    zoom = _leer_zoom(params)
+    qs = filtrar_escuelas(bounds, params)
+    total = await qs.acount()
+    if not _agrupar(zoom, total):
+        return {'modo': 'escuelas', 'total': total, 'items': await apuntos(qs)}
+    return {'modo': 'grupos', 'total': total, 'items': await agrupos(qs, zoom)}
+
+
+# -------------------------------------------------------------------------
+# CONSULTAS COMPARTIDAS
+# -------------------------------------------------------------------------
+
+def clave_ventana(params):
+    """Clave de caché de una consulta: revisión y parámetros normalizados."""
+    normalizados = [(p, str(params.get(p)).strip()) for p in PARAMETROS_CONSULTA if params.get(p)]
+    firma = hashlib.sha1(repr(normalizados).encode('utf-8')).hexdigest()[:16]
+    return clave_cache('mapa_ventana', firma)
+
+
+async def aconsultar_compartido(params):
+    """aconsultar() con un solo cálculo por parámetros y revisión."""
+    clave = await sync_to_async(clave_ventana)(params)
+    return await en_vuelo.acompartido(clave, lambda: aconsultar(params), TTL_VENTANA)
+
+
+async def apuntos_compartido(params):
+    """Lista de escuelas de la ventana (API sin zoom), con un solo cálculo por parámetros."""
+    bounds = leer_bounds(params)
+    clave = await sync_to_async(clave_ventana)(params)
+    return await en_vuelo.acompartido(
+        clave, lambda: apuntos(filtrar_escuelas(bounds, params)), TTL_VENTANA
+    )
+
+
+def vista_inicial_internet():
+    """Primer pintado del mapa de escuelas con Internet, cacheado por revisión."""
+    return cacheado(clave_cache('mapa_internet_inicial'),
+                    lambda: consultar(dict(VISTA_INICIAL, tiene_internet='1')))
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:18
+
+import hashlib
+from decimal import Decimal
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+CAMPOS_SIN_HASH = ('id', 'hash_contenido', 'fecha_actualizacion')
+
+
+def _valor_hash(field, valor):
+    valor = field.to_python(valor)
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        valor = valor.quantize(Decimal(10) ** -field.decimal_places)
+    return str(valor)
+
+
+def calcular_hashes(apps, schema_editor):
+    """Copia de gestor.models.calcular_hash_contenido para las filas existentes."""
+    for nombre_modelo in ('Escuela', 'ServicioConectividad', 'PisoTecnologico'):
+        model = apps.get_model('gestor', nombre_modelo)
+        campos = sorted(model._meta.concrete_fields, key=lambda field: field.attname)
+        pendientes = []
+        for obj in model.objects.iterator(chunk_size=1000):
+            valores = [
+                f"{field.attname}={_valor_hash(field, getattr(obj, field.attname))}"
+                for field in campos
+                if field.attname not in CAMPOS_SIN_HASH
+            ]
+            obj.hash_contenido = hashlib.sha1('\x1f'.join(valores).encode('utf-8')).hexdigest()
+            pendientes.append(obj)
+        model.objects.bulk_update(pendientes, ['hash_contenido'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0004_alter_predio_numero_predio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuela',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='pisotecnologico',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pisotecnologico',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='servicioconectividad',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='servicioconectividad',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(calcular_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:20
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0005_seguimiento_cambios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('accion', models.CharField(choices=[('creado', 'Creado'), ('modificado', 'Modificado'), ('eliminado', 'Eliminado')], max_length=12)),
+                ('objeto_id', models.BigIntegerField(blank=True, null=True)),
+                ('cue', models.CharField(blank=True, db_index=True, default='', max_length=50)),
+                ('hash_contenido', models.CharField(blank=True, default='', max_length=40)),
+                ('datos', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Registro de Cambio',
+                'verbose_name_plural': 'Registro de Cambios',
+                'ordering': ['id'],
+            },
+        ),
+    ]
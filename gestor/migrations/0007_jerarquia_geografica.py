@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _mas_frecuente(Escuela, hijo, padre):
+    """{id_hijo: id_padre} usando el padre más frecuente entre las escuelas (una consulta)."""
+    conteos = (
+        Escuela.objects.filter(**{f'{hijo}__isnull': False, f'{padre}__isnull': False})
+        .values(f'{hijo}_id', f'{padre}_id')
+        .annotate(total=Count('id'))
+        .order_by(f'{hijo}_id', '-total', f'{padre}_id')
+    )
+    resultado = {}
+    for fila in conteos:
+        resultado.setdefault(fila[f'{hijo}_id'], fila[f'{padre}_id'])
+    return resultado
+
+
+def completar_jerarquia(apps, schema_editor):
+    """Deduce Distrito.region y Ciudad.distrito de las escuelas ya cargadas."""
+    Escuela = apps.get_model('gestor', 'Escuela')
+    Distrito = apps.get_model('gestor', 'Distrito')
+    Ciudad = apps.get_model('gestor', 'Ciudad')
+
+    region_de = _mas_frecuente(Escuela, 'distrito', 'region')
+    distritos = list(Distrito.objects.filter(id__in=region_de))
+    for distrito in distritos:
+        distrito.region_id = region_de[distrito.id]
+    Distrito.objects.bulk_update(distritos, ['region'], batch_size=1000)
+
+    distrito_de = _mas_frecuente(Escuela, 'ciudad', 'distrito')
+    ciudades = list(Ciudad.objects.filter(id__in=distrito_de))
+    for ciudad in ciudades:
+        ciudad.distrito_id = distrito_de[ciudad.id]
+    Ciudad.objects.bulk_update(ciudades, ['distrito'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0006_registro_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ciudad',
+            name='distrito',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ciudades', to='gestor.distrito'),
+        ),
+        migrations.AddField(
+            model_name='distrito',
+            name='region',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='distritos', to='gestor.region'),
+        ),
+        migrations.RunPython(completar_jerarquia, migrations.RunPython.noop),
+    ]
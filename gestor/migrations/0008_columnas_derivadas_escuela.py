@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import ExtractYear
+
+
+def completar_columnas_derivadas(apps, schema_editor):
+    """Copia el último servicio y el último piso de cada escuela (un UPDATE por lote)."""
+    Escuela = apps.get_model('gestor', 'Escuela')
+    ServicioConectividad = apps.get_model('gestor', 'ServicioConectividad')
+    PisoTecnologico = apps.get_model('gestor', 'PisoTecnologico')
+
+    servicio = ServicioConectividad.objects.filter(escuela=OuterRef('pk')).order_by('-pk')
+    piso = PisoTecnologico.objects.filter(escuela=OuterRef('pk')).order_by('-pk')
+    valores = {
+        'internet_estado_id': Subquery(servicio.values('estado_conectividad_id')[:1]),
+        'internet_proveedor_id': Subquery(servicio.values('proveedor_id')[:1]),
+        'internet_velocidad': Subquery(servicio.values('velocidad_mbps')[:1]),
+        'internet_ano_instalacion': Subquery(servicio.annotate(ano=ExtractYear('fecha_instalacion')).values('ano')[:1]),
+        'internet_ano_mejora': Subquery(servicio.annotate(ano=ExtractYear('fecha_mejora')).values('ano')[:1]),
+        'piso_plan_id': Subquery(piso.values('plan_piso_id')[:1]),
+        'piso_proveedor_id': Subquery(piso.values('proveedor_id')[:1]),
+        'piso_ano_terminado': Subquery(piso.annotate(ano=ExtractYear('fecha_terminado')).values('ano')[:1]),
+    }
+    pks = list(Escuela.objects.values_list('pk', flat=True))
+    for i in range(0, len(pks), 1000):
+        Escuela.objects.filter(pk__in=pks[i:i + 1000]).update(**valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0007_jerarquia_geografica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuela',
+            name='internet_ano_instalacion',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='internet_ano_mejora',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='internet_estado',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.estadoconectividad'),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='internet_proveedor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.proveedorinternet'),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='internet_velocidad',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='piso_ano_terminado',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='piso_plan',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.planpiso'),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='piso_proveedor',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.proveedorpisotecnologico'),
+        ),
+        migrations.RunPython(completar_columnas_derivadas, migrations.RunPython.noop),
+    ]
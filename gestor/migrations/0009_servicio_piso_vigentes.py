@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def completar_vigentes(apps, schema_editor):
+    """El servicio y el piso vigentes de cada escuela son los de mayor id."""
+    Escuela = apps.get_model('gestor', 'Escuela')
+    ServicioConectividad = apps.get_model('gestor', 'ServicioConectividad')
+    PisoTecnologico = apps.get_model('gestor', 'PisoTecnologico')
+
+    valores = {
+        'servicio_vigente_id': Subquery(
+            ServicioConectividad.objects.filter(escuela=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+        ),
+        'piso_vigente_id': Subquery(
+            PisoTecnologico.objects.filter(escuela=OuterRef('pk')).order_by('-pk').values('pk')[:1]
+        ),
+    }
+    pks = list(Escuela.objects.values_list('pk', flat=True))
+    for i in range(0, len(pks), 1000):
+        Escuela.objects.filter(pk__in=pks[i:i + 1000]).update(**valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0008_columnas_derivadas_escuela'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escuela',
+            name='piso_vigente',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.pisotecnologico'),
+        ),
+        migrations.AddField(
+            model_name='escuela',
+            name='servicio_vigente',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gestor.servicioconectividad'),
+        ),
+        migrations.RunPython(completar_vigentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0009_servicio_piso_vigentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneaCobertura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True)),
+                ('region_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('distrito_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('categoria_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('total_escuelas', models.PositiveIntegerField(default=0)),
+                ('con_internet', models.PositiveIntegerField(default=0)),
+                ('con_piso', models.PositiveIntegerField(default=0)),
+                ('matricula', models.PositiveIntegerField(default=0)),
+                ('matricula_con_internet', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Instantánea de Cobertura',
+                'verbose_name_plural': 'Instantáneas de Cobertura',
+                'ordering': ['fecha', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+
+def crear_version(apps, schema_editor):
+    # La única fila del contador: las señales solo la incrementan
+    apps.get_model('gestor', 'VersionCatalogos').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0010_instantaneas_cobertura'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versión de Catálogos',
+                'verbose_name_plural': 'Versión de Catálogos',
+            },
+        ),
+        migrations.RunPython(crear_version, migrations.RunPython.noop),
+    ]
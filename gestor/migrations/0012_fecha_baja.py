@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:41
+
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+CAMPOS_SIN_HASH = ('id', 'hash_contenido', 'fecha_actualizacion')
+
+
+def _valor_hash(field, valor):
+    valor = field.to_python(valor)
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        valor = valor.quantize(Decimal(10) ** -field.decimal_places)
+    return str(valor)
+
+
+def recalcular_hashes(apps, schema_editor):
+    """El hash de servicios y pisos incluye la columna nueva (copia de calcular_hash_contenido)."""
+    for nombre_modelo in ('ServicioConectividad', 'PisoTecnologico'):
+        model = apps.get_model('gestor', nombre_modelo)
+        campos = sorted(model._meta.concrete_fields, key=lambda field: field.attname)
+        pendientes = []
+        for obj in model.objects.iterator(chunk_size=1000):
+            valores = [
+                f"{field.attname}={_valor_hash(field, getattr(obj, field.attname))}"
+                for field in campos
+                if field.attname not in CAMPOS_SIN_HASH
+            ]
+            obj.hash_contenido = hashlib.sha1('\x1f'.join(valores).encode('utf-8')).hexdigest()
+            pendientes.append(obj)
+        model.objects.bulk_update(pendientes, ['hash_contenido'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0011_version_catalogos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pisotecnologico',
+            name='fecha_baja',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='servicioconectividad',
+            name='fecha_baja',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(recalcular_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:47
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestor', '0012_fecha_baja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionPendiente',
+            fields=[
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('contenido', models.TextField()),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Importación Pendiente',
+                'verbose_name_plural': 'Importaciones Pendientes',
+            },
+        ),
+    ]
@@ -1,4 +1,175 @@
-from django.db import models
+import hashlib
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+
+# -------------------------------------------------------------------------
+# SEGUIMIENTO DE CAMBIOS (hash de contenido + fecha de actualización)
+# -------------------------------------------------------------------------
+
+# Columnas de Escuela que apuntan a (o copian) su servicio y su piso vigentes
+# (ver desnormalizacion.py). Se derivan de otras filas, así que no forman parte
+# del contenido de la escuela.
+CAMPOS_DERIVADOS = (
+    'servicio_vigente_id', 'piso_vigente_id',
+    'internet_estado_id', 'internet_proveedor_id', 'internet_velocidad',
+    'internet_ano_instalacion', 'internet_ano_mejora',
+    'piso_plan_id', 'piso_proveedor_id', 'piso_ano_terminado',
+)
+CAMPOS_SIN_HASH = ('id', 'hash_contenido', 'fecha_actualizacion') + CAMPOS_DERIVADOS
+TAMANO_LOTE = 1000
+
+
+def _valor_hash(field, valor):
+    valor = field.to_python(valor)
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        # '-34.6' asignado a mano y el Decimal('-34.600000') leído de la base deben coincidir
+        valor = valor.quantize(Decimal(10) ** -field.decimal_places)
+    return str(valor)
+
+
+def calcular_hash_contenido(obj):
+    """
+    Hash estable de los campos concretos de una instancia (FK como id).
+    Los campos se ordenan por nombre para no depender del orden de declaración.
+    """
+    campos = sorted(obj._meta.concrete_fields, key=lambda field: field.attname)
+    valores = [
+        f"{field.attname}={_valor_hash(field, getattr(obj, field.attname))}"
+        for field in campos
+        if field.attname not in CAMPOS_SIN_HASH
+    ]
+    return hashlib.sha1('\x1f'.join(valores).encode('utf-8')).hexdigest()
+
+
+class SeguimientoQuerySet(models.QuerySet):
+    """
+    Mantiene hash_contenido y fecha_actualizacion también en las operaciones
+    masivas (update, bulk_create, bulk_update), que no pasan por save(). Como
+    en save(), la fecha avanza solo en las filas cuyo contenido cambió.
+    """
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            # Los pk se toman antes: el update puede cambiar los campos del filtro
+            pks = list(self.values_list('pk', flat=True))
+            escuelas = self._escuelas_de(pks)
+            filas = super().update(**kwargs)
+            if 'escuela' in kwargs or 'escuela_id' in kwargs:
+                escuelas |= self._escuelas_de(pks)
+            for i in range(0, len(pks), TAMANO_LOTE):
+                modificados = self.model.objects.filter(pk__in=pks[i:i + TAMANO_LOTE]).refrescar_hash()
+                registrar_cambios(modificados, RegistroCambio.MODIFICADO)
+            self._sincronizar_escuelas(escuelas)
+        return filas
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        ahora = timezone.now()
+        for obj in objs:
+            obj.hash_contenido = calcular_hash_contenido(obj)
+            obj.fecha_actualizacion = ahora
+        creados = super().bulk_create(objs, *args, **kwargs)
+        registrar_cambios(creados, RegistroCambio.CREADO)
+        self._sincronizar_escuelas({obj.escuela_id for obj in creados} if self._hijo_de_escuela() else ())
+        return creados
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        ahora = timezone.now()
+        modificados = []
+        for obj in objs:
+            nuevo_hash = calcular_hash_contenido(obj)
+            if nuevo_hash != obj.hash_contenido:
+                obj.hash_contenido = nuevo_hash
+                obj.fecha_actualizacion = ahora
+                modificados.append(obj)
+        fields = list(fields) + ['hash_contenido', 'fecha_actualizacion']
+        escuelas = self._escuelas_de([obj.pk for obj in objs])
+        filas = super().bulk_update(objs, fields, *args, **kwargs)
+        registrar_cambios(modificados, RegistroCambio.MODIFICADO)
+        if self._hijo_de_escuela():
+            escuelas |= {obj.escuela_id for obj in objs}
+        self._sincronizar_escuelas(escuelas)
+        return filas
+
+    bulk_update.alters_data = True
+
+    # --- Columnas derivadas de Escuela (solo servicios y pisos) ---
+
+    def _hijo_de_escuela(self):
+        return self.model in (ServicioConectividad, PisoTecnologico)
+
+    def _escuelas_de(self, pks):
+        if not self._hijo_de_escuela() or not pks:
+            return set()
+        escuelas = set()
+        for i in range(0, len(pks), TAMANO_LOTE):
+            escuelas.update(self.model._base_manager.using(self.db)
+                            .filter(pk__in=pks[i:i + TAMANO_LOTE]).values_list('escuela_id', flat=True))
+        return escuelas
+
+    def _sincronizar_escuelas(self, escuela_ids):
+        if escuela_ids:
+            from .desnormalizacion import sincronizar_escuelas
+            sincronizar_escuelas(escuela_ids)
+
+    def refrescar_hash(self, chunk_size=TAMANO_LOTE):
+        """
+        Recalcula hash_contenido de las filas del queryset y avanza
+        fecha_actualizacion solo en las que cambiaron. Devuelve esas instancias.
+        """
+        ahora = timezone.now()
+        pendientes = []
+        for obj in self.iterator(chunk_size=chunk_size):
+            nuevo_hash = calcular_hash_contenido(obj)
+            if nuevo_hash != obj.hash_contenido:
+                obj.hash_contenido = nuevo_hash
+                obj.fecha_actualizacion = ahora
+                pendientes.append(obj)
+        # _base_manager es un Manager simple: no vuelve a pasar por este queryset
+        self.model._base_manager.using(self.db).bulk_update(
+            pendientes, ['hash_contenido', 'fecha_actualizacion'], batch_size=chunk_size
+        )
+        return pendientes
+
+
+class ModeloConSeguimiento(models.Model):
+    """
+    Base abstracta para los modelos que se sincronizan de forma incremental.
+    fecha_actualizacion solo avanza cuando el contenido realmente cambia.
+    """
+    hash_contenido = models.CharField(max_length=40, blank=True, default='', editable=False)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now, db_index=True, editable=False)
+
+    objects = SeguimientoQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        nuevo_hash = calcular_hash_contenido(self)
+        # Lo lee la señal post_save para no registrar guardados sin cambios
+        self._contenido_modificado = self._state.adding or nuevo_hash != self.hash_contenido
+        if self._contenido_modificado:
+            self.hash_contenido = nuevo_hash
+            self.fecha_actualizacion = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'hash_contenido', 'fecha_actualizacion'}
+        super().save(*args, **kwargs)
+
 
 # -------------------------------------------------------------------------
 # PROVEEDORES
@@ -38,12 +209,15 @@ class Region(models.Model):
 
 class Distrito(models.Model):
     nombre = models.CharField(max_length=255, unique=True)
+    # Jerarquía geográfica: Región -> Distrito -> Ciudad
+    region = models.ForeignKey(Region, on_delete=models.SET_NULL, null=True, blank=True, related_name='distritos')
     def __str__(self):
         return self.nombre
 
 
 class Ciudad(models.Model):
     nombre = models.CharField(max_length=255, unique=True)
+    distrito = models.ForeignKey(Distrito, on_delete=models.SET_NULL, null=True, blank=True, related_name='ciudades')
     def __str__(self):
         return self.nombre
 
@@ -113,7 +287,7 @@ class Predio(models.Model):
         return str(self.numero_predio)
 
 
-class Escuela(models.Model):
+class Escuela(ModeloConSeguimiento):
     cue = models.CharField(max_length=50, unique=True)
     clave_provincial = models.CharField(max_length=60, blank=True, null=True)
 
@@ -138,6 +312,34 @@ class Escuela(models.Model):
     categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True)
     tipo_establecimiento = models.ForeignKey(TipoEstablecimiento, on_delete=models.SET_NULL, null=True)
 
+    # Servicio y piso vigentes: la fila más reciente de cada uno si no está dada
+    # de baja; las anteriores y las dadas de baja quedan como historial. Permiten traer ambos con select_related.
+    servicio_vigente = models.OneToOneField(
+        'ServicioConectividad', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+    piso_vigente = models.OneToOneField(
+        'PisoTecnologico', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+
+    # Copia del servicio y del piso vigentes para filtrar sin joins (CAMPOS_DERIVADOS).
+    # Las mantiene desnormalizacion.sincronizar_escuelas; no se editan a mano.
+    internet_estado = models.ForeignKey(
+        EstadoConectividad, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+    internet_proveedor = models.ForeignKey(
+        ProveedorInternet, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+    internet_velocidad = models.IntegerField(null=True, blank=True, editable=False)
+    internet_ano_instalacion = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
+    internet_ano_mejora = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
+    piso_plan = models.ForeignKey(
+        PlanPiso, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+    piso_proveedor = models.ForeignKey(
+        ProveedorPisoTecnologico, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+',
+    )
+    piso_ano_terminado = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
+
     def __str__(self):
         return self.nombre
 
@@ -146,7 +348,7 @@ class Escuela(models.Model):
 # SERVICIOS Y PISO TECNOLÓGICO
 # -------------------------------------------------------------------------
 
-class ServicioConectividad(models.Model):
+class ServicioConectividad(ModeloConSeguimiento):
     escuela = models.ForeignKey(Escuela, on_delete=models.CASCADE)
     estado_conectividad = models.ForeignKey(EstadoConectividad, on_delete=models.SET_NULL, null=True)
     proveedor = models.ForeignKey(ProveedorInternet, on_delete=models.SET_NULL, null=True)
@@ -158,11 +360,14 @@ class ServicioConectividad(models.Model):
     metodo_solicitud = models.ForeignKey(MetodoSolicitud, on_delete=models.SET_NULL, null=True, blank=True)
     observaciones = models.TextField(blank=True, null=True)
 
+    # Día en que la escuela dejó de tener este servicio; la fila queda como historial
+    fecha_baja = models.DateField(blank=True, null=True)
+
     def __str__(self):
         return f"Servicio de {self.escuela.nombre}"
 
 
-class PisoTecnologico(models.Model):
+class PisoTecnologico(ModeloConSeguimiento):
     escuela = models.ForeignKey(Escuela, on_delete=models.CASCADE)
     plan_piso = models.ForeignKey(PlanPiso, on_delete=models.SET_NULL, null=True)
     proveedor = models.ForeignKey(ProveedorPisoTecnologico, on_delete=models.SET_NULL, null=True)
@@ -175,5 +380,202 @@ class PisoTecnologico(models.Model):
 
     observaciones = models.TextField(blank=True, null=True)
 
+    # Día en que la escuela dejó de tener este piso; la fila queda como historial
+    fecha_baja = models.DateField(blank=True, null=True)
+
     def __str__(self):
         return f"Piso Tecnológico en {self.escuela.nombre}"
+
+
+# -------------------------------------------------------------------------
+# REGISTRO DE CAMBIOS (feed para sistemas externos)
+# -------------------------------------------------------------------------
+
+class RegistroCambio(models.Model):
+    """
+    Log de solo agregado con cada alta, modificación o baja de Escuela,
+    ServicioConectividad y PisoTecnologico. Lo consume api/cambios/.
+    """
+    CREADO = 'creado'
+    MODIFICADO = 'modificado'
+    ELIMINADO = 'eliminado'
+    ACCIONES = [
+        (CREADO, 'Creado'),
+        (MODIFICADO, 'Modificado'),
+        (ELIMINADO, 'Eliminado'),
+    ]
+
+    modelo = models.CharField(max_length=50)
+    accion = models.CharField(max_length=12, choices=ACCIONES)
+    # Sin FK a propósito: el registro debe sobrevivir a la baja del objeto.
+    # objeto_id puede ser nulo si la base no devuelve ids en bulk_create (MySQL).
+    objeto_id = models.BigIntegerField(null=True, blank=True)
+    cue = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    hash_contenido = models.CharField(max_length=40, blank=True, default='')
+    datos = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Registro de Cambio"
+        verbose_name_plural = "Registro de Cambios"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_accion_display()} {self.modelo} {self.cue}"
+
+
+def datos_cambio(obj):
+    """Valores de los campos concretos (FK como id) para el campo 'datos' del registro."""
+    return {
+        field.attname: getattr(obj, field.attname)
+        for field in obj._meta.concrete_fields
+        if field.attname not in CAMPOS_SIN_HASH
+    }
+
+
+def registrar_cambios(objs, accion):
+    """Agrega al log una fila por objeto, en una sola inserción."""
+    objs = list(objs)
+    if not objs:
+        return []
+
+    # CUE de la escuela de cada servicio/piso: relación ya cargada o una consulta por lote
+    cues = {}
+    faltantes = set()
+    for obj in objs:
+        if isinstance(obj, Escuela):
+            continue
+        if 'escuela' in obj._state.fields_cache:
+            cues[obj.escuela_id] = obj.escuela.cue
+        else:
+            faltantes.add(obj.escuela_id)
+    if faltantes:
+        cues.update(Escuela._base_manager.filter(pk__in=faltantes).values_list('id', 'cue'))
+
+    registros = [
+        RegistroCambio(
+            modelo=obj._meta.model_name,
+            accion=accion,
+            objeto_id=obj.pk,
+            cue=obj.cue if isinstance(obj, Escuela) else cues.get(obj.escuela_id, ''),
+            hash_contenido=obj.hash_contenido if accion != RegistroCambio.ELIMINADO else '',
+            datos=datos_cambio(obj) if accion != RegistroCambio.ELIMINADO else None,
+        )
+        for obj in objs
+    ]
+    creados = RegistroCambio.objects.bulk_create(registros, batch_size=TAMANO_LOTE)
+
+    # La revisión de datos es el último id del registro: las cachés se invalidan solas
+    from .revision import invalidar_revision
+    transaction.on_commit(invalidar_revision)
+    return creados
+
+
+# El id de un RegistroCambio se asigna al insertar la fila, pero la fila se
+# ve recién cuando su transacción confirma: una importación larga puede
+# confirmar ids más bajos que otros ya visibles. Un hueco en los ids seguido
+# de filas de hace menos de este margen puede ser una transacción abierta;
+# pasado el margen se toma como un rollback (ids que nunca van a aparecer).
+MARGEN_CONFIRMACION = timedelta(minutes=10)
+
+
+def hasta_confirmados(registros, desde):
+    """
+    Recorta 'registros' (dicts con 'id' y 'fecha', ordenados por id y todos
+    con id mayor a 'desde') antes del primer hueco de ids que todavía puede
+    llenarse. Devuelve (registros, recortado).
+
+    Quien avanza un cursor con el último id devuelto no saltea filas de
+    transacciones que confirman hasta MARGEN_CONFIRMACION después de creada
+    la fila siguiente.
+    """
+    limite = timezone.now() - MARGEN_CONFIRMACION
+    anterior = desde
+    for i, registro in enumerate(registros):
+        if registro['id'] != anterior + 1 and registro['fecha'] > limite:
+            return registros[:i], True
+        anterior = registro['id']
+    return registros, False
+
+
+# -------------------------------------------------------------------------
+# VERSIÓN DE LOS CATÁLOGOS
+# -------------------------------------------------------------------------
+
+class VersionCatalogos(models.Model):
+    """
+    Contador de una sola fila (id=1) que avanza con cada alta, modificación o
+    baja de un catálogo (regiones, distritos, categorías, proveedores...).
+    Los catálogos no pasan por el RegistroCambio; las claves de caché llevan
+    este número junto a la revisión de datos (ver revision.py).
+    """
+    numero = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versión de Catálogos"
+        verbose_name_plural = "Versión de Catálogos"
+
+    def __str__(self):
+        return f"Catálogos v{self.numero}"
+
+
+def avanzar_version_catalogos():
+    """Suma uno a la versión de los catálogos (en la transacción en curso)."""
+    if not VersionCatalogos.objects.filter(pk=1).update(numero=models.F('numero') + 1):
+        VersionCatalogos.objects.get_or_create(pk=1, defaults={'numero': 1})
+
+    from .revision import invalidar_revision
+    transaction.on_commit(invalidar_revision)
+
+
+# -------------------------------------------------------------------------
+# INSTANTÁNEAS DE COBERTURA (series de tiempo)
+# -------------------------------------------------------------------------
+
+class InstantaneaCobertura(models.Model):
+    """
+    Conteos de cobertura de un día por región, distrito y categoría.
+    Las escribe el comando tomar_instantanea (ver tendencias.py); las
+    consultas históricas leen solo esta tabla, nunca Escuela.
+    """
+    fecha = models.DateField(db_index=True)
+    # Sin FK a propósito: la serie debe sobrevivir a la baja de un catálogo
+    region_id = models.IntegerField(null=True, blank=True, db_index=True)
+    distrito_id = models.IntegerField(null=True, blank=True, db_index=True)
+    categoria_id = models.IntegerField(null=True, blank=True, db_index=True)
+
+    total_escuelas = models.PositiveIntegerField(default=0)
+    con_internet = models.PositiveIntegerField(default=0)
+    con_piso = models.PositiveIntegerField(default=0)
+    matricula = models.PositiveIntegerField(default=0)
+    matricula_con_internet = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Instantánea de Cobertura"
+        verbose_name_plural = "Instantáneas de Cobertura"
+        ordering = ['fecha', 'id']
+
+    def __str__(self):
+        return f"Cobertura {self.fecha} ({self.total_escuelas} escuelas)"
+
+
+# -------------------------------------------------------------------------
+# IMPORTACIONES PENDIENTES DE CONFIRMACIÓN
+# -------------------------------------------------------------------------
+
+class ImportacionPendiente(models.Model):
+    """
+    CSV previsualizado que espera la confirmación del usuario (ver
+    importacion.guardar_pendiente). Vive en la base para que lo confirme
+    cualquier worker o réplica; las vencidas se borran al guardar otra.
+    """
+    token = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    contenido = models.TextField()
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Importación Pendiente"
+        verbose_name_plural = "Importaciones Pendientes"
+
+    def __str__(self):
+        return f"Importación pendiente {self.token} ({self.fecha:%Y-%m-%d %H:%M})"
@@ -0,0 +1,45 @@
+#gestor/paginas.py
+"""
+Caché de páginas completas para los reportes.
+
+Los números de los reportes cambian solo cuando cambian los datos, así que
+la respuesta entera se guarda bajo la revisión (ver revision.py) y la URL
+completa: un cambio de datos deja obsoletas todas las páginas sin borrarlas.
+Solo se cachean los GET anónimos; con sesión iniciada la barra superior
+muestra el usuario y la vista se resuelve normalmente (los fragmentos de la
+plantilla siguen cacheados con {% cache %}).
+
+Si varios pedidos anónimos llegan a la misma página con la caché vacía, cada
+uno arma su respuesta, pero las consultas de la vista pasan por
+revision.cacheado y esas se calculan una sola vez (en_vuelo.py). La página
+no toma un turno propio: lo tendría tomado mientras la vista espera los
+turnos de sus propios cálculos.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+
+from .revision import TTL_CACHE, clave_cache
+
+
+def _cacheable(response):
+    # Una respuesta que fija cookies (sesión, CSRF) no se puede compartir
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def cache_por_revision(vista):
+    """Decorador: sirve la página desde la caché para GET anónimos."""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+        ruta = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()[:16]
+        clave = clave_cache('pagina', vista.__name__, ruta)
+        response = cache.get(clave)
+        if response is None:
+            response = vista(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(clave, response, TTL_CACHE)
+        return response
+    return envoltura
@@ -0,0 +1,272 @@
+#gestor/pivote.py
+"""
+Motor de reportes cruzados (tablas dinámicas) sobre Escuela.
+
+Un pedido elige de una a tres dimensiones (DIMENSIONES) y una o más medidas
+(MEDIDAS) con filtros opcionales por cualquier dimensión. Cada pedido se
+compila a una sola consulta agrupada sobre la tabla de escuelas: las
+dimensiones de servicio y piso salen de las columnas copiadas en Escuela
+(ver desnormalizacion.py) y los nombres de los catálogos vienen con un join
+directo, sin relaciones inversas.
+
+La consulta devuelve componentes sumables (cantidades y sumas) y las medidas
+se calculan a partir de ellos, así los totales y subtotales de la tabla
+cruzada salen sin volver a consultar. Los grupos se cachean por firma
+(dimensiones y filtros) bajo la revisión de datos.
+"""
+import hashlib
+import io
+import json
+
+import openpyxl
+from django.db.models import Count, Q, Sum
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from .models import Escuela
+from .revision import cacheado, clave_cache
+
+
+# clave -> (campo de Escuela, título)
+DIMENSIONES = {
+    'region': ('region', 'Región'),
+    'distrito': ('distrito', 'Distrito'),
+    'ciudad': ('ciudad', 'Ciudad'),
+    'ambito': ('ambito', 'Ámbito'),
+    'dependencia': ('dependencia', 'Dependencia'),
+    'turno': ('turno', 'Turno'),
+    'categoria': ('categoria', 'Categoría'),
+    'tipo_establecimiento': ('tipo_establecimiento', 'Tipo de Establecimiento'),
+    'proveedor': ('internet_proveedor', 'Proveedor de Internet'),
+    'estado_conectividad': ('internet_estado', 'Estado de Conectividad'),
+    'plan_piso': ('piso_plan', 'Plan de Piso'),
+}
+
+# Componentes que calcula la consulta (todos sumables entre grupos)
+COMPONENTES = {
+    'n_escuelas': Count('id'),
+    'n_con_internet': Count('id', filter=Q(tiene_internet=True)),
+    'n_con_piso': Count('id', filter=Q(tiene_piso_tecnologico=True)),
+    'suma_matricula': Sum('matricula'),
+    'suma_matricula_con_internet': Sum('matricula', filter=Q(tiene_internet=True)),
+    'suma_velocidad': Sum('internet_velocidad'),
+    'n_velocidad': Count('internet_velocidad'),
+}
+
+
+def _division(a, b, factor=1, decimales=1):
+    return round(factor * a / b, decimales) if b else None
+
+
+# clave -> (título, función sobre los componentes)
+MEDIDAS = {
+    'escuelas': ('Escuelas', lambda c: c['n_escuelas']),
+    'matricula': ('Matrícula', lambda c: c['suma_matricula']),
+    'velocidad_promedio': ('Velocidad promedio (Mbps)', lambda c: _division(c['suma_velocidad'], c['n_velocidad'])),
+    'cobertura_internet': ('Cobertura Internet (%)', lambda c: _division(c['n_con_internet'], c['n_escuelas'], 100)),
+    'cobertura_piso': ('Cobertura Piso (%)', lambda c: _division(c['n_con_piso'], c['n_escuelas'], 100)),
+    'cobertura_matricula': ('Cobertura Internet por Matrícula (%)',
+                            lambda c: _division(c['suma_matricula_con_internet'], c['suma_matricula'], 100)),
+}
+
+MEDIDAS_POR_DEFECTO = ('escuelas', 'cobertura_internet')
+MAX_DIMENSIONES = 3
+SIN_DATO = 'Sin dato'
+
+
+# -------------------------------------------------------------------------
+# PEDIDO
+# -------------------------------------------------------------------------
+
+def _lista(params, plural, singular):
+    """'a,b' en el parámetro plural o el singular repetido (lo que envía el formulario)."""
+    if params.get(plural):
+        return [v for v in params[plural].split(',') if v]
+    return [v for v in params.getlist(singular) if v] if hasattr(params, 'getlist') else []
+
+
+def leer_pedido(params):
+    """
+    Lee dimensiones, medidas y filtros de los parámetros GET:
+        dimensiones=region,categoria  medidas=escuelas,matricula  region=3
+    (o dimension=... y medida=... repetidos). Devuelve
+    (dimensiones, medidas, filtros) o lanza ValueError.
+    """
+    dimensiones = _lista(params, 'dimensiones', 'dimension')
+    if not 1 <= len(dimensiones) <= MAX_DIMENSIONES:
+        raise ValueError(f'Elegí entre 1 y {MAX_DIMENSIONES} dimensiones')
+    invalidas = [d for d in dimensiones if d not in DIMENSIONES]
+    if invalidas:
+        raise ValueError(f'Dimensión desconocida: {", ".join(invalidas)}')
+    if len(set(dimensiones)) != len(dimensiones):
+        raise ValueError('Las dimensiones no pueden repetirse')
+
+    medidas = _lista(params, 'medidas', 'medida') or list(MEDIDAS_POR_DEFECTO)
+    invalidas = [m for m in medidas if m not in MEDIDAS]
+    if invalidas:
+        raise ValueError(f'Medida desconocida: {", ".join(invalidas)}')
+
+    filtros = {}
+    for clave in DIMENSIONES:
+        valor = params.get(clave, '')
+        if valor:
+            if not valor.isdigit():
+                raise ValueError(f'Valor inválido para {clave}')
+            filtros[clave] = int(valor)
+    return dimensiones, list(dict.fromkeys(medidas)), filtros
+
+
+def firma(dimensiones, filtros):
+    """Clave estable del pedido (las medidas no cambian la consulta)."""
+    contenido = json.dumps([dimensiones, sorted(filtros.items())])
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+# -------------------------------------------------------------------------
+# CONSULTA
+# -------------------------------------------------------------------------
+
+def _consultar_grupos(dimensiones, filtros):
+    """Una consulta: GROUP BY por el id y el nombre de cada dimensión."""
+    qs = Escuela.objects.filter(**{f'{DIMENSIONES[d][0]}_id': v for d, v in filtros.items()})
+    campos = []
+    for d in dimensiones:
+        campo = DIMENSIONES[d][0]
+        campos += [f'{campo}_id', f'{campo}__nombre']
+    filas = qs.values(*campos).annotate(**COMPONENTES).order_by(*campos[1::2], *campos[::2])
+
+    grupos = []
+    for fila in filas:
+        grupos.append({
+            'claves': [fila[f'{DIMENSIONES[d][0]}_id'] for d in dimensiones],
+            'etiquetas': [fila[f'{DIMENSIONES[d][0]}__nombre'] or SIN_DATO for d in dimensiones],
+            'componentes': {c: fila[c] or 0 for c in COMPONENTES},
+        })
+    return grupos
+
+
+def grupos(dimensiones, filtros):
+    """Grupos con sus componentes, cacheados por firma y revisión."""
+    return cacheado(clave_cache('pivote', firma(dimensiones, filtros)),
+                    lambda: _consultar_grupos(dimensiones, filtros))
+
+
+def _sumar(lista):
+    total = dict.fromkeys(COMPONENTES, 0)
+    for componentes in lista:
+        for c in COMPONENTES:
+            total[c] += componentes[c]
+    return total
+
+
+def _medir(componentes, medidas):
+    return {m: MEDIDAS[m][1](componentes) for m in medidas}
+
+
+# -------------------------------------------------------------------------
+# RESULTADO
+# -------------------------------------------------------------------------
+
+def consultar(dimensiones, medidas, filtros):
+    """
+    Resultado plano (para JSON):
+        {'dimensiones': [...], 'medidas': [...], 'filas': [...], 'total': {...}}
+    """
+    lista = grupos(dimensiones, filtros)
+    return {
+        'dimensiones': [{'clave': d, 'titulo': DIMENSIONES[d][1]} for d in dimensiones],
+        'medidas': [{'clave': m, 'titulo': MEDIDAS[m][0]} for m in medidas],
+        'filtros': filtros,
+        'filas': [{
+            'claves': g['claves'],
+            'etiquetas': g['etiquetas'],
+            'valores': _medir(g['componentes'], medidas),
+        } for g in lista],
+        'total': _medir(_sumar(g['componentes'] for g in lista), medidas),
+    }
+
+
+def tabla_cruzada(dimensiones, medidas, filtros):
+    """
+    Tabla para HTML y Excel. Con dos o tres dimensiones la última va en
+    columnas y las demás en filas; con una sola, solo hay filas. Cada fila
+    trae sus celdas (una lista de valores por columna, None si no hay
+    escuelas) y su total; al final van los totales por columna y el general.
+    Los valores son listas en el orden de 'medidas'.
+    """
+    lista = grupos(dimensiones, filtros)
+    cruzada = len(dimensiones) > 1
+    dimensiones_filas = dimensiones[:-1] if cruzada else dimensiones
+
+    def valores(componentes):
+        medido = _medir(_sumar(componentes), medidas)
+        return [medido[m] for m in medidas]
+
+    columnas = {}
+    filas = {}
+    for g in lista:
+        n = len(dimensiones_filas)
+        fila = filas.setdefault((tuple(g['claves'][:n]), tuple(g['etiquetas'][:n])), {})
+        columna = (g['claves'][-1], g['etiquetas'][-1]) if cruzada else None
+        columnas.setdefault(columna, []).append(g['componentes'])
+        fila.setdefault(columna, []).append(g['componentes'])
+
+    orden_columnas = sorted(columnas, key=lambda c: (c[1] == SIN_DATO, c[1])) if cruzada else []
+    vacia = [None] * len(medidas)
+    return {
+        'dimensiones_filas': [DIMENSIONES[d][1] for d in dimensiones_filas],
+        'dimension_columnas': DIMENSIONES[dimensiones[-1]][1] if cruzada else None,
+        'columnas': [etiqueta for _, etiqueta in orden_columnas],
+        'medidas': [MEDIDAS[m][0] for m in medidas],
+        'filas': [{
+            'etiquetas': list(etiquetas),
+            'celdas': [valores(por_columna[c]) if c in por_columna else vacia for c in orden_columnas],
+            'total': valores(comp for grupo in por_columna.values() for comp in grupo),
+        } for (_, etiquetas), por_columna in filas.items()],
+        'totales_columnas': [valores(columnas[c]) for c in orden_columnas],
+        'total': valores(g['componentes'] for g in lista),
+    }
+
+
+# -------------------------------------------------------------------------
+# EXCEL
+# -------------------------------------------------------------------------
+
+def excel(tabla):
+    """Bytes de un .xlsx con la tabla cruzada (modo write_only: memoria constante)."""
+    workbook = openpyxl.Workbook(write_only=True)
+    hoja = workbook.create_sheet('Reporte cruzado')
+    negrita = Font(bold=True)
+
+    def resaltada(valores):
+        celdas = []
+        for valor in valores:
+            celda = WriteOnlyCell(hoja, value=valor)
+            celda.font = negrita
+            celdas.append(celda)
+        return celdas
+
+    medidas = tabla['medidas']
+    vacias = [''] * len(tabla['dimensiones_filas'])
+    grupos_columnas = tabla['columnas'] + ['Total']
+    if tabla['dimension_columnas']:
+        fila_columnas = list(vacias)
+        for columna in grupos_columnas:
+            fila_columnas += [columna] + [''] * (len(medidas) - 1)
+        hoja.append(resaltada(fila_columnas))
+    hoja.append(resaltada(tabla['dimensiones_filas'] + medidas * len(grupos_columnas)))
+
+    for fila in tabla['filas']:
+        linea = list(fila['etiquetas'])
+        for celda in fila['celdas'] + [fila['total']]:
+            linea += celda
+        hoja.append(linea)
+
+    total = ['Total'] + vacias[1:]
+    for celda in tabla['totales_columnas'] + [tabla['total']]:
+        total += celda
+    hoja.append(resaltada(total))
+
+    salida = io.BytesIO()
+    workbook.save(salida)
+    return salida.getvalue()
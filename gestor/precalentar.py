@@ -0,0 +1,158 @@
+#gestor/precalentar.py
+"""
+Precalentamiento de cachés después de un deploy o de una importación.
+
+Calcula por adelantado lo que de otro modo pagarían los primeros usuarios
+con la caché fría: catálogos, cifras del dashboard y de los reportes
+(también por región), páginas completas de los reportes, el índice espacial
+y las vistas más pedidas de los mapas (el primer pintado y las teselas de
+los zoom bajos). Todo se guarda con las mismas claves que usan las vistas,
+bajo la revisión de datos vigente.
+
+Lo que vive en la caché compartida (CACHE_DIR) o en disco (teselas) sirve a
+todos los procesos; lo que vive en memoria (índice espacial, caché local)
+solo al proceso que precalienta. Por eso, tras una importación se corre en
+segundo plano dentro del mismo proceso web.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections, connections, transaction
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from . import analitica, cobertura, espacial, mapa, pivote, proveedores, teselas
+from .catalogos import arbol_geografico
+
+
+logger = logging.getLogger(__name__)
+
+# Las teselas de la vista general (provincia completa) se generan hasta este zoom
+ZOOM_TESELAS = 8
+
+_lock = threading.Lock()
+_pendiente = threading.Event()
+
+
+# -------------------------------------------------------------------------
+# PASOS
+# -------------------------------------------------------------------------
+
+def _catalogos():
+    arbol_geografico()
+
+
+def _cifras():
+    cobertura.dashboard()
+    cobertura.conectadas_por_categoria()
+    cobertura.generales()
+    # Reporte general de toda la provincia y de cada región, con los
+    # parámetros tal como los manda el formulario (distrito vacío)
+    cobertura.reporte_general()
+    for region in arbol_geografico()['regiones']:
+        cobertura.reporte_general(str(region['id']), '')
+
+
+def _analisis():
+    analitica.brechas()
+    proveedores.reporte()
+    pivote.grupos(['region', 'categoria'], {})
+
+
+def _paginas():
+    """Páginas completas (caché de GET anónimos) de los reportes más visitados."""
+    from . import views
+
+    rutas = [
+        (views.dashboard, reverse('dashboard')),
+        (views.reporte_internet, reverse('reporte_internet')),
+        (views.reporte_piso, reverse('reporte_piso')),
+        (views.reportes_generales, reverse('reportes_generales')),
+    ]
+    for region in arbol_geografico()['regiones']:
+        consulta = urlencode({'region': region['id'], 'distrito': ''})
+        rutas.append((views.reportes_generales, f"{reverse('reportes_generales')}?{consulta}"))
+
+    fabrica = RequestFactory()
+    for vista, ruta in rutas:
+        request = fabrica.get(ruta)
+        request.user = AnonymousUser()
+        vista(request)
+
+
+def _indice_espacial():
+    espacial.indice()
+
+
+def _mapas():
+    mapa.vista_inicial_internet()
+    teselas.generar(0, ZOOM_TESELAS)
+
+
+# clave -> (descripción, función)
+PASOS = {
+    'catalogos': ('catálogos', _catalogos),
+    'cifras': ('cifras de dashboard y reportes', _cifras),
+    'analisis': ('brechas, proveedores y reporte cruzado', _analisis),
+    'paginas': ('páginas de reportes', _paginas),
+    'indice': ('índice espacial', _indice_espacial),
+    'mapas': ('mapas y teselas', _mapas),
+}
+
+
+# -------------------------------------------------------------------------
+# EJECUCIÓN
+# -------------------------------------------------------------------------
+
+def precalentar(omitir=()):
+    """
+    Corre los pasos (salvo las claves de 'omitir') y devuelve
+    [(descripción, segundos o None si falló)]. Un paso que falla se registra
+    y no corta los siguientes.
+    """
+    tiempos = []
+    for clave, (descripcion, paso) in PASOS.items():
+        if clave in omitir:
+            continue
+        inicio = time.monotonic()
+        try:
+            paso()
+        except Exception:
+            logger.exception('Falló el precalentamiento de %s', descripcion)
+            tiempos.append((descripcion, None))
+            continue
+        tiempos.append((descripcion, time.monotonic() - inicio))
+    return tiempos
+
+
+def _en_hilo():
+    # Si ya hay un precalentamiento en curso, se le pide una vuelta más
+    # (los datos cambiaron de nuevo mientras corría) y este hilo termina
+    _pendiente.set()
+    # Tras soltar el lock se vuelve a mirar el pedido: si llegó entre la
+    # última comprobación y el release, el otro hilo ya se fue creyendo que
+    # este lo atendería
+    while _pendiente.is_set() and _lock.acquire(blocking=False):
+        try:
+            close_old_connections()
+            while _pendiente.is_set():
+                _pendiente.clear()
+                precalentar()
+        finally:
+            connections.close_all()
+            _lock.release()
+
+
+def precalentar_en_segundo_plano():
+    """
+    Lanza el precalentamiento en un hilo al confirmar la transacción en curso
+    (o en el acto si no hay ninguna). Se desactiva con
+    PRECALENTAR_TRAS_IMPORTAR = False en settings.
+    """
+    if not getattr(settings, 'PRECALENTAR_TRAS_IMPORTAR', True):
+        return
+    transaction.on_commit(lambda: threading.Thread(target=_en_hilo, daemon=True).start())
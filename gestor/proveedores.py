@@ -0,0 +1,253 @@
+#gestor/proveedores.py
+"""
+Desempeño de los proveedores de Internet.
+
+Para cada proveedor del servicio vigente de las escuelas reporta:
+  - escuelas y matrícula atendidas,
+  - la distribución del ancho de banda (tramos y percentiles),
+  - la demora entre la instalación y la mejora del servicio,
+  - el desglose por región.
+
+Todo sale de dos consultas agrupadas sobre Escuela (proveedor y velocidad
+son columnas copiadas del servicio vigente; las fechas vienen con un solo
+join a ese servicio). Los tramos se arman con Case/When en la base de datos.
+Los percentiles salen de la distribución exacta de velocidades, que tiene
+pocos valores distintos (los planes contratados). El resultado se cachea
+bajo la revisión de datos.
+"""
+import io
+
+import openpyxl
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, When
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from .models import Escuela
+from .revision import cacheado, clave_cache
+
+
+# (desde, hasta) en Mbps, hasta exclusivo; None = sin límite
+TRAMOS_VELOCIDAD = (
+    (1, 10, 'Menos de 10 Mbps'),
+    (10, 50, '10 a 49 Mbps'),
+    (50, 100, '50 a 99 Mbps'),
+    (100, 300, '100 a 299 Mbps'),
+    (300, None, '300 Mbps o más'),
+)
+# Velocidad nula o 0 (el valor por defecto del servicio): no se informó
+SIN_VELOCIDAD = 'Sin dato'
+TRAMOS = [SIN_VELOCIDAD] + [etiqueta for _, _, etiqueta in TRAMOS_VELOCIDAD]
+
+PERCENTILES = (25, 50, 75, 90)
+SIN_PROVEEDOR = 'Sin proveedor'
+
+
+def _tramo():
+    """Índice del tramo de velocidad (0 = sin dato), calculado en la base de datos."""
+    casos = []
+    for indice, (desde, hasta, _) in enumerate(TRAMOS_VELOCIDAD, start=1):
+        condicion = Q(internet_velocidad__gte=desde)
+        if hasta is not None:
+            condicion &= Q(internet_velocidad__lt=hasta)
+        casos.append(When(condicion, then=Value(indice)))
+    return Case(*casos, default=Value(0), output_field=IntegerField())
+
+
+CON_VELOCIDAD = Q(internet_velocidad__gt=0)
+CON_MEJORA = Q(
+    servicio_vigente__fecha_mejora__isnull=False,
+    servicio_vigente__fecha_instalacion__isnull=False,
+    servicio_vigente__fecha_mejora__gte=F('servicio_vigente__fecha_instalacion'),
+)
+DEMORA_MEJORA = ExpressionWrapper(
+    F('servicio_vigente__fecha_mejora') - F('servicio_vigente__fecha_instalacion'),
+    output_field=DurationField(),
+)
+
+# Componentes sumables entre grupos (los promedios salen de ellos).
+# 'matricula' ya es un campo de Escuela: la suma lleva otro nombre
+COMPONENTES = {
+    'escuelas': Count('id'),
+    'suma_matricula': Sum('matricula'),
+    'n_velocidad': Count('id', filter=CON_VELOCIDAD),
+    'suma_velocidad': Sum('internet_velocidad', filter=CON_VELOCIDAD),
+    'con_mejora': Count('id', filter=CON_MEJORA),
+    'demora_mejora': Sum(DEMORA_MEJORA, filter=CON_MEJORA),
+}
+
+
+# -------------------------------------------------------------------------
+# CONSULTAS
+# -------------------------------------------------------------------------
+
+def _escuelas_con_servicio():
+    return Escuela.objects.filter(servicio_vigente__isnull=False)
+
+
+def _grupos():
+    """Una consulta: componentes por (proveedor, región, tramo de velocidad)."""
+    filas = (
+        _escuelas_con_servicio()
+        .annotate(tramo=_tramo())
+        .values('internet_proveedor_id', 'internet_proveedor__nombre', 'region_id', 'region__nombre', 'tramo')
+        .annotate(**COMPONENTES)
+        .order_by()
+    )
+    for fila in filas:
+        fila['matricula'] = fila.pop('suma_matricula') or 0
+        fila['suma_velocidad'] = fila['suma_velocidad'] or 0
+        fila['demora_mejora'] = fila['demora_mejora'].days if fila['demora_mejora'] else 0
+        yield fila
+
+
+def _distribucion():
+    """Otra consulta: cantidad de escuelas por (proveedor, velocidad exacta)."""
+    return (
+        _escuelas_con_servicio().filter(CON_VELOCIDAD)
+        .values_list('internet_proveedor_id', 'internet_velocidad')
+        .annotate(cantidad=Count('id'))
+        .order_by('internet_proveedor_id', 'internet_velocidad')
+    )
+
+
+# -------------------------------------------------------------------------
+# CÁLCULO
+# -------------------------------------------------------------------------
+
+def percentiles(distribucion):
+    """Percentiles (rango más cercano) de una lista ordenada de pares (valor, cantidad)."""
+    total = sum(cantidad for _, cantidad in distribucion)
+    resultado = {}
+    for p in PERCENTILES:
+        if not total:
+            resultado[f'p{p}'] = None
+            continue
+        # Posición (1..total) del percentil y primer valor que la alcanza
+        posicion = max(1, -(-p * total // 100))
+        acumulado = 0
+        for valor, cantidad in distribucion:
+            acumulado += cantidad
+            if acumulado >= posicion:
+                resultado[f'p{p}'] = valor
+                break
+    return resultado
+
+
+def _nuevo():
+    return {'escuelas': 0, 'matricula': 0, 'n_velocidad': 0, 'suma_velocidad': 0,
+            'con_mejora': 0, 'demora_mejora': 0, 'histograma': [0] * len(TRAMOS)}
+
+
+def _acumular(destino, fila):
+    for clave in ('escuelas', 'matricula', 'n_velocidad', 'suma_velocidad', 'con_mejora', 'demora_mejora'):
+        destino[clave] += fila[clave]
+    destino['histograma'][fila['tramo']] += fila['escuelas']
+
+
+def _cerrar(acumulado):
+    """Convierte los componentes en las cifras del reporte."""
+    n_velocidad, con_mejora = acumulado.pop('n_velocidad'), acumulado['con_mejora']
+    suma_velocidad, demora = acumulado.pop('suma_velocidad'), acumulado.pop('demora_mejora')
+    acumulado['velocidad_promedio'] = round(suma_velocidad / n_velocidad, 1) if n_velocidad else None
+    acumulado['demora_mejora_dias'] = round(demora / con_mejora, 1) if con_mejora else None
+    return acumulado
+
+
+def calcular():
+    """
+    Reporte completo:
+        {'tramos': [...], 'proveedores': [{..., 'regiones': [...]}], 'total': {...}}
+    """
+    proveedores = {}
+    total = _nuevo()
+    for fila in _grupos():
+        clave = fila['internet_proveedor_id']
+        proveedor = proveedores.setdefault(clave, dict(
+            _nuevo(), id=clave, nombre=fila['internet_proveedor__nombre'] or SIN_PROVEEDOR, regiones={},
+        ))
+        region = proveedor['regiones'].setdefault(fila['region_id'], dict(
+            _nuevo(), id=fila['region_id'], nombre=fila['region__nombre'] or 'Sin región',
+        ))
+        for destino in (proveedor, region, total):
+            _acumular(destino, fila)
+
+    por_proveedor = {}
+    for proveedor_id, velocidad, cantidad in _distribucion():
+        por_proveedor.setdefault(proveedor_id, []).append((velocidad, cantidad))
+    # La distribución total se arma sumando la de cada proveedor
+    distribucion_total = {}
+    for pares in por_proveedor.values():
+        for velocidad, cantidad in pares:
+            distribucion_total[velocidad] = distribucion_total.get(velocidad, 0) + cantidad
+
+    resultado = []
+    for clave, proveedor in proveedores.items():
+        proveedor['regiones'] = sorted(
+            (_cerrar(region) for region in proveedor['regiones'].values()), key=lambda r: r['nombre']
+        )
+        proveedor.update(percentiles(por_proveedor.get(clave, [])))
+        resultado.append(_cerrar(proveedor))
+    resultado.sort(key=lambda p: (-p['escuelas'], p['nombre']))
+
+    total.update(percentiles(sorted(distribucion_total.items())))
+    return {'tramos': TRAMOS, 'percentiles': [f'p{p}' for p in PERCENTILES],
+            'proveedores': resultado, 'total': _cerrar(total)}
+
+
+def reporte():
+    """Resultado de calcular() para la revisión actual (cacheado)."""
+    return cacheado(clave_cache('reporte_proveedores'), calcular)
+
+
+# -------------------------------------------------------------------------
+# EXCEL
+# -------------------------------------------------------------------------
+
+COLUMNAS_RESUMEN = (
+    ('escuelas', 'Escuelas'),
+    ('matricula', 'Matrícula'),
+    ('velocidad_promedio', 'Velocidad promedio (Mbps)'),
+    ('p25', 'P25 (Mbps)'),
+    ('p50', 'Mediana (Mbps)'),
+    ('p75', 'P75 (Mbps)'),
+    ('p90', 'P90 (Mbps)'),
+    ('con_mejora', 'Servicios mejorados'),
+    ('demora_mejora_dias', 'Días promedio hasta la mejora'),
+)
+
+
+def excel(datos):
+    """Bytes de un .xlsx con el resumen, los tramos de velocidad y el desglose por región."""
+    workbook = openpyxl.Workbook(write_only=True)
+    negrita = Font(bold=True)
+
+    def resaltada(hoja, valores):
+        celdas = []
+        for valor in valores:
+            celda = WriteOnlyCell(hoja, value=valor)
+            celda.font = negrita
+            celdas.append(celda)
+        return celdas
+
+    hoja = workbook.create_sheet('Proveedores')
+    hoja.append(resaltada(hoja, ['Proveedor'] + [titulo for _, titulo in COLUMNAS_RESUMEN]))
+    for proveedor in datos['proveedores']:
+        hoja.append([proveedor['nombre']] + [proveedor[clave] for clave, _ in COLUMNAS_RESUMEN])
+    hoja.append(resaltada(hoja, ['Total'] + [datos['total'][clave] for clave, _ in COLUMNAS_RESUMEN]))
+
+    hoja = workbook.create_sheet('Velocidades')
+    hoja.append(resaltada(hoja, ['Proveedor'] + datos['tramos']))
+    for proveedor in datos['proveedores']:
+        hoja.append([proveedor['nombre']] + proveedor['histograma'])
+    hoja.append(resaltada(hoja, ['Total'] + datos['total']['histograma']))
+
+    columnas_region = [c for c in COLUMNAS_RESUMEN if not c[0].startswith('p')]
+    hoja = workbook.create_sheet('Por región')
+    hoja.append(resaltada(hoja, ['Proveedor', 'Región'] + [titulo for _, titulo in columnas_region]))
+    for proveedor in datos['proveedores']:
+        for region in proveedor['regiones']:
+            hoja.append([proveedor['nombre'], region['nombre']] + [region[clave] for clave, _ in columnas_region])
+
+    salida = io.BytesIO()
+    workbook.save(salida)
+    return salida.getvalue()
@@ -0,0 +1,73 @@
+#gestor/revision.py
+"""
+Revisión de datos para las claves de caché.
+
+La revisión es el id del último RegistroCambio: avanza con cada alta,
+modificación o baja de escuelas, servicios y pisos. Los catálogos (nombres
+de regiones, distritos, categorías, proveedores...) no pasan por ese
+registro y tienen su propia versión (VersionCatalogos), que avanzan las
+señales de esos modelos. Las claves de caché incluyen las dos, así que un
+cambio de datos o de catálogos deja obsoletas todas las entradas anteriores
+sin tener que borrarlas una por una.
+"""
+from django.core.cache import cache
+
+from .en_vuelo import compartido
+
+
+CLAVE_REVISION = 'gestor:revisiones'
+
+# La revisión se guarda unos segundos para no consultarla en cada request.
+# En el proceso que escribe se invalida al confirmar la transacción; el resto
+# de los procesos la ven como mucho TTL_REVISION segundos más tarde.
+TTL_REVISION = 5
+
+# Las entradas cacheadas viven hasta que cambia la revisión (o vence este plazo)
+TTL_CACHE = 60 * 60
+
+
+def _revisiones():
+    """(revisión de datos, versión de catálogos), con una lectura cada TTL_REVISION."""
+    revisiones = cache.get(CLAVE_REVISION)
+    if revisiones is None:
+        from .models import RegistroCambio, VersionCatalogos
+        revisiones = (
+            RegistroCambio.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+            VersionCatalogos.objects.filter(pk=1).values_list('numero', flat=True).first() or 0,
+        )
+        cache.set(CLAVE_REVISION, revisiones, TTL_REVISION)
+    return revisiones
+
+
+def revision_datos():
+    """Devuelve la revisión actual de los datos (0 si no hubo cambios)."""
+    return _revisiones()[0]
+
+
+def version_catalogos():
+    """Devuelve la versión actual de los catálogos (0 si no hubo cambios)."""
+    return _revisiones()[1]
+
+
+def revision_cache():
+    """Revisión para las claves de caché: '<datos>.<catálogos>'."""
+    return '%d.%d' % _revisiones()
+
+
+def invalidar_revision():
+    """Fuerza a releer la revisión en la próxima consulta."""
+    cache.delete(CLAVE_REVISION)
+
+
+def clave_cache(prefijo, *partes):
+    """Arma una clave del tipo 'gestor:<prefijo>:<revisión>:<partes...>'."""
+    return ':'.join(['gestor', prefijo, revision_cache()] + [str(parte) for parte in partes])
+
+
+def cacheado(clave, calcular, ttl=TTL_CACHE):
+    """
+    Valor guardado bajo 'clave' (armada con clave_cache) o calculado y
+    guardado. Los pedidos simultáneos de la misma clave hacen un solo
+    cálculo (ver en_vuelo.py).
+    """
+    return compartido(clave, calcular, ttl)
@@ -0,0 +1,98 @@
+#gestor/signals.py
+"""
+Señales que alimentan el RegistroCambio desde cualquier camino de guardado
+que pase por save()/delete(): importaciones, admin y vistas.
+Los caminos masivos (update, bulk_create, bulk_update) registran desde
+SeguimientoQuerySet. También mantienen las columnas de Escuela derivadas de
+sus servicios y pisos, y avanzan la versión de los catálogos (ver
+revision.py) cuando cambia cualquiera de ellos.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .desnormalizacion import sincronizar_escuelas
+from .models import (
+    Ambito, Categoria, Ciudad, Dependencia, Distrito, Escuela, EstadoConectividad,
+    MetodoSolicitud, PisoTecnologico, PlanPiso, Predio, ProveedorInternet,
+    ProveedorPisoTecnologico, Region, RegistroCambio, ServicioConectividad,
+    TipoEstablecimiento, TipoPisoTecnologico, Turno, avanzar_version_catalogos,
+    registrar_cambios,
+)
+
+
+# Modelos cuyos nombres aparecen en las páginas y reportes cacheados
+CATALOGOS = (
+    Region, Distrito, Ciudad, Ambito, Dependencia, Turno, Categoria,
+    MetodoSolicitud, EstadoConectividad, TipoEstablecimiento, TipoPisoTecnologico,
+    PlanPiso, Predio, ProveedorInternet, ProveedorPisoTecnologico,
+)
+
+
+@receiver(post_save, sender=Escuela)
+@receiver(post_save, sender=ServicioConectividad)
+@receiver(post_save, sender=PisoTecnologico)
+def registrar_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Guardados que no cambian el contenido (p. ej. update_or_create sin diferencias) no se registran
+    if not getattr(instance, '_contenido_modificado', True):
+        return
+    accion = RegistroCambio.CREADO if created else RegistroCambio.MODIFICADO
+    registrar_cambios([instance], accion)
+
+
+_estado = threading.local()
+
+
+@contextmanager
+def bajas_registradas():
+    """
+    Para borrados masivos que ya registraron sus bajas en una sola inserción
+    y sincronizan sus escuelas al final (ver acciones.eliminar_servicios):
+    dentro del bloque las señales no lo repiten fila por fila.
+    """
+    anterior = getattr(_estado, 'bajas_registradas', False)
+    _estado.bajas_registradas = True
+    try:
+        yield
+    finally:
+        _estado.bajas_registradas = anterior
+
+
+@receiver(post_delete, sender=Escuela)
+@receiver(post_delete, sender=ServicioConectividad)
+@receiver(post_delete, sender=PisoTecnologico)
+def registrar_baja(sender, instance, **kwargs):
+    if getattr(_estado, 'bajas_registradas', False):
+        return
+    registrar_cambios([instance], RegistroCambio.ELIMINADO)
+
+
+@receiver(post_save, sender=ServicioConectividad)
+@receiver(post_save, sender=PisoTecnologico)
+def sincronizar_escuela_guardada(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_contenido_modificado', True):
+        return
+    sincronizar_escuelas([instance.escuela_id])
+
+
+@receiver(post_delete, sender=ServicioConectividad)
+@receiver(post_delete, sender=PisoTecnologico)
+def sincronizar_escuela_borrada(sender, instance, **kwargs):
+    if getattr(_estado, 'bajas_registradas', False):
+        return
+    sincronizar_escuelas([instance.escuela_id])
+
+
+def catalogo_modificado(sender, raw=False, **kwargs):
+    if raw:
+        return
+    avanzar_version_catalogos()
+
+
+for _catalogo in CATALOGOS:
+    post_save.connect(catalogo_modificado, sender=_catalogo, dispatch_uid=f'catalogo_guardado_{_catalogo.__name__}')
+    post_delete.connect(catalogo_modificado, sender=_catalogo, dispatch_uid=f'catalogo_borrado_{_catalogo.__name__}')
@@ -0,0 +1,145 @@
+#gestor/sinteticos.py
+"""
+Datos sintéticos para las pruebas de carga (ver carga.py).
+
+Genera escuelas con una distribución parecida a la real: distritos
+repartidos en la provincia, más densidad en el conurbano, escuelas rurales
+más chicas y con menos conectividad, predios compartidos entre turnos y
+planes de velocidad típicos. Las filas pasan por la misma carga masiva que
+los CSV (importacion.py), así los servicios vigentes, las columnas copiadas
+en Escuela y el RegistroCambio quedan como con datos reales.
+
+Los CUE sintéticos empiezan con PREFIJO_CUE, para poder borrarlos después.
+La misma semilla genera siempre los mismos datos.
+"""
+import csv
+import io
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from . import importacion
+from .mapa import VISTA_INICIAL
+from .models import Escuela
+
+
+PREFIJO_CUE = 'SIN'
+
+REGIONES = 25
+DISTRITOS_POR_REGION = 5
+# Los primeros distritos forman el conurbano: más escuelas y más juntas
+DISTRITOS_CONURBANO = 24
+CENTRO_CONURBANO = (-34.65, -58.55)
+
+# (valor, peso)
+CATEGORIAS = (('Primario', 40), ('Secundario', 30), ('Inicial', 20), ('Especial', 5), ('Adultos', 5))
+TURNOS = (('Mañana', 40), ('Tarde', 30), ('Doble', 20), ('Vespertino', 10))
+DEPENDENCIAS = (('Provincial', 75), ('Privada', 25))
+PROVEEDORES = (('Telecom', 35), ('Movistar', 25), ('Claro', 20), ('Cooperativa local', 12), ('Starlink', 8))
+ESTADOS = (('PNCE', 40), ('PBA', 35), ('PNCE - PBA', 15), ('Otro', 10))
+VELOCIDADES_URBANAS = ((20, 15), (50, 30), (100, 35), (300, 20))
+VELOCIDADES_RURALES = ((6, 30), (10, 35), (20, 25), (50, 10))
+METODOS = (('Presencial', 50), ('Nota', 30), ('Sistema', 20))
+PLANES_PISO = (('Plan A', 60), ('Plan B', 40))
+TIPOS_PISO = (('Tipo 1', 50), ('Tipo 2', 50))
+PROVEEDORES_PISO = (('Proveedor piso A', 50), ('Proveedor piso B', 50))
+
+
+def _elegir(azar, opciones):
+    valores, pesos = zip(*opciones)
+    return azar.choices(valores, pesos)[0]
+
+
+def _fecha(azar, desde=date(2018, 1, 1), dias=365 * 7):
+    return (desde + timedelta(days=azar.randrange(dias))).isoformat()
+
+
+def _distritos(azar):
+    """[(nombre, región, ciudades, (lat, lng), peso)] con las regiones en franjas de latitud."""
+    centros = []
+    for i in range(REGIONES * DISTRITOS_POR_REGION):
+        if i < DISTRITOS_CONURBANO:
+            centro = (azar.gauss(CENTRO_CONURBANO[0], 0.15), azar.gauss(CENTRO_CONURBANO[1], 0.2))
+        else:
+            centro = (azar.uniform(VISTA_INICIAL['minLat'] + 0.3, VISTA_INICIAL['maxLat'] - 0.3),
+                      azar.uniform(VISTA_INICIAL['minLng'] + 0.2, -57.5))
+        centros.append((centro, 6 if i < DISTRITOS_CONURBANO else 1))
+    centros.sort(key=lambda c: c[0][0])
+
+    distritos = []
+    for i, (centro, peso) in enumerate(centros):
+        nombre = f'Distrito {i + 1:03d}'
+        ciudades = [f'{nombre} - Cabecera'] + [f'{nombre} - Localidad {k}' for k in range(1, azar.randint(1, 3))]
+        distritos.append((nombre, f'Región {i // DISTRITOS_POR_REGION + 1:02d}', ciudades, centro, peso))
+    return distritos
+
+
+def filas(cantidad, semilla=0):
+    """Filas del CSV de carga masiva (en el orden de importacion.CAMPOS_FILA)."""
+    azar = random.Random(semilla)
+    distritos = _distritos(azar)
+    pesos = [d[4] for d in distritos]
+    anterior = None
+    for n in range(cantidad):
+        # Dos de cada diez escuelas comparten el predio (y la ubicación) de la anterior
+        if anterior and azar.random() < 0.2:
+            predio, region, distrito, ciudad, lat, lng = anterior
+        else:
+            distrito, region, ciudades, (lat, lng), _ = azar.choices(distritos, pesos)[0]
+            predio, ciudad = 100000 + n, azar.choice(ciudades)
+            dispersion = 0.05 if lat > -35 and lng > -59 else 0.12
+            lat = min(max(azar.gauss(lat, dispersion), VISTA_INICIAL['minLat']), VISTA_INICIAL['maxLat'])
+            lng = min(max(azar.gauss(lng, dispersion), VISTA_INICIAL['minLng']), VISTA_INICIAL['maxLng'])
+        anterior = (predio, region, distrito, ciudad, lat, lng)
+
+        rural = azar.random() < 0.2
+        categoria = _elegir(azar, CATEGORIAS)
+        internet = azar.random() < (0.45 if rural else 0.8)
+        piso = azar.random() < (0.55 if internet else 0.15)
+        yield [
+            f'{PREFIJO_CUE}{n:06d}', f'CP{n:06d}', f'Escuela {categoria} N° {n + 1}',
+            f'Calle {azar.randint(1, 200)} {azar.randint(1, 3000)}',
+            azar.randint(10, 120) if rural else azar.randint(80, 900),
+            f'{lat:.6f}', f'{lng:.6f}',
+            region, distrito, ciudad, 'Rural' if rural else 'Urbano',
+            _elegir(azar, DEPENDENCIAS), _elegir(azar, TURNOS), categoria,
+            'Jardín' if categoria == 'Inicial' else 'Escuela', predio,
+            'Sí' if internet else 'No',
+            'Starlink' if rural and azar.random() < 0.4 else _elegir(azar, PROVEEDORES),
+            _elegir(azar, VELOCIDADES_RURALES if rural else VELOCIDADES_URBANAS),
+            _elegir(azar, ESTADOS), _fecha(azar), _elegir(azar, METODOS), '',
+            'Sí' if piso else 'No',
+            _elegir(azar, PROVEEDORES_PISO), _elegir(azar, PLANES_PISO), _elegir(azar, TIPOS_PISO),
+            _fecha(azar, date(2019, 1, 1)), '', '',
+        ]
+
+
+def sembrar(cantidad, semilla=0):
+    """Crea (o actualiza) las escuelas sintéticas. Devuelve (creadas, actualizadas, errores)."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(importacion.CAMPOS_FILA)
+    escritor.writerows(filas(cantidad, semilla))
+
+    registros, errores = importacion.leer_csv(salida.getvalue())
+    diferencias = importacion.calcular_diferencias(registros)
+    with transaction.atomic():
+        creadas, actualizadas, errores_escritura = importacion.aplicar_diferencias(registros, diferencias)
+    return creadas, actualizadas, errores + errores_escritura
+
+
+def sinteticas():
+    return Escuela.objects.filter(cue__startswith=PREFIJO_CUE)
+
+
+def hay_datos_reales():
+    return Escuela.objects.exclude(cue__startswith=PREFIJO_CUE).exists()
+
+
+def borrar():
+    """Borra las escuelas sintéticas (los catálogos quedan). Devuelve la cantidad."""
+    with transaction.atomic():
+        cantidad = sinteticas().count()
+        sinteticas().delete()
+    return cantidad
@@ -0,0 +1,104 @@
+/*
+ * Filtro en cascada Región -> Distrito -> Ciudad.
+ *
+ * Descarga una sola vez el árbol geográfico (api/jerarquia/?v=<versión>,
+ * cacheable por el navegador) y acota las opciones de los selects en el
+ * cliente, sin un pedido por cada cambio de región.
+ *
+ * Uso:
+ *   GestorJerarquia.cascada({
+ *       url: "{% url 'api_jerarquia' %}?v={{ version_jerarquia }}",
+ *       region: document.getElementById('region_select'),
+ *       distrito: document.getElementById('distrito_select'),
+ *       ciudad: document.getElementById('ciudad_select'),   // opcional
+ *   });
+ */
+(function (window) {
+    'use strict';
+
+    const pedidos = {};
+
+    function cargarArbol(url) {
+        if (!pedidos[url]) {
+            pedidos[url] = fetch(url, { credentials: 'same-origin' }).then(function (resp) {
+                if (!resp.ok) throw new Error('No se pudo cargar la jerarquía');
+                return resp.json();
+            });
+        }
+        return pedidos[url];
+    }
+
+    function valores(select) {
+        return Array.from(select.selectedOptions).map(function (o) { return o.value; }).filter(Boolean);
+    }
+
+    function alCambiar(select, fn) {
+        // select2 dispara 'change' con jQuery: hay que escucharlo por jQuery si está
+        if (window.jQuery) {
+            window.jQuery(select).on('change', fn);
+        } else {
+            select.addEventListener('change', fn);
+        }
+    }
+
+    function notificar(select) {
+        // Refresca select2 sin volver a disparar nuestros propios manejadores
+        if (window.jQuery && window.jQuery(select).data('select2')) {
+            window.jQuery(select).trigger('change.select2');
+        }
+    }
+
+    /* Reemplaza las opciones conservando la opción vacía y lo que siga siendo válido. */
+    function rellenar(select, items) {
+        const seleccion = new Set(valores(select));
+        const vacia = Array.from(select.options).find(function (o) { return o.value === ''; });
+
+        select.innerHTML = '';
+        if (vacia) select.appendChild(vacia);
+        items.forEach(function (item) {
+            const valor = String(item.id);
+            select.appendChild(new Option(item.nombre, valor, false, seleccion.has(valor)));
+        });
+        notificar(select);
+    }
+
+    function acotar(items, campo, padres) {
+        if (padres.length === 0) return items;
+        const permitidos = new Set(padres.map(Number));
+        return items.filter(function (item) { return permitidos.has(item[campo]); });
+    }
+
+    function cascada(opciones) {
+        const region = opciones.region;
+        const distrito = opciones.distrito;
+        const ciudad = opciones.ciudad;
+
+        return cargarArbol(opciones.url).then(function (arbol) {
+            function actualizarCiudades() {
+                if (!ciudad) return;
+                let distritos = valores(distrito);
+                if (distritos.length === 0 && valores(region).length > 0) {
+                    // Sin distrito elegido: todas las ciudades de los distritos visibles
+                    distritos = Array.from(distrito.options).map(function (o) { return o.value; }).filter(Boolean);
+                    if (distritos.length === 0) distritos = ['0'];
+                }
+                rellenar(ciudad, acotar(arbol.ciudades, 'distrito_id', distritos));
+            }
+
+            function actualizarDistritos() {
+                rellenar(distrito, acotar(arbol.distritos, 'region_id', valores(region)));
+                actualizarCiudades();
+            }
+
+            alCambiar(region, actualizarDistritos);
+            if (ciudad) alCambiar(distrito, actualizarCiudades);
+
+            actualizarDistritos();
+            return arbol;
+        }).catch(function () {
+            // Sin árbol los selects quedan con todas las opciones del servidor
+        });
+    }
+
+    window.GestorJerarquia = { cascada: cascada };
+})(window);
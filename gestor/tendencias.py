@@ -0,0 +1,83 @@
+#gestor/tendencias.py
+"""
+Series de tiempo de cobertura a partir de instantáneas diarias.
+
+tomar_instantanea() agrupa las escuelas por región, distrito y categoría en
+una sola consulta y guarda los conteos del día en InstantaneaCobertura (una
+fila por combinación existente: unos cientos de filas por día, no una por
+escuela). serie() responde las preguntas históricas leyendo solo esa tabla.
+"""
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Escuela, InstantaneaCobertura
+
+
+CAMPOS_CONTEO = ('total_escuelas', 'con_internet', 'con_piso', 'matricula', 'matricula_con_internet')
+
+# Filtros aceptados por serie() (parámetro GET -> columna de la instantánea)
+FILTROS = {'region': 'region_id', 'distrito': 'distrito_id', 'categoria': 'categoria_id'}
+
+
+def conteos_actuales():
+    """Conteos de cobertura de hoy por (región, distrito, categoría), en una consulta."""
+    filas = (
+        Escuela.objects
+        .values('region_id', 'distrito_id', 'categoria_id')
+        .annotate(
+            total_escuelas=Count('id'),
+            con_internet=Count('id', filter=Q(tiene_internet=True)),
+            con_piso=Count('id', filter=Q(tiene_piso_tecnologico=True)),
+            # 'matricula' ya es un campo de Escuela: la anotación lleva otro nombre
+            suma_matricula=Coalesce(Sum('matricula'), 0),
+            matricula_con_internet=Coalesce(Sum('matricula', filter=Q(tiene_internet=True)), 0),
+        )
+        .order_by()
+    )
+    for fila in filas:
+        fila['matricula'] = fila.pop('suma_matricula')
+        yield fila
+
+
+@transaction.atomic
+def tomar_instantanea(fecha=None):
+    """
+    Guarda los conteos del día (hoy por defecto). Si ya había una instantánea
+    de esa fecha se reemplaza. Devuelve la cantidad de filas escritas.
+    """
+    fecha = fecha or timezone.localdate()
+    filas = [InstantaneaCobertura(fecha=fecha, **conteo) for conteo in conteos_actuales()]
+    InstantaneaCobertura.objects.filter(fecha=fecha).delete()
+    InstantaneaCobertura.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def _porcentaje(parte, total):
+    return round(100.0 * parte / total, 2) if total else 0.0
+
+
+def serie(filtros=None, desde=None, hasta=None):
+    """
+    Totales por fecha (lista ordenada) para los filtros dados, por ejemplo
+    {'region_id': 3}. Cada punto trae los conteos y los porcentajes de
+    escuelas y matrícula con Internet y de escuelas con piso.
+    """
+    qs = InstantaneaCobertura.objects.filter(**(filtros or {}))
+    if desde:
+        qs = qs.filter(fecha__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha__lte=hasta)
+    filas = (
+        qs.values('fecha')
+        .annotate(**{campo: Sum(campo) for campo in CAMPOS_CONTEO})
+        .order_by('fecha')
+    )
+    return [{
+        'fecha': fila['fecha'].isoformat(),
+        **{campo: fila[campo] for campo in CAMPOS_CONTEO},
+        'porcentaje_internet': _porcentaje(fila['con_internet'], fila['total_escuelas']),
+        'porcentaje_piso': _porcentaje(fila['con_piso'], fila['total_escuelas']),
+        'porcentaje_matricula_internet': _porcentaje(fila['matricula_con_internet'], fila['matricula']),
+    } for fila in filas]
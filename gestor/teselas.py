@@ -0,0 +1,426 @@
+#gestor/teselas.py
+"""
+Teselas PNG (256x256, esquema XYZ de OpenStreetMap) con un punto por escuela:
+verde con Internet, rojo sin Internet. Sirven para la vista general del mapa,
+donde mandar cada escuela al navegador no escala.
+
+Las teselas se guardan en disco (TESELAS_DIR en settings o un directorio
+temporal) y se generan a pedido o por adelantado con el comando
+generar_teselas. Cada PNG lleva la revisión de datos con la que se dibujó
+(bloque tEXt 'revision'). La invalidación es por tesela y se apoya en el
+RegistroCambio: cada cambio de escuela trae su posición nueva en 'datos' y
+la anterior sale de su registro previo; las teselas que tocan esas
+posiciones reciben una marca con la revisión del cambio, y una tesela
+dibujada antes de su marca se vuelve a dibujar. Solo si no hay registro
+previo (o son demasiados cambios juntos) se marca el directorio completo.
+
+Nada se borra por debajo de un proceso que escribe: las marcas son archivos
+que solo se agregan, y una tesela vieja escrita tarde queda igual por
+debajo de su marca.
+"""
+import math
+import os
+import struct
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import Escuela, RegistroCambio, hasta_confirmados
+from .revision import invalidar_revision, revision_datos
+
+
+TAMANO = 256
+
+# Hasta este zoom el mapa usa teselas; desde ZOOM_MAX_TESELAS + 1 usa marcadores
+ZOOM_MAX_TESELAS = 12
+
+COLOR_CON_INTERNET = (25, 135, 84, 230)
+COLOR_SIN_INTERNET = (220, 53, 69, 230)
+COLOR_BORDE = (255, 255, 255, 255)
+
+# Con más cambios que esto es más barato descartar todas las teselas
+MAX_CAMBIOS_INCREMENTALES = 2000
+
+ARCHIVO_REVISION = 'revision.txt'
+PREFIJO_BASE = 'base.'
+CLAVE_REVISION_PNG = b'revision'
+# El bloque tEXt con la revisión va después de la firma y del bloque IHDR
+_INICIO_TEXTO = 8 + 12 + 13
+
+
+# -------------------------------------------------------------------------
+# GEOMETRÍA
+# -------------------------------------------------------------------------
+
+def radio(zoom):
+    """Radio del punto en píxeles según el zoom."""
+    if zoom <= 7:
+        return 2
+    if zoom <= 10:
+        return 3
+    return 4
+
+
+def pixel_global(lat, lng, zoom):
+    """Coordenadas en píxeles del mundo completo (web mercator) para el zoom."""
+    lat = max(min(float(lat), 85.0511), -85.0511)
+    escala = TAMANO * (2 ** zoom)
+    x = (float(lng) + 180.0) / 360.0 * escala
+    seno = math.sin(math.radians(lat))
+    y = (0.5 - math.log((1 + seno) / (1 - seno)) / (4 * math.pi)) * escala
+    return x, y
+
+
+def _lat_de_pixel(y, zoom):
+    n = math.pi - 2.0 * math.pi * y / (TAMANO * (2 ** zoom))
+    return math.degrees(math.atan(math.sinh(n)))
+
+
+def _lng_de_pixel(x, zoom):
+    return x / (TAMANO * (2 ** zoom)) * 360.0 - 180.0
+
+
+def limites(zoom, x, y, margen=0):
+    """(min_lat, max_lat, min_lng, max_lng) de la tesela, ampliada 'margen' píxeles."""
+    x0, y0 = x * TAMANO - margen, y * TAMANO - margen
+    x1, y1 = (x + 1) * TAMANO + margen, (y + 1) * TAMANO + margen
+    return _lat_de_pixel(y1, zoom), _lat_de_pixel(y0, zoom), _lng_de_pixel(x0, zoom), _lng_de_pixel(x1, zoom)
+
+
+def teselas_del_punto(lat, lng, zoom):
+    """Teselas (x, y) que toca el punto dibujado (hasta 4 si cae en un borde)."""
+    px, py = pixel_global(lat, lng, zoom)
+    r = radio(zoom) + 1
+    ultimo = 2 ** zoom - 1
+    xs = {min(max(int((px + d) // TAMANO), 0), ultimo) for d in (-r, r)}
+    ys = {min(max(int((py + d) // TAMANO), 0), ultimo) for d in (-r, r)}
+    return [(tx, ty) for tx in xs for ty in ys]
+
+
+def valida(zoom, x, y):
+    return 0 <= zoom <= ZOOM_MAX_TESELAS and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom
+
+
+# -------------------------------------------------------------------------
+# RENDERIZADO
+# -------------------------------------------------------------------------
+
+def codificar_png(ancho, alto, pixeles, revision=None):
+    """
+    PNG RGBA sin dependencias externas; 'pixeles' es un bytearray ancho*alto*4.
+    Con 'revision' agrega el bloque tEXt que lee revision_de().
+    """
+    fila = ancho * 4
+    crudo = b''.join(b'\x00' + bytes(pixeles[i:i + fila]) for i in range(0, len(pixeles), fila))
+
+    def bloque(tipo, datos):
+        return (struct.pack('>I', len(datos)) + tipo + datos
+                + struct.pack('>I', zlib.crc32(tipo + datos) & 0xffffffff))
+
+    texto = b'' if revision is None else bloque(b'tEXt', CLAVE_REVISION_PNG + b'\x00' + str(revision).encode())
+    return (b'\x89PNG\r\n\x1a\n'
+            + bloque(b'IHDR', struct.pack('>IIBBBBB', ancho, alto, 8, 6, 0, 0, 0))
+            + texto
+            + bloque(b'IDAT', zlib.compress(crudo, 6))
+            + bloque(b'IEND', b''))
+
+
+def _circulo(pixeles, cx, cy, r, color):
+    r2 = r * r
+    for dy in range(-r, r + 1):
+        y = cy + dy
+        if not 0 <= y < TAMANO:
+            continue
+        for dx in range(-r, r + 1):
+            x = cx + dx
+            if 0 <= x < TAMANO and dx * dx + dy * dy <= r2:
+                i = (y * TAMANO + x) * 4
+                pixeles[i:i + 4] = bytes(color)
+
+
+def renderizar(puntos, zoom, x, y, revision=None):
+    """
+    Dibuja la tesela. 'puntos' son tuplas (latitud, longitud, tiene_internet);
+    las escuelas sin Internet van arriba para que los faltantes se vean.
+    'revision' es la de los datos leídos (queda grabada en el PNG).
+    """
+    pixeles = bytearray(TAMANO * TAMANO * 4)
+    r = radio(zoom)
+    origen_x, origen_y = x * TAMANO, y * TAMANO
+    for lat, lng, tiene_internet in sorted(puntos, key=lambda p: bool(p[2]), reverse=True):
+        px, py = pixel_global(lat, lng, zoom)
+        cx, cy = int(px - origen_x), int(py - origen_y)
+        _circulo(pixeles, cx, cy, r + 1, COLOR_BORDE)
+        _circulo(pixeles, cx, cy, r, COLOR_CON_INTERNET if tiene_internet else COLOR_SIN_INTERNET)
+    return codificar_png(TAMANO, TAMANO, pixeles, revision)
+
+
+def revision_de(png):
+    """Revisión grabada en el PNG por renderizar(), o None si no la tiene."""
+    if png[_INICIO_TEXTO + 4:_INICIO_TEXTO + 8] != b'tEXt':
+        return None
+    largo, = struct.unpack_from('>I', png, _INICIO_TEXTO)
+    clave, _, valor = png[_INICIO_TEXTO + 8:_INICIO_TEXTO + 8 + largo].partition(b'\x00')
+    if clave != CLAVE_REVISION_PNG or not valor.isdigit():
+        return None
+    return int(valor)
+
+
+def puntos_tesela(zoom, x, y):
+    """Escuelas que se dibujan en la tesela (incluye las que asoman desde el borde)."""
+    min_lat, max_lat, min_lng, max_lng = limites(zoom, x, y, margen=radio(zoom) + 1)
+    return list(Escuela.objects.filter(
+        latitud__gte=min_lat, latitud__lte=max_lat,
+        longitud__gte=min_lng, longitud__lte=max_lng,
+    ).values_list('latitud', 'longitud', 'tiene_internet'))
+
+
+# -------------------------------------------------------------------------
+# CACHÉ EN DISCO
+# -------------------------------------------------------------------------
+
+def directorio():
+    return getattr(settings, 'TESELAS_DIR', None) or os.path.join(tempfile.gettempdir(), 'gestor_teselas')
+
+
+def ruta(zoom, x, y):
+    return os.path.join(directorio(), str(zoom), str(x), f'{y}.png')
+
+
+def _escribir(destino, contenido, modo='wb'):
+    """Escritura atómica: otro proceso nunca lee un archivo a medio escribir."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+    with os.fdopen(fd, modo) as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, destino)
+
+
+def _borrar(archivo):
+    try:
+        os.remove(archivo)
+    except FileNotFoundError:
+        pass
+
+
+def _marcas(carpeta, prefijo):
+    """Revisiones de las marcas '<prefijo><revisión>.inv' de la carpeta."""
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+    revisiones = []
+    for nombre in nombres:
+        numero = nombre[len(prefijo):-len('.inv')]
+        if nombre.startswith(prefijo) and nombre.endswith('.inv') and numero.isdigit():
+            revisiones.append(int(numero))
+    return revisiones
+
+
+def _marcar(carpeta, prefijo, revision):
+    """
+    Agrega la marca 'revision' y borra las menores. Cada proceso borra solo
+    marcas menores a la que acaba de crear, así la mayor nunca desaparece.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    open(os.path.join(carpeta, f'{prefijo}{revision}.inv'), 'a').close()
+    for anterior in _marcas(carpeta, prefijo):
+        if anterior < revision:
+            _borrar(os.path.join(carpeta, f'{prefijo}{anterior}.inv'))
+
+
+def revision_minima(zoom, x, y):
+    """Revisión desde la que vale la tesela: la mayor entre su marca y la del directorio."""
+    return max(_marcas(os.path.dirname(ruta(zoom, x, y)), f'{y}.')
+               + _marcas(directorio(), PREFIJO_BASE) + [0])
+
+
+def leer(zoom, x, y):
+    """PNG guardado de la tesela, o None si falta o se dibujó antes de su última marca."""
+    try:
+        with open(ruta(zoom, x, y), 'rb') as archivo:
+            png = archivo.read()
+    except FileNotFoundError:
+        return None
+    revision = revision_de(png)
+    if revision is None or revision < revision_minima(zoom, x, y):
+        return None
+    return png
+
+
+def guardar(zoom, x, y, png):
+    _escribir(ruta(zoom, x, y), png)
+
+
+def invalidar(zoom, x, y, revision):
+    """Las versiones de la tesela dibujadas antes de 'revision' dejan de valer."""
+    _marcar(os.path.dirname(ruta(zoom, x, y)), f'{y}.', revision)
+
+
+def invalidar_punto(lat, lng, revision):
+    """Invalida todas las teselas (de todos los zoom) donde se dibuja el punto."""
+    for zoom in range(ZOOM_MAX_TESELAS + 1):
+        for x, y in teselas_del_punto(lat, lng, zoom):
+            invalidar(zoom, x, y, revision)
+
+
+def invalidar_todas(revision):
+    _marcar(directorio(), PREFIJO_BASE, revision)
+
+
+def limpiar():
+    """
+    Borra las teselas guardadas y sus marcas. Borra solo archivos, no
+    carpetas, para no romper la escritura de otro proceso; lo que ese
+    proceso escriba después ya está dibujado con los datos vigentes.
+    """
+    for carpeta, _, archivos in os.walk(directorio()):
+        for nombre in archivos:
+            if nombre.endswith(('.png', '.inv')) and carpeta != directorio():
+                _borrar(os.path.join(carpeta, nombre))
+
+
+def revision_guardada():
+    try:
+        with open(os.path.join(directorio(), ARCHIVO_REVISION)) as archivo:
+            return int(archivo.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def marcar_revision(revision):
+    _escribir(os.path.join(directorio(), ARCHIVO_REVISION), str(revision), 'w')
+
+
+# -------------------------------------------------------------------------
+# INVALIDACIÓN A PARTIR DEL REGISTRO DE CAMBIOS
+# -------------------------------------------------------------------------
+
+def _posicion(datos):
+    if datos and datos.get('latitud') is not None and datos.get('longitud') is not None:
+        return float(datos['latitud']), float(datos['longitud'])
+    return None
+
+
+def _confirmada(procesada, actual):
+    """
+    Última revisión hasta la que todos los cambios son visibles: se corta
+    antes de un hueco de ids reciente (ver models.hasta_confirmados).
+    """
+    registros = list(
+        RegistroCambio.objects.filter(id__gt=procesada, id__lte=actual).order_by('id').values('id', 'fecha')
+    )
+    registros, _ = hasta_confirmados(registros, procesada)
+    return registros[-1]['id'] if registros else procesada
+
+
+def sincronizar():
+    """
+    Marca las teselas que tocan los cambios de escuelas confirmados desde la
+    última revisión procesada. Devuelve la revisión procesada: la que hay que
+    grabar en una tesela que se dibuje con los datos que se lean después.
+
+    Varios procesos pueden sincronizar a la vez: las marcas solo se agregan,
+    así que repetir un tramo de cambios no hace daño.
+    """
+    actual = revision_datos()
+    procesada = revision_guardada()
+    if procesada is None:
+        # Sin marca no se sabe qué reflejan las teselas guardadas
+        invalidar_todas(actual)
+        marcar_revision(actual)
+        return actual
+    if procesada >= actual:
+        if procesada > actual:
+            # Otro proceso ya vio una revisión más nueva: la de este quedó
+            # vieja en la caché. No hay nada que deshacer.
+            invalidar_revision()
+        return procesada
+
+    hasta = _confirmada(procesada, actual)
+    if hasta == procesada:
+        return procesada
+
+    cambios = list(
+        RegistroCambio.objects
+        .filter(modelo='escuela', id__gt=procesada, id__lte=hasta)
+        .order_by('id')
+        .values_list('cue', 'accion', 'datos')[:MAX_CAMBIOS_INCREMENTALES + 1]
+    )
+    if len(cambios) > MAX_CAMBIOS_INCREMENTALES:
+        invalidar_todas(hasta)
+        marcar_revision(hasta)
+        return hasta
+
+    posiciones = set()
+    cues = set()
+    vistos = set()
+    for cue, accion, datos in cambios:
+        # Las altas no tienen posición anterior que buscar
+        if cue not in vistos and accion != RegistroCambio.CREADO:
+            cues.add(cue)
+        vistos.add(cue)
+        posicion = _posicion(datos)
+        if posicion:
+            posiciones.add(posicion)
+
+    # Posición anterior de cada escuela: su último registro antes de este lote
+    if cues:
+        anteriores = (
+            RegistroCambio.objects
+            .filter(modelo='escuela', cue__in=cues, id__lte=procesada, datos__isnull=False)
+            .values('cue').annotate(ultimo=Max('id')).values_list('ultimo', flat=True)
+        )
+        previos = dict(RegistroCambio.objects.filter(id__in=list(anteriores)).values_list('cue', 'datos'))
+        if cues - set(previos):
+            # Escuelas sin historial: su posición anterior es desconocida
+            invalidar_todas(hasta)
+            marcar_revision(hasta)
+            return hasta
+        for datos in previos.values():
+            posicion = _posicion(datos)
+            if posicion:
+                posiciones.add(posicion)
+
+    for lat, lng in posiciones:
+        invalidar_punto(lat, lng, hasta)
+    marcar_revision(hasta)
+    return hasta
+
+
+def tesela(zoom, x, y):
+    """PNG de la tesela: de disco si está vigente, si no se renderiza y se guarda."""
+    # La revisión se toma antes de leer las escuelas: si un cambio llega
+    # mientras se dibuja, su marca queda por encima de esta tesela
+    revision = sincronizar()
+    png = leer(zoom, x, y)
+    if png is None:
+        png = renderizar(puntos_tesela(zoom, x, y), zoom, x, y, revision)
+        guardar(zoom, x, y, png)
+    return png
+
+
+def generar(zoom_min=0, zoom_max=ZOOM_MAX_TESELAS):
+    """
+    Genera por adelantado las teselas con escuelas entre zoom_min y zoom_max
+    que falten o estén vencidas, leyendo las coordenadas una sola vez.
+    Devuelve cuántas escribió.
+    """
+    revision = sincronizar()
+    puntos = list(
+        Escuela.objects.exclude(latitud=None).exclude(longitud=None)
+        .values_list('latitud', 'longitud', 'tiene_internet')
+    )
+    escritas = 0
+    for zoom in range(zoom_min, zoom_max + 1):
+        por_tesela = {}
+        for punto in puntos:
+            for clave in teselas_del_punto(punto[0], punto[1], zoom):
+                por_tesela.setdefault(clave, []).append(punto)
+        for (x, y), contenido in por_tesela.items():
+            if leer(zoom, x, y) is None:
+                guardar(zoom, x, y, renderizar(contenido, zoom, x, y, revision))
+                escritas += 1
+    return escritas
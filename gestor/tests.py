@@ -1,4 +1,1530 @@
 #gestor tests.py
-from django.test import TestCase
+import importlib
+import io
+import os
+import random
+import runpy
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    acciones, analitica, carga, cobertura, en_vuelo, espacial, excel_escuela, importacion, mapa, pivote,
+    precalentar, proveedores, sinteticos, tendencias, teselas,
+)
+from .admin import PaginadorEstimado
+from .desnormalizacion import sincronizar_escuelas, sincronizar_todas
+from .models import (
+    Ciudad, Distrito, Escuela, EstadoConectividad, ImportacionPendiente, InstantaneaCobertura,
+    PisoTecnologico, Region, RegistroCambio, ServicioConectividad,
+)
+from .revision import clave_cache, invalidar_revision, revision_cache, revision_datos
+
+
+def fila_csv(n, **cambios):
+    """Fila del CSV de carga masiva (en el orden de importacion.CAMPOS_FILA)."""
+    valores = {
+        'cue': f'{n:09d}', 'clave_provincial': f'CP{n}', 'nombre': f'Escuela {n}',
+        'direccion': f'Calle {n}', 'matricula': str(100 + n * 10),
+        'latitud': f'-34.{n:04d}', 'longitud': '-58.381600',
+        'region': f'Región {n % 3}', 'distrito': f'Distrito {n % 5}', 'ciudad': 'Ciudad',
+        'ambito': 'Urbano', 'dependencia': 'Provincial', 'turno': 'Mañana',
+        'categoria': 'Primario' if n % 2 else 'Secundario', 'tipo_establecimiento': 'Escuela',
+        'numero_predio': str(1000 + n),
+        'internet_tiene': 'Sí' if n % 2 else 'No', 'internet_proveedor': 'Telecom',
+        'internet_velocidad': str(50 * (n % 4 + 1)), 'internet_estado': 'PBA',
+        'internet_fecha': '2023-01-15', 'internet_metodo': 'Presencial', 'internet_obs': '',
+        'piso_tiene': 'Sí' if n % 3 == 0 else 'No', 'piso_proveedor': 'Proveedor piso',
+        'piso_plan': 'Plan A', 'piso_tipo': 'Tipo 1', 'piso_fecha': '2022-02-02',
+        'piso_mejora': '', 'piso_obs': '',
+    }
+    valores.update(cambios)
+    return [valores[campo] for campo in importacion.CAMPOS_FILA]
+
+
+def texto_csv(filas):
+    lineas = [','.join(importacion.CAMPOS_FILA)] + [','.join(fila) for fila in filas]
+    return '\n'.join(lineas) + '\n'
+
+
+def importar(filas):
+    registros, errores = importacion.leer_csv(texto_csv(filas))
+    diferencias = importacion.calcular_diferencias(registros)
+    creadas, actualizadas, errores_escritura = importacion.aplicar_diferencias(registros, diferencias)
+    invalidar_revision()
+    return diferencias, creadas, actualizadas, errores + errores_escritura
+
+
+class ConCacheLimpia:
+    # Las claves llevan la revisión, y los ids de RegistroCambio se reusan
+    # entre tests (cada test deshace su transacción)
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+# -------------------------------------------------------------------------
+# IMPORTACIÓN
+# -------------------------------------------------------------------------
+
+class DiferenciasImportacionTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.filas = [fila_csv(n) for n in range(6)]
+        importar(self.filas)
+
+    def test_primera_carga_crea_todas(self):
+        self.assertEqual(Escuela.objects.count(), 6)
+        self.assertEqual(ServicioConectividad.objects.count(), 3)
+
+    def test_clasifica_nuevas_modificadas_sin_cambios_y_eliminadas(self):
+        filas = self.filas[:5] + [fila_csv(9)]
+        filas[1] = fila_csv(1, nombre='Escuela Uno')
+        registros, errores = importacion.leer_csv(texto_csv(filas))
+        diferencias = importacion.calcular_diferencias(registros)
+
+        self.assertEqual(errores, [])
+        self.assertEqual(diferencias['nuevas'], ['000000009'])
+        self.assertEqual(diferencias['modificadas'], ['000000001'])
+        self.assertEqual(sorted(diferencias['sin_cambios']), ['000000000', '000000002', '000000003', '000000004'])
+        self.assertEqual(diferencias['eliminadas'], ['000000005'])
+
+    def test_reimportar_lo_exportado_no_cambia_nada(self):
+        diferencias, creadas, actualizadas, errores = importar(self.filas)
+        self.assertEqual((creadas, actualizadas, errores), (0, 0, []))
+        self.assertEqual(len(diferencias['sin_cambios']), 6)
+
+    def test_solo_se_escriben_las_filas_que_cambian(self):
+        filas = list(self.filas)
+        filas[3] = fila_csv(3, matricula='999')
+        ultimo = RegistroCambio.objects.order_by('-id').values_list('id', flat=True).first()
+        _, creadas, actualizadas, _ = importar(filas)
+
+        self.assertEqual((creadas, actualizadas), (0, 1))
+        self.assertEqual(Escuela.objects.get(cue='000000003').matricula, 999)
+        self.assertEqual(
+            list(RegistroCambio.objects.filter(id__gt=ultimo).values_list('modelo', 'cue')),
+            [('escuela', '000000003')],
+        )
+
+    def test_las_eliminadas_no_se_borran(self):
+        importar(self.filas[:2])
+        self.assertEqual(Escuela.objects.count(), 6)
+
+    def test_cambio_de_servicio_crea_historial(self):
+        escuela = Escuela.objects.get(cue='000000001')
+        vigente = escuela.servicio_vigente_id
+        filas = list(self.filas)
+        filas[1] = fila_csv(1, internet_velocidad='777')
+        importar(filas)
+
+        escuela.refresh_from_db()
+        self.assertNotEqual(escuela.servicio_vigente_id, vigente)
+        self.assertEqual(escuela.internet_velocidad, 777)
+        self.assertEqual(ServicioConectividad.objects.filter(escuela=escuela).count(), 2)
+
+
+@mock.patch('gestor.precalentar.precalentar_en_segundo_plano')
+class ConfirmarImportacionTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.filas = [fila_csv(n) for n in range(4)]
+        importar(self.filas)
+
+    def _subir(self, filas, **datos):
+        archivo = SimpleUploadedFile('escuelas.csv', texto_csv(filas).encode('utf-8'))
+        return self.client.post('/datos/importar/', {'csv_file': archivo, **datos})
+
+    def _mensajes(self, respuesta):
+        return [str(mensaje) for mensaje in respuesta.wsgi_request._messages]
+
+    def test_previsualizar_no_escribe(self, _):
+        filas = list(self.filas)
+        filas[0] = fila_csv(0, nombre='Cambiada')
+        respuesta = self._subir(filas, previsualizar='1')
+
+        totales = {bloque['clave']: bloque['total'] for bloque in respuesta.context['resumen']}
+        self.assertEqual(totales, {'nuevas': 0, 'modificadas': 1, 'sin_cambios': 3, 'eliminadas': 0})
+        self.assertEqual(Escuela.objects.get(cue='000000000').nombre, 'Escuela 0')
+
+    def test_confirmar_recalcula_tras_un_cambio_concurrente(self, _):
+        filas = list(self.filas)
+        filas[0] = fila_csv(0, nombre='Cambiada')
+        self._subir(filas, previsualizar='1')
+
+        # Entre la previsualización y la confirmación alguien edita otra escuela
+        otra = Escuela.objects.get(cue='000000002')
+        otra.nombre = 'Editada a mano'
+        otra.save()
+
+        respuesta = self.client.post('/datos/importar/confirmar/', {'accion': 'confirmar'})
+        self.assertIn('0 escuelas creadas, 2 escuelas actualizadas, 2 sin cambios.', self._mensajes(respuesta)[-1])
+        self.assertEqual(Escuela.objects.get(cue='000000000').nombre, 'Cambiada')
+        # El archivo manda: la edición concurrente se detecta y se pisa
+        self.assertEqual(Escuela.objects.get(cue='000000002').nombre, 'Escuela 2')
+
+    def test_confirmar_dos_veces(self, _):
+        self._subir(self.filas, previsualizar='1')
+        self.client.post('/datos/importar/confirmar/', {'accion': 'confirmar'})
+        respuesta = self.client.post('/datos/importar/confirmar/', {'accion': 'confirmar'})
+        self.assertIn('No hay ninguna importación pendiente', self._mensajes(respuesta)[-1])
+
+    def test_cancelar(self, _):
+        filas = list(self.filas)
+        filas[0] = fila_csv(0, nombre='Cambiada')
+        self._subir(filas, previsualizar='1')
+        self.client.post('/datos/importar/confirmar/', {'accion': 'cancelar'})
+        self.assertEqual(Escuela.objects.get(cue='000000000').nombre, 'Escuela 0')
+
+
+class ImportacionPendienteTests(TestCase):
+
+    def test_guardar_leer_y_borrar(self):
+        token = importacion.guardar_pendiente('cue\n1\n')
+        self.assertEqual(importacion.leer_pendiente(token), 'cue\n1\n')
+        importacion.borrar_pendiente(token)
+        self.assertIsNone(importacion.leer_pendiente(token))
+
+    def test_token_invalido(self):
+        for token in (None, '', '../../etc/passwd', 'x' * 32):
+            self.assertIsNone(importacion.leer_pendiente(token))
+            importacion.borrar_pendiente(token)
+
+    def test_las_vencidas_no_se_leen_y_se_limpian(self):
+        vieja = importacion.guardar_pendiente('viejo')
+        ImportacionPendiente.objects.update(
+            fecha=timezone.now() - importacion.VIGENCIA_PENDIENTE - timedelta(minutes=1),
+        )
+        self.assertIsNone(importacion.leer_pendiente(vieja))
+
+        nueva = importacion.guardar_pendiente('nuevo')
+        self.assertEqual(list(ImportacionPendiente.objects.values_list('contenido', flat=True)), ['nuevo'])
+        self.assertEqual(importacion.leer_pendiente(nueva), 'nuevo')
+
+
+# -------------------------------------------------------------------------
+# SERVICIO Y PISO VIGENTES
+# -------------------------------------------------------------------------
+
+class VigentesTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Escuela 3: con Internet y con piso
+        self.filas = [fila_csv(n) for n in range(4)]
+        importar(self.filas)
+        self.escuela = Escuela.objects.get(cue='000000003')
+
+    def _importar_escuela(self, **cambios):
+        filas = list(self.filas)
+        filas[3] = fila_csv(3, **cambios)
+        importar(filas)
+        self.escuela.refresh_from_db()
+
+    def test_el_historial_sobrevive_a_perder_y_recuperar_el_servicio(self):
+        primero = self.escuela.servicio_vigente_id
+
+        self._importar_escuela(internet_tiene='No', piso_tiene='No')
+        self.assertIsNone(self.escuela.servicio_vigente_id)
+        self.assertIsNone(self.escuela.piso_vigente_id)
+        self.assertFalse(self.escuela.tiene_internet)
+        self.assertFalse(self.escuela.tiene_piso_tecnologico)
+        self.assertIsNone(self.escuela.internet_proveedor_id)
+        self.assertIsNotNone(ServicioConectividad.objects.get(pk=primero).fecha_baja)
+
+        self._importar_escuela()
+        self.assertTrue(self.escuela.tiene_internet)
+        self.assertTrue(self.escuela.tiene_piso_tecnologico)
+        self.assertNotEqual(self.escuela.servicio_vigente_id, primero)
+        servicios = ServicioConectividad.objects.filter(escuela=self.escuela).order_by('pk')
+        self.assertEqual(
+            [(servicio.pk, servicio.fecha_baja is None) for servicio in servicios],
+            [(primero, False), (self.escuela.servicio_vigente_id, True)],
+        )
+        self.assertEqual(PisoTecnologico.objects.filter(escuela=self.escuela).count(), 2)
+
+    def test_reimportar_sin_servicio_no_escribe(self):
+        self._importar_escuela(internet_tiene='No')
+        diferencias, creadas, actualizadas, _ = importar(self.filas[:3] + [fila_csv(3, internet_tiene='No')])
+        self.assertEqual((creadas, actualizadas), (0, 0))
+        self.assertEqual(ServicioConectividad.objects.filter(escuela=self.escuela).count(), 1)
+
+    def test_las_banderas_siguen_al_vigente(self):
+        # La casilla marcada a mano sin servicio vigente se corrige
+        Escuela.objects.filter(pk=self.escuela.pk).update(tiene_internet=False)
+        sincronizar_escuelas([self.escuela.pk])
+        self.escuela.refresh_from_db()
+        self.assertTrue(self.escuela.tiene_internet)
+
+        ServicioConectividad.objects.filter(escuela=self.escuela).update(fecha_baja=timezone.localdate())
+        self.escuela.refresh_from_db()
+        self.assertFalse(self.escuela.tiene_internet)
+        self.assertIsNone(self.escuela.servicio_vigente_id)
+
+    def test_marcar_sin_internet_da_de_baja_sin_borrar(self):
+        self.assertEqual(acciones.marcar_sin_internet([self.escuela.pk]), 1)
+        self.escuela.refresh_from_db()
+        self.assertFalse(self.escuela.tiene_internet)
+        self.assertEqual(ServicioConectividad.objects.filter(escuela=self.escuela).count(), 1)
+
+        self.assertEqual(acciones.marcar_con_internet([self.escuela.pk]), 1)
+        self.escuela.refresh_from_db()
+        self.assertTrue(self.escuela.tiene_internet)
+        self.assertEqual(ServicioConectividad.objects.filter(escuela=self.escuela).count(), 2)
+
+
+# -------------------------------------------------------------------------
+# SEGUIMIENTO DE CAMBIOS
+# -------------------------------------------------------------------------
+
+class SeguimientoQuerySetTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(4)])
+        self.antes = dict(Escuela.objects.values_list('cue', 'fecha_actualizacion'))
+        self.hashes = dict(Escuela.objects.values_list('cue', 'hash_contenido'))
+        self.ultimo = RegistroCambio.objects.order_by('-id').values_list('id', flat=True).first()
+
+    def _nuevos(self):
+        return list(RegistroCambio.objects.filter(id__gt=self.ultimo).order_by('id').values_list('cue', 'accion'))
+
+    def test_update_solo_marca_las_filas_que_cambian(self):
+        # La escuela 0 ya tiene esa matrícula: no cambia
+        Escuela.objects.filter(cue__in=['000000000', '000000001']).update(matricula=100)
+
+        despues = dict(Escuela.objects.values_list('cue', 'fecha_actualizacion'))
+        self.assertEqual(despues['000000000'], self.antes['000000000'])
+        self.assertGreater(despues['000000001'], self.antes['000000001'])
+        self.assertNotEqual(Escuela.objects.get(cue='000000001').hash_contenido, self.hashes['000000001'])
+        self.assertEqual(self._nuevos(), [('000000001', RegistroCambio.MODIFICADO)])
+
+    def test_update_sin_cambios_no_registra(self):
+        Escuela.objects.filter(cue='000000002').update(nombre='Escuela 2')
+        self.assertEqual(self._nuevos(), [])
+        self.assertEqual(Escuela.objects.get(cue='000000002').fecha_actualizacion, self.antes['000000002'])
+
+    def test_hash_coincide_con_el_de_save(self):
+        Escuela.objects.filter(cue='000000003').update(direccion='Otra calle 1')
+        escuela = Escuela.objects.get(cue='000000003')
+        hash_masivo = escuela.hash_contenido
+        escuela.save()
+        self.assertEqual(Escuela.objects.get(cue='000000003').hash_contenido, hash_masivo)
+
+    def test_bulk_update_solo_registra_las_modificadas(self):
+        escuelas = list(Escuela.objects.filter(cue__in=['000000000', '000000001']).order_by('cue'))
+        escuelas[1].nombre = 'Nombre nuevo'
+        Escuela.objects.bulk_update(escuelas, ['nombre'])
+
+        self.assertEqual(self._nuevos(), [('000000001', RegistroCambio.MODIFICADO)])
+        self.assertEqual(Escuela.objects.get(cue='000000000').fecha_actualizacion, self.antes['000000000'])
+
+    def test_save_y_delete_registran(self):
+        escuela = Escuela.objects.get(cue='000000000')
+        escuela.nombre = 'Otro'
+        escuela.save()
+        escuela.save()  # sin cambios: no se registra
+        Escuela.objects.get(cue='000000003').delete()
+
+        self.assertEqual(self._nuevos()[0], ('000000000', RegistroCambio.MODIFICADO))
+        self.assertIn(('000000003', RegistroCambio.ELIMINADO), self._nuevos())
+        self.assertEqual(self._nuevos().count(('000000000', RegistroCambio.MODIFICADO)), 1)
+
+
+# -------------------------------------------------------------------------
+# EXPORTACIONES EN STREAMING
+# -------------------------------------------------------------------------
+
+class ExportacionStreamingTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.filas = [fila_csv(n) for n in range(5)]
+        importar(self.filas)
+
+    async def _contenido_asgi(self, ruta):
+        respuesta = await self.async_client.get(ruta)
+        # Un iterador sync bajo ASGI se juntaría entero en memoria antes de enviarse
+        self.assertTrue(respuesta.streaming)
+        self.assertTrue(respuesta.is_async)
+        return b''.join([parte async for parte in respuesta.streaming_content]).decode('utf-8')
+
+    async def test_exportar_datos_bajo_asgi(self):
+        contenido = await self._contenido_asgi('/datos/exportar/')
+        # Lo exportado se vuelve a importar sin diferencias
+        registros, errores = importacion.leer_csv(contenido)
+        diferencias = await sync_to_async(importacion.calcular_diferencias)(registros)
+        self.assertEqual(errores, [])
+        self.assertEqual(len(diferencias['sin_cambios']), 5)
+
+    async def test_exportar_brechas_bajo_asgi(self):
+        contenido = await self._contenido_asgi('/reportes/brechas/csv/')
+        sin_internet = await Escuela.objects.filter(tiene_internet=False).acount()
+        self.assertEqual(len(contenido.splitlines()), 1 + sin_internet)
+
+    def test_bajo_wsgi_el_iterador_es_sync(self):
+        respuesta = self.client.get('/datos/exportar/')
+        self.assertFalse(respuesta.is_async)
+        self.assertEqual(len(b''.join(respuesta.streaming_content).splitlines()), 1 + 5)
+
+
+# -------------------------------------------------------------------------
+# API DE CAMBIOS
+# -------------------------------------------------------------------------
+
+class ApiCambiosTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(5)])
+        self.ids = list(RegistroCambio.objects.order_by('id').values_list('id', flat=True))
+
+    def _pagina(self, after, limit):
+        respuesta = self.client.get('/api/cambios/', {'after': after, 'limit': limit})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_recorre_todo_el_log_en_orden(self):
+        vistos = []
+        after = self.ids[0] - 1
+        while True:
+            pagina = self._pagina(after, 3)
+            vistos += [cambio['id'] for cambio in pagina['cambios']]
+            after = pagina['siguiente']
+            if not pagina['hay_mas']:
+                break
+        self.assertEqual(vistos, self.ids)
+        self.assertEqual(self._pagina(after, 3), {'cambios': [], 'siguiente': after, 'hay_mas': False})
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/cambios/', {'after': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/cambios/', {'limit': 0}).status_code, 400)
+
+    def test_no_saltea_un_hueco_reciente(self):
+        # Un id intermedio que todavía no se ve simula una transacción abierta
+        RegistroCambio.objects.filter(id=self.ids[4]).delete()
+        respuesta = self.client.get('/api/cambios/', {'after': self.ids[0] - 1, 'limit': 100})
+        pagina = respuesta.json()
+        self.assertEqual([cambio['id'] for cambio in pagina['cambios']], self.ids[:4])
+        self.assertEqual(pagina['siguiente'], self.ids[3])
+        # El consumidor sabe que faltan cambios y cuándo volver a pedir
+        self.assertTrue(pagina['hay_mas'])
+        self.assertEqual(respuesta['Retry-After'], '5')
+
+    def test_pagina_vacia_detras_de_un_hueco(self):
+        RegistroCambio.objects.filter(id=self.ids[4]).delete()
+        pagina = self._pagina(self.ids[3], 100)
+        self.assertEqual(pagina, {'cambios': [], 'siguiente': self.ids[3], 'hay_mas': True})
+
+    def test_hueco_viejo_se_toma_como_rollback(self):
+        RegistroCambio.objects.filter(id=self.ids[4]).delete()
+        RegistroCambio.objects.update(fecha=timezone.now() - timedelta(hours=1))
+        pagina = self._pagina(self.ids[0] - 1, 100)
+        self.assertEqual([cambio['id'] for cambio in pagina['cambios']], self.ids[:4] + self.ids[5:])
+
+
+# -------------------------------------------------------------------------
+# REPORTES
+# -------------------------------------------------------------------------
+
+class PivoteTests(ConCacheLimpia, TestCase):
+
+    MEDIDAS = ['escuelas', 'matricula', 'cobertura_internet']
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(15)])
+
+    def _directo(self, **filtro):
+        return Escuela.objects.filter(**filtro).aggregate(
+            escuelas=Count('id'), matricula=Sum('matricula'),
+            con_internet=Count('id', filter=Q(tiene_internet=True)),
+        )
+
+    def _esperado(self, **filtro):
+        directo = self._directo(**filtro)
+        return [directo['escuelas'], directo['matricula'],
+                round(100 * directo['con_internet'] / directo['escuelas'], 1)]
+
+    def test_subtotales_por_fila_y_columna_coinciden_con_consultas_directas(self):
+        tabla = pivote.tabla_cruzada(['region', 'categoria'], self.MEDIDAS, {})
+
+        for fila in tabla['filas']:
+            self.assertEqual(fila['total'], self._esperado(region__nombre=fila['etiquetas'][0]))
+            for categoria, celda in zip(tabla['columnas'], fila['celdas']):
+                filtro = {'region__nombre': fila['etiquetas'][0], 'categoria__nombre': categoria}
+                if Escuela.objects.filter(**filtro).exists():
+                    self.assertEqual(celda, self._esperado(**filtro))
+                else:
+                    self.assertEqual(celda, [None] * len(self.MEDIDAS))
+        for categoria, total in zip(tabla['columnas'], tabla['totales_columnas']):
+            self.assertEqual(total, self._esperado(categoria__nombre=categoria))
+        self.assertEqual(tabla['total'], self._esperado())
+
+    def test_filtros(self):
+        escuela = Escuela.objects.get(cue='000000004')
+        resultado = pivote.consultar(['categoria'], self.MEDIDAS, {'region': escuela.region_id})
+        self.assertEqual(
+            [resultado['total'][m] for m in self.MEDIDAS],
+            self._esperado(region_id=escuela.region_id),
+        )
+
+    def test_leer_pedido_valida(self):
+        with self.assertRaises(ValueError):
+            pivote.leer_pedido({'dimensiones': 'region,region'})
+        with self.assertRaises(ValueError):
+            pivote.leer_pedido({'dimensiones': 'otra'})
+        self.assertEqual(
+            pivote.leer_pedido({'dimensiones': 'region', 'region': '3'}),
+            (['region'], list(pivote.MEDIDAS_POR_DEFECTO), {'region': 3}),
+        )
+
+
+class CoberturaMatriculaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(8)])
+        self.directo = Escuela.objects.aggregate(
+            total=Sum('matricula'), con_internet=Sum('matricula', filter=Q(tiene_internet=True)),
+        )
+
+    def test_matricula_en_la_misma_consulta_que_los_conteos(self):
+        with self.assertNumQueries(1):
+            totales = cobertura.totales(Escuela.objects.all())
+        self.assertEqual(totales['matricula_total'], self.directo['total'])
+        self.assertEqual(totales['matricula_con_internet'], self.directo['con_internet'])
+        self.assertEqual(totales['matricula_sin_internet'], self.directo['total'] - self.directo['con_internet'])
+
+    def test_por_categoria_suma_el_total(self):
+        filas = cobertura.por_categoria(Escuela.objects.all())
+        self.assertEqual(sum(fila['matricula_total'] for fila in filas), self.directo['total'])
+
+    def test_fila_total_del_excel_de_resultados(self):
+        respuesta = self.client.get('/exportar_resultados/')
+        hoja = openpyxl.load_workbook(io.BytesIO(respuesta.content)).active
+        filas = list(hoja.iter_rows(values_only=True))
+
+        self.assertEqual(len(filas), 1 + 8 + 2)
+        porcentaje = round(100 * self.directo['con_internet'] / self.directo['total'], 2)
+        self.assertEqual(filas[-1][:7], ('TOTAL', None, None, None, None, self.directo['total'],
+                                         f'{porcentaje} % de la matrícula'))
+
+
+class PercentilesTests(SimpleTestCase):
+
+    def test_sin_datos(self):
+        self.assertEqual(proveedores.percentiles([]), {'p25': None, 'p50': None, 'p75': None, 'p90': None})
+
+    def test_un_valor(self):
+        self.assertEqual(proveedores.percentiles([(20, 3)]), {'p25': 20, 'p50': 20, 'p75': 20, 'p90': 20})
+
+    def test_rango_mas_cercano(self):
+        # 10 escuelas: 10, 20, 20, 50, 50, 50, 100, 100, 100, 300
+        distribucion = [(10, 1), (20, 2), (50, 3), (100, 3), (300, 1)]
+        self.assertEqual(proveedores.percentiles(distribucion), {'p25': 20, 'p50': 50, 'p75': 100, 'p90': 100})
+
+    def test_coincide_con_la_lista_expandida(self):
+        distribucion = [(6, 4), (10, 7), (20, 1), (50, 9), (100, 2)]
+        valores = [valor for valor, cantidad in distribucion for _ in range(cantidad)]
+        resultado = proveedores.percentiles(distribucion)
+        for p in proveedores.PERCENTILES:
+            posicion = max(1, -(-p * len(valores) // 100))
+            self.assertEqual(resultado[f'p{p}'], valores[posicion - 1])
+
+
+# -------------------------------------------------------------------------
+# CÁLCULOS COMPARTIDOS
+# -------------------------------------------------------------------------
+
+class CompartidoTests(ConCacheLimpia, SimpleTestCase):
+
+    def test_pedidos_simultaneos_calculan_una_vez(self):
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return 'valor'
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(en_vuelo.compartido('test:una', calcular, 60)))
+            for _ in range(8)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, ['valor'] * 8)
+
+    def test_claves_distintas_no_se_esperan(self):
+        # Un cálculo que pide otro valor compartido no queda esperándose a sí mismo
+        valor = en_vuelo.compartido(
+            'test:externo', lambda: en_vuelo.compartido('test:interno', lambda: 1, 60) + 1, 60,
+        )
+        self.assertEqual(valor, 2)
+
+    def test_pasado_el_plazo_calcula_por_su_cuenta(self):
+        adentro = threading.Event()
+        soltar = threading.Event()
+
+        def ocupar():
+            with en_vuelo.turno('test:lenta'):
+                adentro.set()
+                soltar.wait(5)
+
+        hilo = threading.Thread(target=ocupar)
+        hilo.start()
+        adentro.wait(5)
+        try:
+            with mock.patch.object(en_vuelo, 'ESPERA_MAXIMA', 0.1):
+                inicio = time.monotonic()
+                valor = en_vuelo.compartido('test:lenta', lambda: 'propio', 60)
+            self.assertEqual(valor, 'propio')
+            self.assertLess(time.monotonic() - inicio, 2)
+        finally:
+            soltar.set()
+            hilo.join()
+
+
+# -------------------------------------------------------------------------
+# PRECALENTAMIENTO
+# -------------------------------------------------------------------------
+
+class PrecalentarTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(6)])
+
+    def test_warm_caches_deja_las_cifras_cacheadas(self):
+        call_command('warm_caches', omitir=['indice', 'mapas'], stdout=mock.MagicMock())
+        with self.assertNumQueries(0):
+            cobertura.dashboard()
+
+    def test_pedido_que_llega_al_soltar_el_lock_no_se_pierde(self):
+        # Otro hilo pide una vuelta justo entre la última comprobación y el
+        # release: vio el lock tomado y se fue
+        lock = threading.Lock()
+        pedidos = [precalentar._pendiente.set]
+
+        class LockConPedido:
+            def acquire(self, blocking=True):
+                return lock.acquire(blocking)
+
+            def release(self):
+                if pedidos:
+                    pedidos.pop()()
+                lock.release()
+
+        with mock.patch.object(precalentar, '_lock', LockConPedido()), \
+                mock.patch.object(precalentar, 'precalentar') as correr, \
+                mock.patch.object(precalentar.connections, 'close_all'):
+            precalentar._en_hilo()
+
+        self.assertEqual(correr.call_count, 2)
+        self.assertFalse(precalentar._pendiente.is_set())
+
+
+# -------------------------------------------------------------------------
+# CONEXIONES A LA BASE
+# -------------------------------------------------------------------------
+
+class ConfiguracionConexionesTests(SimpleTestCase):
+
+    def _configuracion(self, **entorno):
+        entorno = {'DB_POOL': '', 'DB_CONN_MAX_AGE': '', 'SERVIDOR_ASGI': '', **entorno}
+        with mock.patch.dict(os.environ, entorno):
+            for clave in [clave for clave, valor in entorno.items() if not valor]:
+                del os.environ[clave]
+            valores = runpy.run_module('ges_proyecto.settings')
+        return valores['DB_POOL'], valores['DATABASES']['default']
+
+    def test_wsgi_conexiones_persistentes(self):
+        pool, base = self._configuracion(DATABASE_URL='mysql://u:p@localhost/escuelas')
+        self.assertFalse(pool)
+        self.assertEqual(base['CONN_MAX_AGE'], 60)
+        self.assertEqual(base['ENGINE'], 'django.db.backends.mysql')
+
+    def test_asgi_usa_pool_por_defecto(self):
+        pool, base = self._configuracion(DATABASE_URL='mysql://u:p@localhost/escuelas', SERVIDOR_ASGI='True')
+        self.assertTrue(pool)
+        self.assertEqual(base['CONN_MAX_AGE'], 0)
+        self.assertEqual(base['ENGINE'], 'dj_db_conn_pool.backends.mysql')
+
+        _, base = self._configuracion(DATABASE_URL='postgres://u:p@localhost/escuelas', SERVIDOR_ASGI='True')
+        self.assertIn('pool', base['OPTIONS'])
+
+    def test_asgi_sin_pool_disponible(self):
+        pool, base = self._configuracion(DATABASE_URL='sqlite:////tmp/escuelas.sqlite3', SERVIDOR_ASGI='True')
+        self.assertFalse(pool)
+        self.assertEqual(base['CONN_MAX_AGE'], 0)
+        with self.assertRaises(ImproperlyConfigured):
+            self._configuracion(DATABASE_URL='sqlite:////tmp/escuelas.sqlite3', DB_POOL='True')
+
+
+class EstadoConexionesTests(TestCase):
+
+    def test_solo_para_el_staff(self):
+        self.assertEqual(self.client.get('/api/estado/conexiones/').status_code, 403)
+
+    def test_cuenta_los_pedidos_del_worker(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        antes = self.client.get('/api/estado/conexiones/').json()
+        despues = self.client.get('/api/estado/conexiones/').json()
+        self.assertEqual(despues['pid'], os.getpid())
+        self.assertEqual(despues['pedidos'], antes['pedidos'] + 1)
+        self.assertEqual(despues['configuracion']['pool'], False)
+
+
+# -------------------------------------------------------------------------
+# DETALLE DE ESCUELA
+# -------------------------------------------------------------------------
+
+class DetalleEscuelaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Escuelas 3 y 9: con Internet y piso; la 3 con historial de servicios
+        self.filas = [fila_csv(n) for n in range(10)]
+        importar(self.filas)
+        for velocidad in ('300', '400'):
+            self.filas[3] = fila_csv(3, internet_velocidad=velocidad)
+            importar(self.filas)
+
+    def _consultas(self, cue):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(f'/escuela/{cue}/')
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_consultas_acotadas(self):
+        # Tres servicios o uno: las mismas consultas (sin cargas perezosas en la plantilla)
+        self.assertEqual(ServicioConectividad.objects.filter(escuela__cue='000000003').count(), 3)
+        self.assertEqual(self._consultas('000000003'), self._consultas('000000009'))
+        self.assertLessEqual(self._consultas('000000003'), 6)
+
+    def test_segunda_visita_sale_de_la_cache(self):
+        self.client.get('/escuela/000000003/')
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/escuela/000000003/')
+        self.assertContains(respuesta, 'Escuela 3')
+        self.assertContains(respuesta, '400 Mbps')
+
+    def test_un_cambio_de_datos_invalida_el_detalle(self):
+        self.client.get('/escuela/000000003/')
+        self.filas[3] = fila_csv(3, nombre='Escuela Renombrada')
+        importar(self.filas)
+        self.assertContains(self.client.get('/escuela/000000003/'), 'Escuela Renombrada')
+
+    def test_cue_inexistente(self):
+        self.assertEqual(self.client.get('/escuela/999999999/').status_code, 404)
+
+
+# -------------------------------------------------------------------------
+# EXCEL DE ESCUELA
+# -------------------------------------------------------------------------
+
+class ExcelEscuelaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(4)])
+
+    def _hoja(self, contenido):
+        return openpyxl.load_workbook(io.BytesIO(contenido))[excel_escuela.TITULO_HOJA]
+
+    def test_una_escuela(self):
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/escuela/000000003/generar_excel/')
+        hoja = self._hoja(respuesta.content)
+        generales = {
+            hoja.cell(row=fila, column=1).value: hoja.cell(row=fila, column=2).value
+            for fila in range(excel_escuela.FILA_PRIMER_DATO, excel_escuela.FILA_CONECTIVIDAD)
+        }
+        self.assertEqual(generales['CUE'], '000000003')
+        self.assertEqual(generales['Región'], 'Región 0')
+        self.assertEqual(generales['Tiene Internet'], 'Sí')
+        # Primera fila de datos de la sección de conectividad (la escuela tiene un servicio)
+        fila_servicio = excel_escuela.FILA_CONECTIVIDAD + 2
+        self.assertEqual(hoja.cell(row=fila_servicio, column=1).value, 'Telecom')
+        self.assertEqual(hoja.cell(row=fila_servicio, column=3).value, 200)
+
+    def test_escuela_inexistente(self):
+        self.assertEqual(self.client.get('/escuela/999999999/generar_excel/').status_code, 404)
+
+    @mock.patch.object(excel_escuela, 'MAX_PROCESOS', 1)
+    def test_lote_en_zip(self):
+        respuesta = self.client.get('/escuelas/generar_excel/', {'cue': '000000001', 'cues': '000000002,999999999'})
+        with zipfile.ZipFile(io.BytesIO(respuesta.content)) as archivo_zip:
+            self.assertEqual(archivo_zip.namelist(), ['escuela_000000001.xlsx', 'escuela_000000002.xlsx'])
+            hoja = self._hoja(archivo_zip.read('escuela_000000002.xlsx'))
+        self.assertEqual(hoja.cell(row=excel_escuela.FILA_PRIMER_DATO, column=2).value, 'Escuela 2')
+
+    def test_lote_invalido(self):
+        self.assertEqual(self.client.get('/escuelas/generar_excel/').status_code, 400)
+        self.assertEqual(self.client.get('/escuelas/generar_excel/', {'cue': '999999999'}).status_code, 404)
+
+
+# -------------------------------------------------------------------------
+# JERARQUÍA GEOGRÁFICA
+# -------------------------------------------------------------------------
+
+class JerarquiaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Región n % 3, distrito n % 5: cada distrito queda en la región de su primera escuela
+        importar([fila_csv(n) for n in range(10)])
+        self.regiones = dict(Region.objects.values_list('nombre', 'id'))
+
+    def _region_de(self):
+        return dict(Distrito.objects.values_list('nombre', 'region__nombre'))
+
+    def test_la_importacion_vincula_distrito_y_region(self):
+        self.assertEqual(self._region_de(), {
+            'Distrito 0': 'Región 0', 'Distrito 1': 'Región 1', 'Distrito 2': 'Región 2',
+            'Distrito 3': 'Región 0', 'Distrito 4': 'Región 1',
+        })
+        self.assertEqual(set(Ciudad.objects.values_list('distrito__nombre', flat=True)), {'Distrito 0'})
+
+    def test_migracion_completa_con_el_padre_mas_frecuente(self):
+        migracion = importlib.import_module('gestor.migrations.0007_jerarquia_geografica')
+        Distrito.objects.update(region=None)
+        # Distrito 3: dos escuelas en la Región 2 y una en la Región 0
+        Escuela.objects.filter(cue__in=['000000003', '000000008']).update(region_id=self.regiones['Región 2'])
+
+        migracion.completar_jerarquia(django_apps, None)
+        self.assertEqual(self._region_de()['Distrito 3'], 'Región 2')
+        self.assertEqual(self._region_de()['Distrito 0'], 'Región 0')
+
+    def test_cascada_de_distritos(self):
+        self.client.get('/api/jerarquia/')
+        region = self.regiones['Región 0']
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/ajax/cargar-distritos/', {'region_ids': [region, '']})
+        self.assertEqual(sorted(respuesta.json()['opciones'].values()), ['Distrito 0', 'Distrito 3'])
+        self.assertEqual(self.client.get('/ajax/cargar-distritos/', {'region_ids': 'x'}).json(), {'opciones': {}})
+
+    def test_version_del_arbol(self):
+        arbol = self.client.get('/api/jerarquia/', {'v': 'abc'})
+        self.assertIn('max-age', arbol['Cache-Control'])
+        version = arbol.json()['version']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            distrito = Distrito.objects.get(nombre='Distrito 4')
+            distrito.nombre = 'Distrito Cuatro'
+            distrito.save()
+        arbol = self.client.get('/api/jerarquia/').json()
+        self.assertNotEqual(arbol['version'], version)
+        self.assertIn('Distrito Cuatro', [distrito['nombre'] for distrito in arbol['distritos']])
+
+
+# -------------------------------------------------------------------------
+# MAPAS POR VENTANA
+# -------------------------------------------------------------------------
+
+class MapaVentanaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Latitudes -34.0000 a -34.0011, la mitad con Internet (n impar)
+        importar([fila_csv(n) for n in range(12)])
+
+    def _params(self, **extra):
+        return dict(mapa.VISTA_INICIAL, **extra)
+
+    def test_pocas_escuelas_van_como_puntos(self):
+        resultado = mapa.consultar(self._params(tiene_internet='1'))
+        self.assertEqual(resultado['modo'], 'escuelas')
+        self.assertEqual(resultado['total'], 6)
+        self.assertTrue(all(punto['tiene_internet'] for punto in resultado['items']))
+
+    @mock.patch.object(mapa, 'MAX_PUNTOS', 5)
+    def test_con_poco_zoom_agrupa_en_la_base(self):
+        resultado = mapa.consultar(self._params())
+        self.assertEqual(resultado['modo'], 'grupos')
+        self.assertEqual(sum(grupo['cantidad'] for grupo in resultado['items']), 12)
+        self.assertEqual(sum(grupo['con_internet'] for grupo in resultado['items']), 6)
+
+        # Con zoom de detalle siempre van los puntos
+        detalle = mapa.consultar(self._params(zoom=mapa.ZOOM_DETALLE))
+        self.assertEqual((detalle['modo'], len(detalle['items'])), ('escuelas', 12))
+
+    def test_ventana_filtra_por_coordenadas(self):
+        resultado = mapa.consultar(self._params(minLat='-34.0005', zoom=mapa.ZOOM_DETALLE))
+        self.assertEqual(sorted(punto['cue'] for punto in resultado['items']),
+                         [f'{n:09d}' for n in range(6)])
+
+    def test_api_y_parametros_invalidos(self):
+        respuesta = self.client.get('/api/escuelas/bounds/', self._params(tiene_internet='0'))
+        self.assertEqual(respuesta.json()['total'], 6)
+        self.assertEqual(self.client.get('/api/escuelas/bounds/', {'minLat': 'x'}).status_code, 400)
+
+    def test_primer_pintado_del_mapa_de_internet_cacheado(self):
+        self.assertEqual(self.client.get('/mapa-escuelas-con-internet/').context['datos_iniciales']['total'], 6)
+        with self.assertNumQueries(0):
+            mapa.vista_inicial_internet()
+
+
+# -------------------------------------------------------------------------
+# TESELAS
+# -------------------------------------------------------------------------
+
+class TeselasTests(ConCacheLimpia, TestCase):
+    ZOOM = teselas.ZOOM_MAX_TESELAS
+
+    def setUp(self):
+        super().setUp()
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ajuste = override_settings(TESELAS_DIR=carpeta.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        importar([fila_csv(n) for n in range(4)])
+        teselas.sincronizar()
+
+    def _tesela_de(self, lat, lng):
+        return teselas.teselas_del_punto(lat, lng, self.ZOOM)[0]
+
+    def test_tesela_guardada_con_su_revision(self):
+        x, y = self._tesela_de(-34.0001, -58.3816)
+        respuesta = self.client.get(f'/tiles/{self.ZOOM}/{x}/{y}')
+        self.assertEqual(respuesta['Content-Type'], 'image/png')
+        self.assertEqual(teselas.revision_de(respuesta.content), revision_datos())
+        self.assertEqual(teselas.leer(self.ZOOM, x, y), respuesta.content)
+        self.assertEqual(self.client.get(f'/tiles/{self.ZOOM + 1}/0/0').status_code, 404)
+
+    def test_cambio_invalida_solo_las_teselas_de_la_escuela(self):
+        cerca = self._tesela_de(-34.0001, -58.3816)
+        lejos = self._tesela_de(-38.0, -62.0)
+        for x, y in (cerca, lejos):
+            teselas.tesela(self.ZOOM, x, y)
+
+        importar([fila_csv(1, internet_tiene='No')])
+        teselas.sincronizar()
+
+        self.assertIsNone(teselas.leer(self.ZOOM, *cerca))
+        self.assertIsNotNone(teselas.leer(self.ZOOM, *lejos))
+        # Se vuelve a dibujar con la revisión del cambio
+        self.assertEqual(teselas.revision_de(teselas.tesela(self.ZOOM, *cerca)), revision_datos())
+
+    def test_mudanza_invalida_la_posicion_anterior_y_la_nueva(self):
+        anterior = self._tesela_de(-34.0002, -58.3816)
+        nueva = self._tesela_de(-38.0, -62.0)
+        for x, y in (anterior, nueva):
+            teselas.tesela(self.ZOOM, x, y)
+
+        importar([fila_csv(2, latitud='-38.000000', longitud='-62.000000')])
+        teselas.sincronizar()
+
+        self.assertIsNone(teselas.leer(self.ZOOM, *anterior))
+        self.assertIsNone(teselas.leer(self.ZOOM, *nueva))
+
+    def test_sin_revision_guardada_invalida_todo_el_directorio(self):
+        x, y = self._tesela_de(-38.0, -62.0)
+        teselas.tesela(self.ZOOM, x, y)
+        os.remove(os.path.join(teselas.directorio(), teselas.ARCHIVO_REVISION))
+        importar([fila_csv(4)])
+
+        self.assertEqual(teselas.sincronizar(), revision_datos())
+        self.assertIsNone(teselas.leer(self.ZOOM, x, y))
+
+
+# -------------------------------------------------------------------------
+# BÚSQUEDAS POR CERCANÍA
+# -------------------------------------------------------------------------
+
+class IndiceEspacialTests(SimpleTestCase):
+
+    def setUp(self):
+        azar = random.Random(7)
+        self.filas = [{
+            'cue': f'{n:09d}', 'nombre': f'Escuela {n}',
+            'latitud': azar.uniform(-35.0, -34.0), 'longitud': azar.uniform(-59.0, -58.0),
+            'tiene_internet': n % 2 == 1, 'tiene_piso_tecnologico': False,
+            'region_id': 1, 'distrito_id': 1, 'internet_estado_id': None, 'numero_predio': n // 3,
+        } for n in range(400)]
+        self.indice = espacial.IndiceEspacial(self.filas)
+
+    def _fuerza_bruta(self, lat, lng, filtro=lambda fila: True):
+        return sorted(
+            (espacial.distancia_km(lat, lng, fila['latitud'], fila['longitud']), fila['cue'])
+            for fila in self.filas if filtro(fila)
+        )
+
+    def test_vecinos_coinciden_con_la_fuerza_bruta(self):
+        # Un punto dentro de la grilla y otro lejos, fuera de ella
+        for lat, lng in ((-34.5, -58.5), (-38.0, -62.0)):
+            encontrados = self.indice.cercanas(lat, lng, 15, lambda e: True)
+            self.assertEqual([e['cue'] for _, e in encontrados],
+                             [cue for _, cue in self._fuerza_bruta(lat, lng)[:15]])
+
+    def test_radio_con_filtro_coincide_con_la_fuerza_bruta(self):
+        filtro = espacial.filtro_desde_parametros({'tiene_internet': '0'})
+        encontrados = self.indice.en_radio(-34.5, -58.5, 12, filtro)
+        esperados = [cue for distancia, cue in self._fuerza_bruta(-34.5, -58.5, lambda f: not f['tiene_internet'])
+                     if distancia <= 12]
+        self.assertTrue(esperados)
+        self.assertEqual([e['cue'] for _, e in encontrados], esperados)
+
+    def test_excluye_la_escuela_de_partida_y_calcula_el_centro_del_predio(self):
+        posicion = self.indice.por_cue['000000010']
+        escuela = self.indice.escuelas[posicion]
+        encontrados = self.indice.cercanas(escuela['latitud'], escuela['longitud'], 5, lambda e: True, posicion)
+        self.assertNotIn('000000010', [e['cue'] for _, e in encontrados])
+
+        lat, lng = self.indice.centro_predio(0)
+        self.assertAlmostEqual(lat, sum(fila['latitud'] for fila in self.filas[:3]) / 3)
+        self.assertAlmostEqual(lng, sum(fila['longitud'] for fila in self.filas[:3]) / 3)
+        self.assertIsNone(self.indice.centro_predio(999))
+
+    def test_filtros_invalidos(self):
+        with self.assertRaises(ValueError):
+            espacial.filtro_desde_parametros({'region': 'x'})
+
+
+class ApiCercaniaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Latitudes -34.0000 a -34.0009 sobre el mismo meridiano (~11 m entre escuelas)
+        importar([fila_csv(n) for n in range(10)])
+
+    def test_cercanas_a_una_escuela(self):
+        datos = self.client.get('/api/escuelas/cercanas/', {'cue': '000000005', 'k': '2'}).json()
+        self.assertEqual(sorted(r['cue'] for r in datos['resultados']), ['000000004', '000000006'])
+
+    def test_radio_con_filtro(self):
+        datos = self.client.get('/api/escuelas/radio/', {
+            'lat': '-34.0000', 'lng': '-58.3816', 'km': '0.05', 'tiene_internet': '1',
+        }).json()
+        self.assertEqual([r['cue'] for r in datos['resultados']], ['000000001', '000000003'])
+
+    def test_el_indice_sigue_a_la_revision(self):
+        self.client.get('/api/escuelas/cercanas/', {'lat': '-34', 'lng': '-58.3816'})
+        importar([fila_csv(10)])
+        datos = self.client.get('/api/escuelas/radio/', {'cue': '000000009', 'km': '0.02'}).json()
+        self.assertEqual(sorted(r['cue'] for r in datos['resultados']), ['000000008', '000000010'])
+
+    def test_parametros_invalidos(self):
+        for params in ({}, {'cue': 'no-existe'}, {'lat': '-34', 'lng': '-58', 'k': 'x'}):
+            self.assertEqual(self.client.get('/api/escuelas/cercanas/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/escuelas/radio/', {'lat': '-34', 'lng': '-58'}).status_code, 400)
+
+
+# -------------------------------------------------------------------------
+# BRECHAS DE COBERTURA
+# -------------------------------------------------------------------------
+
+class CalculoBrechasTests(SimpleTestCase):
+
+    def _tabla(self, filas):
+        """Tabla como la de analitica.cargar_tabla() a partir de tuplas
+        (cue, latitud, longitud, matricula, tiene_internet, predio_id)."""
+        cue, lat, lng, matricula, internet, predio = zip(*filas)
+        return {
+            'cue': np.array(cue, dtype=object),
+            'nombre': np.array([f'Escuela {c}' for c in cue], dtype=object),
+            'latitud': np.array(lat, dtype=np.float64),
+            'longitud': np.array(lng, dtype=np.float64),
+            'matricula': np.array(matricula, dtype=np.int64),
+            'tiene_internet': np.array(internet, dtype=bool),
+            'region_id': np.ones(len(filas), dtype=np.int64),
+            'distrito_id': np.ones(len(filas), dtype=np.int64),
+            'predio_id': np.array(predio, dtype=np.int64),
+        }
+
+    def test_indicadores_y_rankings(self):
+        brechas = analitica.calcular_brechas(self._tabla([
+            ('C1', -34.0, -58.0, 300, True, 1),
+            ('C2', -36.0, -60.0, 300, True, 2),
+            ('A', -34.1, -58.0, 900, False, 3),
+            ('B', -35.0, -59.0, 100, False, 4),
+            ('D1', -35.9, -60.0, 200, False, 5),
+            ('D2', -35.9, -60.0, 200, False, 5),
+        ]))
+        por_cue = {cue: i for i, cue in enumerate(brechas['cue'])}
+        self.assertEqual(sorted(por_cue), ['A', 'B', 'D1', 'D2'])
+
+        a, b, d1 = por_cue['A'], por_cue['B'], por_cue['D1']
+        self.assertEqual(brechas['cue_conectada'][a], 'C1')
+        self.assertEqual(brechas['cue_conectada'][d1], 'C2')
+        self.assertAlmostEqual(brechas['distancia_km'][a], espacial.distancia_km(-34.1, -58.0, -34.0, -58.0), 3)
+        self.assertEqual(brechas['sin_internet_predio'][d1], 2)
+        self.assertEqual(brechas['sin_internet_predio'][a], 1)
+
+        self.assertEqual(brechas['rank_matricula'][a], 1)
+        self.assertEqual(brechas['rank_distancia'][b], 1)
+        self.assertEqual(sorted(brechas['rank_prioridad']), [1, 2, 3, 4])
+
+    def test_sin_escuelas_conectadas_ni_coordenadas(self):
+        brechas = analitica.calcular_brechas(self._tabla([
+            ('A', np.nan, np.nan, 100, False, -1),
+            ('B', -34.0, -58.0, 200, False, -1),
+        ]))
+        self.assertTrue(np.isnan(brechas['distancia_km']).all())
+        self.assertEqual(list(brechas['cue_conectada']), ['', ''])
+        self.assertEqual(list(brechas['sin_internet_predio']), [0, 0])
+        self.assertEqual(list(brechas['rank_matricula']), [2, 1])
+
+
+class ReporteBrechasTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Sin Internet las de n par (matrícula 100 + 10n)
+        importar([fila_csv(n) for n in range(8)])
+
+    def test_orden_por_matricula_y_filtro_por_region(self):
+        datos, indices = analitica.consultar(orden='matricula')
+        self.assertEqual([datos['cue'][i] for i in indices], [f'{n:09d}' for n in (6, 4, 2, 0)])
+
+        region = Region.objects.get(nombre='Región 0')
+        datos, indices = analitica.consultar(region_id=region.pk, orden='matricula')
+        self.assertEqual([datos['cue'][i] for i in indices], [f'{n:09d}' for n in (6, 0)])
+
+    def test_csv_completo(self):
+        respuesta = self.client.get('/reportes/brechas/csv/', {'orden': 'matricula'})
+        lineas = b''.join(respuesta.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 5)
+        self.assertTrue(lineas[0].startswith('Posición,CUE'))
+        self.assertTrue(lineas[1].startswith('1,000000006,Escuela 6,Región 0,Distrito 1,160,'))
+
+    def test_el_resultado_sigue_a_la_revision(self):
+        self.assertEqual(self.client.get('/reportes/brechas/').context['total_sin_internet'], 4)
+        importar([fila_csv(0, internet_tiene='Sí')])
+        self.assertEqual(self.client.get('/reportes/brechas/').context['total_sin_internet'], 3)
+
+
+# -------------------------------------------------------------------------
+# ADMIN
+# -------------------------------------------------------------------------
+
+class ConAdmin(ConCacheLimpia):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+
+
+class ConsultasAdminTests(ConAdmin, TestCase):
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(consultas)
+
+    def test_listados_sin_consultas_por_fila(self):
+        importar([fila_csv(n) for n in range(3)])
+        urls = ('/admin/gestor/escuela/', '/admin/gestor/servicioconectividad/', '/admin/gestor/pisotecnologico/')
+        pocas = [self._consultas(url) for url in urls]
+        importar([fila_csv(n) for n in range(30)])
+        muchas = [self._consultas(url) for url in urls]
+        self.assertEqual(pocas, muchas)
+
+    def test_filtro_por_region_sin_cargar_el_catalogo(self):
+        importar([fila_csv(n) for n in range(6)])
+        region = Region.objects.get(nombre='Región 1')
+        respuesta = self.client.get('/admin/gestor/escuela/', {'region__id__exact': region.pk})
+        self.assertEqual(respuesta.context['cl'].result_count, 2)
+        self.assertContains(respuesta, 'Región 1')
+        self.assertNotContains(respuesta, 'Región 2')
+
+    def test_ficha_de_escuela_con_consultas_acotadas(self):
+        importar([fila_csv(n) for n in range(3)])
+        escuela = Escuela.objects.get(cue='000000001')
+        url = f'/admin/gestor/escuela/{escuela.pk}/change/'
+        self._consultas(url)
+        consultas = self._consultas(url)
+        # Los catálogos van como raw_id / autocompletar: agregar catálogos no suma consultas
+        Region.objects.bulk_create([Region(nombre=f'Otra {n}') for n in range(20)])
+        self.assertEqual(self._consultas(url), consultas)
+
+
+class PaginadorEstimadoTests(TestCase):
+
+    def setUp(self):
+        importar([fila_csv(n) for n in range(3)])
+
+    def test_sin_filtros_usa_la_estimacion(self):
+        with mock.patch('gestor.admin.filas_estimadas', return_value=50000):
+            self.assertEqual(PaginadorEstimado(Escuela.objects.all(), 10).count, 50000)
+            # Con filtros (o una estimación chica) cuenta de verdad
+            self.assertEqual(PaginadorEstimado(Escuela.objects.filter(tiene_internet=True), 10).count, 1)
+        with mock.patch('gestor.admin.filas_estimadas', return_value=5):
+            self.assertEqual(PaginadorEstimado(Escuela.objects.all(), 10).count, 3)
+
+
+class AccionesMasivasTests(ConAdmin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Con Internet las de n impar: 1, 3, 5, 7
+        importar([fila_csv(n) for n in range(8)])
+        self.estado = EstadoConectividad.objects.create(nombre='Instalado')
+        self.escuelas = list(Escuela.objects.order_by('cue').values_list('pk', flat=True))
+
+    def _accion(self, url, accion, ids, **datos):
+        return self.client.post(url, {'action': accion, helpers.ACTION_CHECKBOX_NAME: ids, **datos})
+
+    def test_cambiar_estado_en_dos_pasos(self):
+        respuesta = self._accion('/admin/gestor/escuela/', 'cambiar_estado', self.escuelas)
+        self.assertTemplateUsed(respuesta, 'admin/gestor/accion_masiva.html')
+        self.assertEqual(respuesta.context['cantidad'], 8)
+
+        self._accion('/admin/gestor/escuela/', 'cambiar_estado', self.escuelas,
+                     aplicar='1', estado_conectividad=self.estado.pk)
+        self.assertEqual(
+            ServicioConectividad.objects.filter(estado_conectividad=self.estado).count(), 4)
+        self.assertEqual(Escuela.objects.filter(internet_estado=self.estado).count(), 4)
+
+    def test_solo_se_toca_el_servicio_vigente(self):
+        escuela = Escuela.objects.get(cue='000000001')
+        acciones.marcar_sin_internet([escuela.pk])
+        acciones.marcar_con_internet([escuela.pk])
+        escuela.refresh_from_db()
+
+        cambiados = acciones.actualizar_servicios_de_escuelas([escuela.pk], estado_conectividad=self.estado)
+        self.assertEqual(cambiados, 1)
+        estados = dict(ServicioConectividad.objects.filter(escuela=escuela).values_list('pk', 'estado_conectividad'))
+        self.assertEqual(estados.pop(escuela.servicio_vigente_id), self.estado.pk)
+        self.assertNotIn(self.estado.pk, estados.values())
+
+    def test_cambios_registrados_sin_guardar_fila_por_fila(self):
+        servicios = list(ServicioConectividad.objects.values_list('pk', flat=True))
+        revision = revision_datos()
+        with CaptureQueriesContext(connection) as una:
+            acciones.actualizar_servicios(servicios[:1], estado_conectividad=self.estado)
+        with CaptureQueriesContext(connection) as todas:
+            self.assertEqual(acciones.actualizar_servicios(servicios, estado_conectividad=self.estado), 4)
+        self.assertEqual(len(todas), len(una))
+
+        # El primer servicio ya tenía el estado: se registra una sola vez
+        invalidar_revision()
+        self.assertGreater(revision_datos(), revision)
+        self.assertEqual(
+            RegistroCambio.objects.filter(id__gt=revision, modelo='servicioconectividad').count(), 4)
+
+    def test_borrar_servicios_registra_las_bajas_y_sincroniza(self):
+        servicios = list(ServicioConectividad.objects.values_list('pk', flat=True))
+        self._accion('/admin/gestor/servicioconectividad/', 'delete_selected', servicios, post='yes')
+
+        self.assertFalse(ServicioConectividad.objects.exists())
+        self.assertFalse(Escuela.objects.filter(tiene_internet=True).exists())
+        self.assertEqual(RegistroCambio.objects.filter(
+            modelo='servicioconectividad', accion=RegistroCambio.ELIMINADO).count(), 4)
+
+    def test_marcar_con_internet_desde_el_admin(self):
+        sin_internet = list(Escuela.objects.filter(tiene_internet=False).values_list('pk', flat=True))
+        self._accion('/admin/gestor/escuela/', 'marcar_con_internet', sin_internet,
+                     aplicar='1', estado_conectividad=self.estado.pk)
+        self.assertFalse(Escuela.objects.filter(tiene_internet=False).exists())
+        self.assertEqual(ServicioConectividad.objects.filter(estado_conectividad=self.estado).count(), 4)
+
+
+# -------------------------------------------------------------------------
+# COLUMNAS DESNORMALIZADAS
+# -------------------------------------------------------------------------
+
+class DesnormalizacionTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Escuela 0 sin Internet, escuela 1 con Internet (50*(1%4+1) = 100 Mbps)
+        importar([fila_csv(0), fila_csv(1)])
+        self.sin = Escuela.objects.get(cue='000000000')
+        self.con = Escuela.objects.get(cue='000000001')
+
+    def _derivadas(self, escuela):
+        return Escuela.objects.filter(pk=escuela.pk).values(
+            'tiene_internet', 'servicio_vigente_id', 'internet_velocidad', 'internet_ano_instalacion',
+        ).get()
+
+    def test_guardar_y_borrar_un_servicio(self):
+        servicio = ServicioConectividad.objects.create(
+            escuela=self.sin, velocidad_mbps=300, fecha_instalacion='2024-03-01')
+        self.assertEqual(self._derivadas(self.sin), {
+            'tiene_internet': True, 'servicio_vigente_id': servicio.pk,
+            'internet_velocidad': 300, 'internet_ano_instalacion': 2024,
+        })
+
+        servicio.delete()
+        self.assertEqual(self._derivadas(self.sin), {
+            'tiene_internet': False, 'servicio_vigente_id': None,
+            'internet_velocidad': None, 'internet_ano_instalacion': None,
+        })
+
+    def test_caminos_masivos(self):
+        ServicioConectividad.objects.filter(escuela=self.con).update(velocidad_mbps=20)
+        self.assertEqual(self._derivadas(self.con)['internet_velocidad'], 20)
+
+        servicio = ServicioConectividad.objects.get(escuela=self.con)
+        servicio.velocidad_mbps = 40
+        ServicioConectividad.objects.bulk_update([servicio], ['velocidad_mbps'])
+        self.assertEqual(self._derivadas(self.con)['internet_velocidad'], 40)
+
+        ServicioConectividad.objects.bulk_create([ServicioConectividad(escuela=self.sin, velocidad_mbps=10)])
+        self.assertEqual(self._derivadas(self.sin)['internet_velocidad'], 10)
+        self.assertTrue(self._derivadas(self.sin)['tiene_internet'])
+
+    def test_las_derivadas_no_cambian_el_contenido_de_la_escuela(self):
+        hash_anterior = Escuela.objects.values_list('hash_contenido', flat=True).get(pk=self.con.pk)
+        ultimo = RegistroCambio.objects.order_by('-id').values_list('id', flat=True).first()
+
+        ServicioConectividad.objects.filter(escuela=self.con).update(velocidad_mbps=20)
+
+        self.assertEqual(Escuela.objects.values_list('hash_contenido', flat=True).get(pk=self.con.pk), hash_anterior)
+        self.assertEqual(
+            list(RegistroCambio.objects.filter(id__gt=ultimo).values_list('modelo', flat=True)),
+            ['servicioconectividad'])
+
+    def test_sincronizar_todas_corrige_lo_escrito_por_fuera(self):
+        self.assertEqual(sincronizar_todas(), 0)
+        Escuela._base_manager.filter(pk=self.con.pk).update(internet_velocidad=1, tiene_internet=False)
+
+        self.assertEqual(sincronizar_todas(), 1)
+        self.assertEqual(self._derivadas(self.con)['internet_velocidad'], 100)
+        self.assertTrue(self._derivadas(self.con)['tiene_internet'])
+
+
+# -------------------------------------------------------------------------
+# TENDENCIA DE COBERTURA
+# -------------------------------------------------------------------------
+
+class TendenciaCoberturaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Con Internet 1, 3 y 5 (matrícula 110 + 130 + 150 de 750); con piso 0 y 3
+        importar([fila_csv(n) for n in range(6)])
+
+    def test_instantanea_por_combinacion_y_serie(self):
+        call_command('tomar_instantanea', '--fecha', '2024-01-01', stdout=io.StringIO())
+        importar([fila_csv(n, internet_tiene='Sí') for n in range(6)])
+        call_command('tomar_instantanea', '--fecha', '2024-02-01', stdout=io.StringIO())
+
+        combinaciones = Escuela.objects.values('region_id', 'distrito_id', 'categoria_id').distinct().count()
+        self.assertEqual(InstantaneaCobertura.objects.filter(fecha='2024-01-01').count(), combinaciones)
+
+        enero, febrero = tendencias.serie()
+        self.assertEqual(enero, {
+            'fecha': '2024-01-01', 'total_escuelas': 6, 'con_internet': 3, 'con_piso': 2,
+            'matricula': 750, 'matricula_con_internet': 390,
+            'porcentaje_internet': 50.0, 'porcentaje_piso': 33.33, 'porcentaje_matricula_internet': 52.0,
+        })
+        self.assertEqual((febrero['con_internet'], febrero['porcentaje_internet']), (6, 100.0))
+
+    def test_repetir_el_dia_reemplaza_la_instantanea(self):
+        tendencias.tomar_instantanea()
+        filas = tendencias.tomar_instantanea()
+        self.assertEqual(InstantaneaCobertura.objects.count(), filas)
+
+    def test_filtros_y_rango_en_la_api(self):
+        tendencias.tomar_instantanea(timezone.localdate() - timedelta(days=1))
+        tendencias.tomar_instantanea()
+        region = Region.objects.get(nombre='Región 0')
+
+        serie = self.client.get('/api/cobertura/tendencia/', {
+            'region': region.pk, 'desde': timezone.localdate().isoformat(),
+        }).json()['serie']
+        self.assertEqual([(punto['total_escuelas'], punto['con_internet']) for punto in serie], [(2, 1)])
+
+        self.assertEqual(self.client.get('/api/cobertura/tendencia/', {'desde': 'ayer'}).status_code, 400)
+        self.assertEqual(len(self.client.get('/reportes/tendencia/').context['serie']), 2)
+
+    def test_fecha_invalida_en_el_comando(self):
+        with self.assertRaises(CommandError):
+            call_command('tomar_instantanea', '--fecha', '01/01/2024')
+
+
+# -------------------------------------------------------------------------
+# CACHÉ POR REVISIÓN
+# -------------------------------------------------------------------------
+
+class CachePorRevisionTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        importar([fila_csv(n) for n in range(4)])
+
+    def test_la_clave_lleva_datos_y_catalogos(self):
+        clave = clave_cache('prueba', 'a', 1)
+        self.assertEqual(clave, f'gestor:prueba:{revision_cache()}:a:1')
+
+        importar([fila_csv(4)])
+        self.assertNotEqual(clave_cache('prueba', 'a', 1), clave)
+
+        clave = clave_cache('prueba', 'a', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Region.objects.create(nombre='Región nueva')
+        self.assertNotEqual(clave_cache('prueba', 'a', 1), clave)
+
+    def test_la_revision_se_lee_una_vez_por_plazo(self):
+        revision_cache()
+        with self.assertNumQueries(0):
+            revision_cache()
+        Escuela.objects.filter(cue='000000000').update(nombre='Otro nombre')
+        # Hasta que se invalida (al confirmar la transacción) se sigue viendo la anterior
+        anterior = revision_datos()
+        invalidar_revision()
+        self.assertGreater(revision_datos(), anterior)
+
+    def test_pagina_anonima_servida_desde_la_cache(self):
+        primera = self.client.get('/reportes/internet/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/reportes/internet/').content, primera.content)
+
+    def test_un_cambio_de_datos_deja_vieja_la_pagina(self):
+        antes = self.client.get('/reportes/internet/').content
+        importar([fila_csv(n) for n in range(4, 10)])
+        self.assertNotEqual(self.client.get('/reportes/internet/').content, antes)
+
+    def test_con_sesion_no_se_usa_la_cache_de_paginas(self):
+        self.client.get('/reportes/internet/')
+        self.client.force_login(User.objects.create_user('usuario'))
+        respuesta = self.client.get('/reportes/internet/')
+        self.assertContains(respuesta, 'usuario')
+
+
+# -------------------------------------------------------------------------
+# CONFIGURACIÓN DE GUNICORN
+# -------------------------------------------------------------------------
+
+class ConfiguracionGunicornTests(SimpleTestCase):
+    VARIABLES = (
+        'GUNICORN_WORKER_CLASS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_TIMEOUT',
+        'GUNICORN_PRELOAD', 'GUNICORN_PRECALENTAR', 'GUNICORN_MAX_REQUESTS',
+    )
+
+    def _configuracion(self, **entorno):
+        with mock.patch.dict(os.environ, entorno):
+            for clave in set(self.VARIABLES) - set(entorno):
+                os.environ.pop(clave, None)
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_por_defecto_asgi_con_preload(self):
+        valores = self._configuracion()
+        self.assertEqual(valores['worker_class'], 'uvicorn_worker.UvicornWorker')
+        self.assertEqual(valores['wsgi_app'], 'ges_proyecto.asgi:application')
+        self.assertTrue(valores['preload_app'])
+        self.assertLessEqual(valores['workers'], 4)
+        self.assertEqual(valores['timeout'], 120)
+
+    def test_valores_del_entorno(self):
+        valores = self._configuracion(
+            GUNICORN_WORKER_CLASS='gthread', WEB_CONCURRENCY='9', GUNICORN_THREADS='8',
+            GUNICORN_TIMEOUT='30', GUNICORN_PRELOAD='False', GUNICORN_MAX_REQUESTS='0',
+        )
+        self.assertEqual(valores['wsgi_app'], 'ges_proyecto.wsgi:application')
+        self.assertEqual(
+            (valores['workers'], valores['threads'], valores['timeout'], valores['max_requests']),
+            (9, 8, 30, 0))
+        self.assertFalse(valores['preload_app'])
+
+    def test_precalentamiento_en_el_maestro_o_en_cada_worker(self):
+        servidor = mock.Mock()
+        with mock.patch.object(precalentar, 'precalentar', return_value=[('tablero', 0.1), ('mapa', None)]):
+            self._configuracion()['when_ready'](servidor)
+            servidor.log.warning.assert_called_once_with('Falló el precalentamiento de %s', 'mapa')
+
+            worker = mock.Mock()
+            self._configuracion()['post_worker_init'](worker)
+            worker.log.info.assert_not_called()
+            self._configuracion(GUNICORN_PRELOAD='False')['post_worker_init'](worker)
+            worker.log.info.assert_called_once_with('Precalentado %s en %.2f s', 'tablero', 0.1)
+
+            servidor = mock.Mock()
+            self._configuracion(GUNICORN_PRECALENTAR='False')['when_ready'](servidor)
+            servidor.log.info.assert_not_called()
+
+
+# -------------------------------------------------------------------------
+# PRUEBA DE CARGA
+# -------------------------------------------------------------------------
+
+class DatosSinteticosTests(ConCacheLimpia, TestCase):
+
+    def test_misma_semilla_mismos_datos(self):
+        self.assertEqual(list(sinteticos.filas(50, 3)), list(sinteticos.filas(50, 3)))
+        self.assertNotEqual(list(sinteticos.filas(50, 3)), list(sinteticos.filas(50, 4)))
+
+    def test_sembrar_y_borrar(self):
+        salida = io.StringIO()
+        call_command('sembrar_datos_prueba', '--escuelas', '40', stdout=salida)
+        self.assertEqual(sinteticos.sinteticas().count(), 40)
+        self.assertIn('40 escuelas creadas', salida.getvalue())
+        # Las columnas copiadas del servicio vigente quedan como con una importación
+        self.assertFalse(Escuela.objects.filter(tiene_internet=True, servicio_vigente__isnull=True).exists())
+
+        call_command('sembrar_datos_prueba', '--borrar', stdout=io.StringIO())
+        self.assertFalse(Escuela.objects.exists())
+
+    def test_no_siembra_sobre_datos_reales(self):
+        importar([fila_csv(1)])
+        with self.assertRaises(CommandError):
+            call_command('sembrar_datos_prueba', '--escuelas', '5', stdout=io.StringIO())
+
+
+class EscenariosCargaTests(ConCacheLimpia, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        sinteticos.sembrar(60, semilla=1)
+
+    def test_la_muestra_depende_solo_de_la_semilla(self):
+        self.assertEqual(carga.datos_de_prueba(5), carga.datos_de_prueba(5))
+        self.assertNotEqual(carga.datos_de_prueba(5)['cues'], carga.datos_de_prueba(6)['cues'])
+
+    def test_los_escenarios_piden_rutas_que_existen(self):
+        datos = carga.datos_de_prueba(1)
+        for nombre, (_, escenario) in carga.ESCENARIOS.items():
+            for semilla in range(3):
+                sesion = escenario(random.Random(semilla), datos)
+                tipo, ruta = next(sesion)
+                try:
+                    while True:
+                        respuesta = self.client.get(ruta)
+                        self.assertEqual(respuesta.status_code, 200, f'{nombre}: {tipo} {ruta}')
+                        tipo, ruta = sesion.send(respuesta.content)
+                except StopIteration:
+                    pass
+
+    def test_resumen_y_comparacion(self):
+        muestras = {'popup': [(200, 0.01 * n) for n in range(1, 101)] + [(500, 2.0), (None, 3.0)]}
+        datos = carga.resumen(muestras, 10)
+        self.assertEqual(datos['rutas']['popup']['pedidos'], 102)
+        self.assertEqual(datos['rutas']['popup']['errores'], 2)
+        self.assertEqual(datos['rutas']['popup']['p50_ms'], 510.0)
+        self.assertEqual(datos['total']['por_segundo'], 10.2)
+
+        mas_lento = carga.resumen({'popup': [(200, 2 * t) for _, t in muestras['popup']]}, 10)
+        (tipo, cifras), (total, _) = carga.comparar(datos, mas_lento)
+        self.assertEqual((tipo, total), ('popup', 'TOTAL'))
+        self.assertEqual(cifras['p50_ms'], (510.0, 1020.0, 100.0))
+        self.assertEqual(cifras['porcentaje_errores'][1], 0)
@@ -17,30 +17,48 @@ urlpatterns = [
 
     # --- AJAX / ENDPOINTS DINÁMICOS ---
     path('ajax/cargar-distritos/', views.ajax_cargar_distritos, name='ajax_cargar_distritos'),
+    path('api/jerarquia/', views.api_jerarquia, name='api_jerarquia'),
 
     # --- REPORTES ---
     path('reportes/', views.reportes_generales, name='reportes_generales'),
     path('reportes/internet/', views.reporte_internet, name='reporte_internet'),
     path('reportes/piso/', views.reporte_piso, name='reporte_piso'),
+    path('reportes/brechas/', views.reporte_brechas, name='reporte_brechas'),
+    path('reportes/brechas/csv/', views.exportar_brechas_csv, name='exportar_brechas_csv'),
+    path('reportes/tendencia/', views.tendencia_cobertura, name='tendencia_cobertura'),
+    path('reportes/pivote/', views.reporte_pivote, name='reporte_pivote'),
+    path('reportes/pivote/excel/', views.exportar_pivote_excel, name='exportar_pivote_excel'),
+    path('reportes/proveedores/', views.reporte_proveedores, name='reporte_proveedores'),
+    path('reportes/proveedores/excel/', views.exportar_proveedores_excel, name='exportar_proveedores_excel'),
 
     # --- MAPAS ---
     path('mapa/', views.mapa_escuelas_colores, name='mapa_escuelas_colores'),
     path('mapa-escuelas-con-internet/', views.mapa_escuelas_con_internet, name='mapa_escuelas_con_internet'),
+    path('tiles/<int:z>/<int:x>/<int:y>', views.tesela_escuelas, name='tesela_escuelas'),
 
     # --- HERRAMIENTAS DE DATOS ---
     path('datos/', views.carga_descarga_view, name='carga_descarga_url'),
     path('datos/importar/', views.importar_datos, name='importar_datos'),
+    path('datos/importar/confirmar/', views.confirmar_importacion, name='confirmar_importacion'),
     path('datos/exportar/', views.exportar_datos, name='exportar_datos'),
     path('datos/plantilla/', views.descargar_plantilla, name='descargar_plantilla'),
 
     # --- EXPORTACIONES ---
     path('escuela/<str:cue>/generar_excel/', views.generar_excel_escuela, name='generar_excel_escuela'),
+    path('escuelas/generar_excel/', views.generar_excel_escuelas, name='generar_excel_escuelas'),
     path('exportar_resultados/', views.exportar_resultados_excel, name='exportar_resultados'),
     path('reportes/exportar/', views.exportar_reporte_excel, name='exportar_reporte_excel'),
     
     # --- Api Escuelas para mapa 
     path('api/escuela/<str:cue>/', views.api_escuela, name='api_escuela'),
     path("api/escuelas/bounds/", views.api_escuelas_bounds, name="api_escuelas_bounds"),
+    path('api/escuelas/cercanas/', views.api_escuelas_cercanas, name='api_escuelas_cercanas'),
+    path('api/escuelas/radio/', views.api_escuelas_radio, name='api_escuelas_radio'),
+    path('api/cambios/', views.api_cambios, name='api_cambios'),
+    path('api/estado/conexiones/', views.api_estado_conexiones, name='api_estado_conexiones'),
+    path('api/cobertura/tendencia/', views.api_tendencia_cobertura, name='api_tendencia_cobertura'),
+    path('api/reportes/pivote/', views.api_reporte_pivote, name='api_reporte_pivote'),
+    path('api/reportes/proveedores/', views.api_reporte_proveedores, name='api_reporte_proveedores'),
     
 
 
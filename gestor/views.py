@@ -1,5 +1,6 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -9,8 +10,9 @@ from .models import (
     Ciudad, PlanPiso, EstadoConectividad, 
     ProveedorInternet, ProveedorPisoTecnologico, # Proveedores ya existentes
     TipoPisoTecnologico, MetodoSolicitud, # Modelos agregados para Carga Masiva
+    RegistroCambio, hasta_confirmados,
 )
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Exists, OuterRef, Prefetch
 # Importaciones necesarias al inicio del archivo excel
 import openpyxl
 from openpyxl import Workbook
@@ -20,6 +22,21 @@ from openpyxl.utils import get_column_letter
 from django.db.models import Count, F, ExpressionWrapper, DecimalField, Sum, Case, When, Value, BooleanField
 from django.db.models.functions import Cast # Asegúrate de que Cast esté importado
 from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.utils.dateparse import parse_date, parse_datetime
+from asgiref.sync import sync_to_async
+
+from . import (
+    analitica, cobertura, conexiones, espacial, excel_escuela, importacion, mapa, pivote, precalentar,
+    proveedores, tendencias, teselas,
+)
+from .catalogos import arbol_geografico
+from .desnormalizacion import RELACIONES_VIGENTES
+from .paginas import cache_por_revision
+from .revision import TTL_CACHE, clave_cache
 
 
 
@@ -27,7 +44,11 @@ from django.core.paginator import Paginator
 # --- Importaciones para la gestión de archivos (CSV) ---
 import csv
 import io
-from datetime import datetime
+import logging
+from datetime import datetime, time
+
+
+logger = logging.getLogger(__name__)
 
 
 # =========================================================================
@@ -89,52 +110,63 @@ def lista_escuelas(request):
 def detalle_escuela(request, cue):
     """
     Muestra el detalle de una escuela específica, incluyendo sus servicios y pisos tecnológicos.
+    El fragmento renderizado se cachea por CUE bajo la revisión de datos, así que
+    solo se vuelve a consultar la base cuando hubo cambios.
     """
-    escuela = get_object_or_404(Escuela, cue=cue)
-    servicios = ServicioConectividad.objects.filter(escuela=escuela)
-    pisos_tecnologicos = PisoTecnologico.objects.filter(escuela=escuela)
-    
-    # NUEVO: obtener otras escuelas con el mismo predio
-    otras_escuelas_predio = Escuela.objects.filter(
-        predio=escuela.predio
-    ).exclude(cue=escuela.cue)
-    
-    context = {
-        'escuela': escuela,
-        'servicios': servicios,
-        'pisos_tecnologicos': pisos_tecnologicos,
-        'otras_escuelas_predio': otras_escuelas_predio,
-    }
-    return render(request, 'gestor/detalle_escuela.html', context)
-
-
-#Api para mapa escuelas colores 
-def api_escuela(request, cue):
-    escuela = get_object_or_404(Escuela, cue=cue)
-
-    servicio = ServicioConectividad.objects.filter(escuela=escuela).first()
-    piso = PisoTecnologico.objects.filter(escuela=escuela).first()
-
-    data = {
-        "nombre": escuela.nombre,
-        "cue": escuela.cue,
-        "categoria": escuela.categoria.nombre if escuela.categoria else "Sin dato",
-
-        # Plan de enlace (Estado de Conectividad)
-        "plan_enlace": servicio.estado_conectividad.nombre if servicio and servicio.estado_conectividad else "Sin dato",
-
-        # Proveedor internet
-        "proveedor_internet": servicio.proveedor.nombre if servicio and servicio.proveedor else "Sin dato",
+    clave = clave_cache('detalle_escuela', cue)
+    detalle = cache.get(clave)
+
+    if detalle is None:
+        # Una consulta con todos los catálogos + prefetch de servicios, pisos
+        # y otras escuelas del mismo predio (sin consultas perezosas en la plantilla)
+        escuela = get_object_or_404(
+            Escuela.objects.select_related(
+                'region', 'distrito', 'ciudad', 'predio', 'ambito', 'dependencia',
+                'turno', 'categoria', 'tipo_establecimiento'
+            ).prefetch_related(
+                Prefetch(
+                    'servicioconectividad_set',
+                    queryset=ServicioConectividad.objects.select_related(
+                        'proveedor', 'estado_conectividad', 'metodo_solicitud'
+                    ).order_by('id'),
+                    to_attr='servicios',
+                ),
+                Prefetch(
+                    'pisotecnologico_set',
+                    queryset=PisoTecnologico.objects.select_related(
+                        'proveedor', 'plan_piso', 'tipo_piso_instalado'
+                    ).order_by('id'),
+                    to_attr='pisos',
+                ),
+                Prefetch(
+                    'predio__escuela_set',
+                    queryset=Escuela.objects.only('cue', 'nombre', 'predio_id').order_by('cue'),
+                    to_attr='escuelas_predio',
+                ),
+            ),
+            cue=cue
+        )
 
-        # Plan de Piso
-        "plan_piso": piso.plan_piso.nombre if piso and piso.plan_piso else "Sin dato",
+        # NUEVO: obtener otras escuelas con el mismo predio
+        otras_escuelas_predio = [otra for otra in escuela.predio.escuelas_predio if otra.pk != escuela.pk]
+
+        context = {
+            'escuela': escuela,
+            'servicios': escuela.servicios,
+            'pisos_tecnologicos': escuela.pisos,
+            'otras_escuelas_predio': otras_escuelas_predio,
+        }
+        detalle = {
+            'nombre_escuela': escuela.nombre,
+            'contenido': render_to_string('gestor/includes/detalle_escuela_contenido.html', context),
+        }
+        cache.set(clave, detalle, TTL_CACHE)
 
-        # Tipo de Piso Instalado
-        "tipo_piso": piso.tipo_piso_instalado.nombre if piso and piso.tipo_piso_instalado else "Sin dato",
+    context = {
+        'nombre_escuela': detalle['nombre_escuela'],
+        'contenido': mark_safe(detalle['contenido']),
     }
-
-    return JsonResponse(data)
-
+    return render(request, 'gestor/detalle_escuela.html', context)
 
 
 # =========================================================================
@@ -145,14 +177,16 @@ def busqueda(request):
     """
     Renderiza la página de búsqueda avanzada con TODAS las opciones de filtro de catálogo.
     """
+    arbol = arbol_geografico()
     context = {
-        'distritos': Distrito.objects.all().order_by('nombre'),
+        'distritos': arbol['distritos'],
         'dependencias': Dependencia.objects.all().order_by('nombre'),
         'estados_conectividad': EstadoConectividad.objects.all().order_by('nombre'),
         'planes_piso': PlanPiso.objects.all().order_by('nombre'),
-        'regiones': Region.objects.all().order_by('nombre'),
+        'regiones': arbol['regiones'],
         'predios': Predio.objects.all().order_by('numero_predio'), 
-        'ciudades': Ciudad.objects.all().order_by('nombre'),
+        'ciudades': arbol['ciudades'],
+        'version_jerarquia': arbol['version'],
         'ambitos': Ambito.objects.all().order_by('nombre'),
         'turnos': Turno.objects.all().order_by('nombre'),
         'categorias': Categoria.objects.all().order_by('nombre'),
@@ -232,40 +266,35 @@ def resultados_busqueda(request):
     if tipo_establecimiento_id:
         queryset = queryset.filter(tipo_establecimiento_id=tipo_establecimiento_id)
 
-    # --- Aplicar filtros de conectividad y tecnología (CORREGIDOS Y RELACIONADOS) ---
+    # --- Aplicar filtros de conectividad y tecnología ---
+    # Usan las columnas de Escuela copiadas del servicio y el piso vigentes
+    # (ver desnormalizacion.py): sin joins a las relaciones inversas ni DISTINCT.
 
-    # Filtro por Estado de Conectividad (Relación: ServicioConectividad)
+    # Filtro por Estado de Conectividad
     if estado_conectividad_id:
-        queryset = queryset.filter(
-            servicioconectividad__estado_conectividad_id=estado_conectividad_id
-        )
+        queryset = queryset.filter(internet_estado_id=estado_conectividad_id)
     
-    # Filtro por Plan Piso Tecnológico (Relación: PisoTecnologico)
+    # Filtro por Plan Piso Tecnológico
     if plan_piso_id:
-        queryset = queryset.filter(
-            pisotecnologico__plan_piso_id=plan_piso_id
-        )
+        queryset = queryset.filter(piso_plan_id=plan_piso_id)
 
     # Filtro por Proveedor de Internet
     if proveedor_internet_id:
-        queryset = queryset.filter(servicioconectividad__proveedor_id=proveedor_internet_id)
+        queryset = queryset.filter(internet_proveedor_id=proveedor_internet_id)
         
     # Filtro por Proveedor Piso Tecnológico
     if proveedor_piso_id:
-        queryset = queryset.filter(pisotecnologico__proveedor_id=proveedor_piso_id)
+        queryset = queryset.filter(piso_proveedor_id=proveedor_piso_id)
         
-    # Filtro por Año de Conexión (Asumiendo que se usa el año de instalación o mejora)
-    if ano_conectado:
-        # Busca escuelas donde la fecha de instalación o mejora tenga el año ingresado
+    # Filtro por Año de Conexión: año de instalación o de mejora del servicio
+    if ano_conectado.isdigit():
         queryset = queryset.filter(
-            servicioconectividad__fecha_instalacion__year=ano_conectado
-        ) | queryset.filter(
-            servicioconectividad__fecha_mejora__year=ano_conectado
+            Q(internet_ano_instalacion=ano_conectado) | Q(internet_ano_mejora=ano_conectado)
         )
 
     # Filtro por Año de Finalización de Piso Tecnológico
-    if ano_finalizacion_piso:
-        queryset = queryset.filter(pisotecnologico__fecha_terminado__year=ano_finalizacion_piso)
+    if ano_finalizacion_piso.isdigit():
+        queryset = queryset.filter(piso_ano_terminado=ano_finalizacion_piso)
 
 
     # Opciones binarias (Estas deberían estar en el modelo Escuela)
@@ -279,10 +308,6 @@ def resultados_busqueda(request):
     elif tiene_piso_tecnologico == 'no':
         queryset = queryset.filter(tiene_piso_tecnologico=False)
 
-    # Es CRUCIAL usar .distinct() después de filtrar por relaciones inversas
-    # para evitar que una escuela aparezca varias veces en los resultados.
-    queryset = queryset.distinct()
-
     # --- Paginación ---
     paginator = Paginator(queryset, 20) 
     page_number = request.GET.get('page')
@@ -311,218 +336,254 @@ def carga_descarga_view(request):
     """Renderiza el template para la gestión de importación y exportación."""
     return render(request, 'gestor/carga_descarga.html')
 
-# Función auxiliar para obtener o crear objetos de catálogo
-def get_or_create_related(model, value):
-    """Busca un objeto de catálogo por nombre o lo crea si no existe."""
-    if not value or not value.strip():
-        return None
-    # Usamos strip() para limpiar espacios en blanco antes de buscar/crear
-    obj, created = model.objects.get_or_create(nombre=value.strip())
-    return obj
+MAX_CUES_PREVISUALIZACION = 50
 
-@transaction.atomic
-def importar_datos(request):
-    """Procesa el archivo CSV subido para crear/actualizar datos."""
+
+def _leer_csv_subido(request):
+    """Valida el archivo subido y devuelve su contenido como texto (o None si hubo error)."""
     if request.method != 'POST':
         messages.error(request, 'Error: Se esperaba una solicitud POST.')
-        return redirect('carga_descarga_url')
-        
+        return None
+
     if 'csv_file' not in request.FILES:
         messages.error(request, 'Error: No se ha adjuntado ningún archivo.')
-        return redirect('carga_descarga_url')
+        return None
 
     csv_file = request.FILES['csv_file']
-    
+
     if not csv_file.name.endswith('.csv'):
         messages.error(request, 'Error: El archivo debe ser un CSV.')
+        return None
+
+    try:
+        return csv_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        messages.error(request, f'Error general durante la carga masiva: {e}')
+        return None
+
+
+def _importar_contenido(request, contenido):
+    """
+    Calcula las diferencias contra la base y escribe solo las filas nuevas o
+    modificadas. Las escuelas ausentes del archivo no se eliminan.
+    """
+    registros, errores = importacion.leer_csv(contenido)
+    diferencias = importacion.calcular_diferencias(registros)
+
+    with transaction.atomic():
+        creadas, actualizadas, errores_escritura = importacion.aplicar_diferencias(registros, diferencias)
+    errores += errores_escritura
+
+    # Los reportes y mapas quedaron obsoletos: se recalculan en segundo plano
+    if creadas or actualizadas:
+        precalentar.precalentar_en_segundo_plano()
+
+    for error in errores:
+        logger.warning('Error de importación: %s', error)
+
+    resumen = (
+        f'{creadas} escuelas creadas, {actualizadas} escuelas actualizadas, '
+        f'{len(diferencias["sin_cambios"])} sin cambios.'
+    )
+    if errores:
+        messages.error(request, f'Carga masiva finalizada con {len(errores)} errores. Total: {resumen}')
+    else:
+        messages.success(request, f'Carga masiva exitosa: {resumen}')
+
+
+def importar_datos(request):
+    """
+    Procesa el archivo CSV subido para crear/actualizar datos.
+    Con 'previsualizar' marcado no escribe nada: muestra el resumen de cambios
+    y deja el archivo pendiente hasta que el usuario confirme.
+    """
+    contenido = _leer_csv_subido(request)
+    if contenido is None:
+        return redirect('carga_descarga_url')
+
+    if not request.POST.get('previsualizar'):
+        try:
+            _importar_contenido(request, contenido)
+        except Exception as general_e:
+            # Manejar errores que ocurren fuera del bucle de filas (ej. archivo malo)
+            logger.exception('Falló la carga masiva')
+            messages.error(request, f'Error general durante la carga masiva: {general_e}')
         return redirect('carga_descarga_url')
 
     try:
-        # Decodificar el archivo y manejar el formato de entrada
-        data_set = csv_file.read().decode('utf-8')
-        io_string = io.StringIO(data_set)
-        
-        # Saltamos el encabezado (asumimos que la primera fila es el header)
-        next(io_string) 
+        registros, errores = importacion.leer_csv(contenido)
+        diferencias = importacion.calcular_diferencias(registros)
+    except Exception as general_e:
+        logger.exception('Falló la previsualización de la carga masiva')
+        messages.error(request, f'Error general durante la carga masiva: {general_e}')
+        return redirect('carga_descarga_url')
 
-        imported_count = 0
-        updated_count = 0
-        errors = []
+    # Si había una previsualización anterior sin confirmar, se descarta
+    token_anterior = request.session.get('importacion_pendiente')
+    if token_anterior:
+        importacion.borrar_pendiente(token_anterior)
+    request.session['importacion_pendiente'] = importacion.guardar_pendiente(contenido)
+
+    resumen = []
+    for clave, titulo in (
+        ('nuevas', 'Escuelas nuevas'),
+        ('modificadas', 'Escuelas modificadas'),
+        ('sin_cambios', 'Escuelas sin cambios'),
+        ('eliminadas', 'En la base pero no en el archivo (no se eliminan)'),
+    ):
+        cues = diferencias[clave][:MAX_CUES_PREVISUALIZACION] if clave != 'sin_cambios' else []
+        resumen.append({
+            'clave': clave,
+            'titulo': titulo,
+            'total': len(diferencias[clave]),
+            'cues': cues,
+            'restantes': len(diferencias[clave]) - len(cues) if cues else 0,
+        })
+
+    context = {
+        'resumen': resumen,
+        'total_a_escribir': len(diferencias['nuevas']) + len(diferencias['modificadas']),
+        'errores': errores,
+        'nombre_archivo': request.FILES['csv_file'].name,
+    }
+    return render(request, 'gestor/importacion_previa.html', context)
 
-        reader = csv.reader(io_string, delimiter=',')
-        
-        # Definición de índices de columna
-        CUE_INDEX = 0
-        CLAVE_PROVINCIAL_INDEX = 1
-        NOMBRE_INDEX = 2
-        DIRECCION_INDEX = 3
-        MATRICULA_INDEX = 4
-        LATITUD_INDEX = 5
-        LONGITUD_INDEX = 6
-        
-        REGION_INDEX = 7
-        DISTRITO_INDEX = 8
-        CIUDAD_INDEX = 9
-        AMBITO_INDEX = 10
-        DEPENDENCIA_INDEX = 11
-        TURNO_INDEX = 12
-        CATEGORIA_INDEX = 13
-        TIPO_ESTABLECIMIENTO_INDEX = 14
-        NUMERO_PREDIO_INDEX = 15
-
-        INTERNET_TIENE_INDEX = 16
-        INTERNET_PROV_INDEX = 17
-        INTERNET_VELOCIDAD_INDEX = 18
-        INTERNET_ESTADO_INDEX = 19
-        INTERNET_FECHA_INDEX = 20
-        INTERNET_METODO_INDEX = 21
-        INTERNET_OBS_INDEX = 22
-
-        PISO_TIENE_INDEX = 23
-        PISO_PROV_INDEX = 24
-        PISO_PLAN_INDEX = 25
-        PISO_TIPO_INDEX = 26
-        PISO_FECHA_INDEX = 27
-        PISO_MEJORA_INDEX = 28
-        PISO_OBS_INDEX = 29
-        
-        for i, row in enumerate(reader):
-            # i es el índice de la fila de datos (después del encabezado)
-            
-            if not row or not row[CUE_INDEX].strip(): continue 
-            
-            cue = row[CUE_INDEX].strip()
-            
-            try:
-                # --- Validaciones y Conversiones ---
-                matricula = int(row[MATRICULA_INDEX] or 0)
-                tiene_internet = row[INTERNET_TIENE_INDEX].strip().upper() in ('SÍ', 'SI', 'TRUE')
-                tiene_piso = row[PISO_TIENE_INDEX].strip().upper() in ('SÍ', 'SI', 'TRUE')
-                
-                # --- Predio (Obligatorio) ---
-                predio_num = row[NUMERO_PREDIO_INDEX].strip()
-                if not predio_num:
-                    raise ValueError("El número de predio no puede estar vacío.")
-                predio, _ = Predio.objects.get_or_create(numero_predio=predio_num)
-                
-                # --- Escuela: Buscar o crear objetos relacionados (Catálogos) ---
-                region = get_or_create_related(Region, row[REGION_INDEX])
-                distrito = get_or_create_related(Distrito, row[DISTRITO_INDEX])
-                ciudad = get_or_create_related(Ciudad, row[CIUDAD_INDEX])
-                ambito = get_or_create_related(Ambito, row[AMBITO_INDEX])
-                dependencia = get_or_create_related(Dependencia, row[DEPENDENCIA_INDEX])
-                turno = get_or_create_related(Turno, row[TURNO_INDEX])
-                categoria = get_or_create_related(Categoria, row[CATEGORIA_INDEX])
-                tipo_establecimiento = get_or_create_related(TipoEstablecimiento, row[TIPO_ESTABLECIMIENTO_INDEX])
-                
-                # Crear o actualizar Escuela
-                escuela_data = {
-                    'clave_provincial': row[CLAVE_PROVINCIAL_INDEX].strip() or None,
-                    'nombre': row[NOMBRE_INDEX].strip(),
-                    'direccion': row[DIRECCION_INDEX].strip(),
-                    'matricula': matricula,
-                    'latitud': row[LATITUD_INDEX] or None,
-                    'longitud': row[LONGITUD_INDEX] or None,
-                    'tiene_internet': tiene_internet,
-                    'tiene_piso_tecnologico': tiene_piso,
-                    'predio': predio,
-                    'region': region, 'distrito': distrito, 'ciudad': ciudad, 
-                    'ambito': ambito, 'dependencia': dependencia, 'turno': turno, 
-                    'categoria': categoria, 'tipo_establecimiento': tipo_establecimiento
-                }
-                
-                escuela, created = Escuela.objects.update_or_create(
-                    cue=cue,
-                    defaults=escuela_data
-                )
-                
-                if created:
-                    imported_count += 1
-                else:
-                    updated_count += 1
-
-                # --- ServicioConectividad ---
-                if escuela.tiene_internet:
-                    prov_int = get_or_create_related(ProveedorInternet, row[INTERNET_PROV_INDEX])
-                    estado_con = get_or_create_related(EstadoConectividad, row[INTERNET_ESTADO_INDEX])
-                    metodo_sol = get_or_create_related(MetodoSolicitud, row[INTERNET_METODO_INDEX])
-                    
-                    fecha_inst_str = row[INTERNET_FECHA_INDEX].strip()
-                    fecha_inst = datetime.strptime(fecha_inst_str, '%Y-%m-%d').date() if fecha_inst_str else None
-                    
-                    ServicioConectividad.objects.update_or_create(
-                        escuela=escuela,
-                        defaults={
-                            'proveedor': prov_int,
-                            'velocidad_mbps': int(row[INTERNET_VELOCIDAD_INDEX] or 0),
-                            'estado_conectividad': estado_con,
-                            'fecha_instalacion': fecha_inst,
-                            'metodo_solicitud': metodo_sol,
-                            'observaciones': row[INTERNET_OBS_INDEX].strip(),
-                        }
-                    )
-                # Si no tiene internet, eliminar el registro de servicio si existe
-                elif ServicioConectividad.objects.filter(escuela=escuela).exists():
-                     ServicioConectividad.objects.filter(escuela=escuela).delete()
-
-
-                # --- PisoTecnologico ---
-                if escuela.tiene_piso_tecnologico:
-                    prov_piso = get_or_create_related(ProveedorPisoTecnologico, row[PISO_PROV_INDEX])
-                    plan_piso = get_or_create_related(PlanPiso, row[PISO_PLAN_INDEX])
-                    tipo_piso = get_or_create_related(TipoPisoTecnologico, row[PISO_TIPO_INDEX])
-                    
-                    fecha_term_str = row[PISO_FECHA_INDEX].strip()
-                    fecha_term = datetime.strptime(fecha_term_str, '%Y-%m-%d').date() if fecha_term_str else None
-
-                    PisoTecnologico.objects.update_or_create(
-                        escuela=escuela,
-                        defaults={
-                            'proveedor': prov_piso,
-                            'plan_piso': plan_piso,
-                            'tipo_piso_instalado': tipo_piso,
-                            'fecha_terminado': fecha_term,
-                            'tipo_mejora': row[PISO_MEJORA_INDEX].strip(),
-                            'observaciones': row[PISO_OBS_INDEX].strip(),
-                        }
-                    )
-                # Si no tiene piso, eliminar el registro de piso si existe
-                elif PisoTecnologico.objects.filter(escuela=escuela).exists():
-                    PisoTecnologico.objects.filter(escuela=escuela).delete()
-
-            except Exception as e:
-                # Recolectar errores y continuar con la siguiente fila
-                errors.append(f"Fila {i+2} (CUE: {cue}): Error al procesar - {e}")
-                # Imprimir errores en la consola del servidor para depuración
-                print(f"Error de Importación Fila {i+2}: {e}") 
-
-        # Mensajes al finalizar la transacción atómica
-        if errors:
-            messages.error(request, f'Carga masiva finalizada con {len(errors)} errores. Total: {imported_count} creadas, {updated_count} actualizadas.')
-        else:
-            messages.success(request, f'Carga masiva exitosa: {imported_count} escuelas creadas, {updated_count} escuelas actualizadas.')
 
+def confirmar_importacion(request):
+    """Aplica la importación previsualizada, escribiendo solo las filas que cambiaron."""
+    if request.method != 'POST':
+        messages.error(request, 'Error: Se esperaba una solicitud POST.')
+        return redirect('carga_descarga_url')
+
+    token = request.session.pop('importacion_pendiente', None)
+    contenido = importacion.leer_pendiente(token) if token else None
+    if contenido is None:
+        messages.error(request, 'Error: No hay ninguna importación pendiente de confirmación.')
+        return redirect('carga_descarga_url')
+
+    try:
+        if request.POST.get('accion') == 'cancelar':
+            messages.info(request, 'Importación cancelada. No se guardaron cambios.')
+        else:
+            # Las diferencias se recalculan: la base pudo cambiar desde la previsualización
+            _importar_contenido(request, contenido)
     except Exception as general_e:
-        # Manejar errores que ocurren fuera del bucle de filas (ej. archivo malo o codificación)
+        logger.exception('Falló la confirmación de la carga masiva')
         messages.error(request, f'Error general durante la carga masiva: {general_e}')
-        # Aseguramos que la transacción se revierta si ocurre un error general
-        transaction.set_rollback(True)
-        
+    finally:
+        importacion.borrar_pendiente(token)
+
     return redirect('carga_descarga_url')
 
+class _Echo:
+    """Buffer mínimo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+def _es_asgi(request):
+    """
+    Bajo ASGI, Django junta en memoria un iterador sync antes de enviarlo
+    (y bajo WSGI, uno async): las exportaciones en streaming entregan el
+    tipo de iterador que corresponde al servidor.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def _fila_exportacion(escuela, servicio, piso):
+    """Construye la fila del CSV de exportación (mismo orden que la importación)."""
+    return [
+        escuela.cue,
+        escuela.clave_provincial or '',
+        escuela.nombre,
+        escuela.direccion,
+        escuela.matricula,
+        escuela.latitud or '', 
+        escuela.longitud or '',
+        
+        # Catálogos
+        escuela.region.nombre if escuela.region else '',
+        escuela.distrito.nombre if escuela.distrito else '',
+        escuela.ciudad.nombre if escuela.ciudad else '',
+        escuela.ambito.nombre if escuela.ambito else '',
+        escuela.dependencia.nombre if escuela.dependencia else '',
+        escuela.turno.nombre if escuela.turno else '',
+        escuela.categoria.nombre if escuela.categoria else '',
+        escuela.tipo_establecimiento.nombre if escuela.tipo_establecimiento else '',
+        escuela.predio.numero_predio if escuela.predio else '',
+        
+        # Conectividad
+        'Sí' if escuela.tiene_internet else 'No',
+        servicio.proveedor.nombre if servicio and servicio.proveedor else '',
+        servicio.velocidad_mbps if servicio else 0,
+        servicio.estado_conectividad.nombre if servicio and servicio.estado_conectividad else '',
+        servicio.fecha_instalacion.isoformat() if servicio and servicio.fecha_instalacion else '',
+        servicio.metodo_solicitud.nombre if servicio and servicio.metodo_solicitud else '',
+        servicio.observaciones.replace('\n', ' ') if servicio and servicio.observaciones else '',
+        
+        # Piso Tecnológico
+        'Sí' if escuela.tiene_piso_tecnologico else 'No',
+        piso.proveedor.nombre if piso and piso.proveedor else '',
+        piso.plan_piso.nombre if piso and piso.plan_piso else '',
+        piso.tipo_piso_instalado.nombre if piso and piso.tipo_piso_instalado else '',
+        piso.fecha_terminado.isoformat() if piso and piso.fecha_terminado else '',
+        piso.tipo_mejora if piso else '',
+        piso.observaciones.replace('\n', ' ') if piso and piso.observaciones else '',
+    ]
+
+
+def _parsear_desde(valor):
+    """Interpreta el parámetro 'since' (fecha o fecha y hora ISO). None si es inválido."""
+    # Un '+' sin codificar en la URL llega como espacio (p. ej. '...T10:00:00 00:00')
+    fecha_hora = parse_datetime(valor) or parse_datetime(valor.replace(' ', '+'))
+    if fecha_hora is None:
+        fecha = parse_date(valor)
+        if fecha is None:
+            return None
+        fecha_hora = datetime.combine(fecha, time.min)
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
 def exportar_datos(request):
-    """Exporta todas las escuelas y sus datos relacionados a un solo archivo CSV."""
-    response = HttpResponse(content_type='text/csv')
-    # Añade la fecha y hora al nombre del archivo
-    filename = "escuelas_full_export_{}.csv".format(datetime.now().strftime('%Y%m%d_%H%M'))
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    """
+    Exporta todas las escuelas y sus datos relacionados a un solo archivo CSV.
+    Con ?since=<fecha ISO> exporta solo las escuelas cuyo registro, servicio o
+    piso cambió desde ese momento. La respuesta se envía en streaming e incluye
+    en el encabezado X-Exportacion-Hasta el valor a usar como próximo 'since'.
+    """
+    # Se toma antes de consultar: lo que cambie durante la descarga entra en la próxima
+    hasta = timezone.now()
 
-    writer = csv.writer(response)
-    
+    escuelas = Escuela.objects.all().select_related(
+        'region', 'distrito', 'ciudad', 'ambito', 'dependencia', 'turno', 
+        'categoria', 'tipo_establecimiento', 'predio', *RELACIONES_VIGENTES
+    )
+
+    since = request.GET.get('since')
+    if since:
+        desde = _parsear_desde(since)
+        if desde is None:
+            return JsonResponse({'error': 'Parámetro since inválido (usar AAAA-MM-DD o ISO 8601)'}, status=400)
+        escuelas = escuelas.filter(
+            Q(fecha_actualizacion__gte=desde)
+            | Exists(ServicioConectividad.objects.filter(escuela=OuterRef('pk'), fecha_actualizacion__gte=desde))
+            | Exists(PisoTecnologico.objects.filter(escuela=OuterRef('pk'), fecha_actualizacion__gte=desde))
+        )
+        filename = "escuelas_cambios_{}.csv".format(desde.strftime('%Y%m%d_%H%M'))
+    else:
+        # Añade la fecha y hora al nombre del archivo
+        filename = "escuelas_full_export_{}.csv".format(datetime.now().strftime('%Y%m%d_%H%M'))
+
+    # El servicio y el piso vigentes vienen en el mismo join que la escuela
+    escuelas = escuelas.order_by('id')
+
+    writer = csv.writer(_Echo())
     # ---------------------------------------------------------------------
     # ESTRUCTURA DEL ENCABEZADO (Debe coincidir EXACTAMENTE con el orden en importación)
     # ---------------------------------------------------------------------
-    header = [
+    encabezado = writer.writerow([
         'CUE', 'Clave_Provincial', 'Nombre', 'Direccion', 'Matricula', 
         'Latitud', 'Longitud', 
         
@@ -539,61 +600,25 @@ def exportar_datos(request):
         'Piso_Tiene (Sí/No)', 'Piso_Proveedor', 'Piso_Plan', 
         'Piso_Tipo_Instalado', 'Piso_Fecha_Terminado (AAAA-MM-DD)', 'Piso_Tipo_Mejora', 
         'Piso_Observaciones',
-    ]
-    writer.writerow(header)
+    ])
 
-    # Optimizamos la consulta cargando todas las relaciones en una sola vez (select_related)
-    escuelas = Escuela.objects.all().select_related(
-        'region', 'distrito', 'ciudad', 'ambito', 'dependencia', 'turno', 
-        'categoria', 'tipo_establecimiento', 'predio'
-    )
-    
-    for escuela in escuelas:
-        # Obtenemos servicios relacionados
-        servicio = ServicioConectividad.objects.filter(escuela=escuela).first()
-        piso = PisoTecnologico.objects.filter(escuela=escuela).first()
+    def linea(escuela):
+        return writer.writerow(_fila_exportacion(escuela, escuela.servicio_vigente, escuela.piso_vigente))
 
-        # Construimos la fila
-        row = [
-            escuela.cue,
-            escuela.clave_provincial or '',
-            escuela.nombre,
-            escuela.direccion,
-            escuela.matricula,
-            escuela.latitud or '', 
-            escuela.longitud or '',
-            
-            # Catálogos
-            escuela.region.nombre if escuela.region else '',
-            escuela.distrito.nombre if escuela.distrito else '',
-            escuela.ciudad.nombre if escuela.ciudad else '',
-            escuela.ambito.nombre if escuela.ambito else '',
-            escuela.dependencia.nombre if escuela.dependencia else '',
-            escuela.turno.nombre if escuela.turno else '',
-            escuela.categoria.nombre if escuela.categoria else '',
-            escuela.tipo_establecimiento.nombre if escuela.tipo_establecimiento else '',
-            escuela.predio.numero_predio if escuela.predio else '',
-            
-            # Conectividad
-            'Sí' if escuela.tiene_internet else 'No',
-            servicio.proveedor.nombre if servicio and servicio.proveedor else '',
-            servicio.velocidad_mbps if servicio else 0,
-            servicio.estado_conectividad.nombre if servicio and servicio.estado_conectividad else '',
-            servicio.fecha_instalacion.isoformat() if servicio and servicio.fecha_instalacion else '',
-            servicio.metodo_solicitud.nombre if servicio and servicio.metodo_solicitud else '',
-            servicio.observaciones.replace('\n', ' ') if servicio and servicio.observaciones else '',
-            
-            # Piso Tecnológico
-            'Sí' if escuela.tiene_piso_tecnologico else 'No',
-            piso.proveedor.nombre if piso and piso.proveedor else '',
-            piso.plan_piso.nombre if piso and piso.plan_piso else '',
-            piso.tipo_piso_instalado.nombre if piso and piso.tipo_piso_instalado else '',
-            piso.fecha_terminado.isoformat() if piso and piso.fecha_terminado else '',
-            piso.tipo_mejora if piso else '',
-            piso.observaciones.replace('\n', ' ') if piso and piso.observaciones else '',
-        ]
-        writer.writerow(row)
+    def filas():
+        yield encabezado
+        for escuela in escuelas.iterator(chunk_size=1000):
+            yield linea(escuela)
+
+    async def afilas():
+        yield encabezado
+        async for escuela in escuelas.aiterator(chunk_size=1000):
+            yield linea(escuela)
 
+    contenido = afilas() if _es_asgi(request) else filas()
+    response = StreamingHttpResponse(contenido, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Exportacion-Hasta'] = hasta.isoformat()
     return response
 
 def descargar_plantilla(request):
@@ -649,132 +674,332 @@ from django.shortcuts import render
 from .models import Escuela 
 
 # Usa la función con el nombre que tienes: reporte_internet
+@cache_por_revision
 def reporte_internet(request):
-    # 1. Obtener los conteos
-    con_internet = Escuela.objects.filter(tiene_internet=True).count()
-    # Asumimos que el resto es "sin internet"
-    total_escuelas = Escuela.objects.count()
-    sin_internet = total_escuelas - con_internet 
-
-    # 2. CALCULAR LA TASA DE COBERTURA
-    if total_escuelas > 0:
-        # Usamos float() para garantizar una división decimal
-        tasa_cobertura = (float(con_internet) / total_escuelas) * 100
-        # Redondeamos a un decimal para presentación
-        tasa_cobertura_formateada = round(tasa_cobertura, 1)
-    else:
-        tasa_cobertura_formateada = 0.0
+    # 1. Obtener los conteos y las tasas (escuelas y matrícula) en una consulta, cacheada por revisión
+    totales = cobertura.generales()
 
-    # 3. Definir el contexto
+    # 2. Definir el contexto
     contexto = {
         'titulo_reporte': 'Reporte de Conectividad a Internet',
-        'con_internet': con_internet,
-        'sin_internet': sin_internet,
-        'tasa_cobertura': tasa_cobertura_formateada, # ¡Nueva variable para el porcentaje!
-        'total_escuelas': total_escuelas, # Total para referencia
+        'con_internet': totales['con_internet'],
+        'sin_internet': totales['sin_internet'],
+        'tasa_cobertura': totales['porcentaje_internet'], # ¡Nueva variable para el porcentaje!
+        'total_escuelas': totales['total_escuelas'], # Total para referencia
+        # Cobertura ponderada por matrícula
+        'matricula_total': totales['matricula_total'],
+        'matricula_con_internet': totales['matricula_con_internet'],
+        'tasa_cobertura_matricula': totales['porcentaje_matricula_internet'],
     }
 
     # Asegúrate de que renderice a reporte_internet.html
     return render(request, 'gestor/reporte_internet.html', contexto)
 ###
 # Función para el Reporte de Piso Tecnológico
+@cache_por_revision
 def reporte_piso(request):
-    # 1. Obtener los conteos
-    con_piso = Escuela.objects.filter(tiene_piso_tecnologico=True).count()
-    total_escuelas = Escuela.objects.count()
-    sin_piso = total_escuelas - con_piso 
-
-    # 2. CALCULAR LA TASA DE COBERTURA DE PISO TECNOLÓGICO
-    if total_escuelas > 0:
-        # Usamos float() para garantizar una división decimal
-        tasa_cobertura = (float(con_piso) / total_escuelas) * 100
-        # Redondeamos a un decimal para presentación
-        tasa_cobertura_formateada = round(tasa_cobertura, 1)
-    else:
-        tasa_cobertura_formateada = 0.0
+    # 1. Obtener los conteos y las tasas (escuelas y matrícula) en una consulta, cacheada por revisión
+    totales = cobertura.generales()
 
-    # 3. Definir el contexto
+    # 2. Definir el contexto
     contexto = {
         'titulo_reporte': 'Reporte de Piso Tecnológico',
-        'con_piso': con_piso,
-        'sin_piso': sin_piso,
-        'tasa_cobertura': tasa_cobertura_formateada, # Tasa de cobertura de Piso
-        'total_escuelas': total_escuelas, 
+        'con_piso': totales['con_piso'],
+        'sin_piso': totales['sin_piso'],
+        'tasa_cobertura': totales['porcentaje_piso'], # Tasa de cobertura de Piso
+        'total_escuelas': totales['total_escuelas'], 
+        # Cobertura ponderada por matrícula
+        'matricula_total': totales['matricula_total'],
+        'matricula_con_piso': totales['matricula_con_piso'],
+        'tasa_cobertura_matricula': totales['porcentaje_matricula_piso'],
     }
 
     # Asegúrate de que renderice a reporte_piso.html
     return render(request, 'gestor/reporte_piso.html', contexto)
 
+# -------------------------------------------------------------------------
+# BRECHAS DE COBERTURA (ver gestor/analitica.py)
+# -------------------------------------------------------------------------
+
+MAX_FILAS_BRECHAS = 200
+
+
+def _parametros_brechas(request):
+    """Lee region, distrito y orden del GET; los ids inválidos se ignoran."""
+    def entero(clave):
+        valor = request.GET.get(clave, '')
+        return int(valor) if valor.isdigit() else None
+
+    orden = request.GET.get('orden', 'prioridad')
+    if orden not in analitica.ORDENES:
+        orden = 'prioridad'
+    return entero('region'), entero('distrito'), orden
+
+
+def _filas_brechas(datos, indices, arbol):
+    """Filas listas para mostrar o exportar, con los nombres de región y distrito (de 'arbol')."""
+    regiones = {r['id']: r['nombre'] for r in arbol['regiones']}
+    distritos = {d['id']: d['nombre'] for d in arbol['distritos']}
+    for posicion, i in enumerate(indices, 1):
+        distancia = datos['distancia_km'][i]
+        yield {
+            'posicion': posicion,
+            'cue': datos['cue'][i],
+            'nombre': datos['nombre'][i],
+            'region': regiones.get(int(datos['region_id'][i]), ''),
+            'distrito': distritos.get(int(datos['distrito_id'][i]), ''),
+            'matricula': int(datos['matricula'][i]),
+            'distancia_km': None if distancia != distancia else round(float(distancia), 2),
+            'cue_conectada': datos['cue_conectada'][i],
+            'sin_internet_predio': int(datos['sin_internet_predio'][i]),
+            'puntaje': float(datos['puntaje'][i]),
+        }
+
+
+def reporte_brechas(request):
+    """
+    Ranking de escuelas sin Internet para planificar la conectividad: por
+    matrícula, distancia a la escuela conectada más cercana y cantidad de
+    escuelas sin Internet en el mismo predio.
+    """
+    region_id, distrito_id, orden = _parametros_brechas(request)
+    datos, indices = analitica.consultar(region_id, distrito_id, orden)
+    arbol = arbol_geografico()
+
+    contexto = {
+        'titulo_reporte': 'Brechas de Cobertura',
+        'filas': list(_filas_brechas(datos, indices[:MAX_FILAS_BRECHAS], arbol)),
+        'total_sin_internet': len(indices),
+        'matricula_sin_internet': int(datos['matricula'][indices].sum()),
+        'max_filas': MAX_FILAS_BRECHAS,
+        'ordenes': analitica.ORDENES,
+        'orden': orden,
+        'regiones': arbol['regiones'],
+        'distritos': arbol['distritos'],
+        'version_jerarquia': arbol['version'],
+        'filtro_region_id': region_id,
+        'filtro_distrito_id': distrito_id,
+        'query_string': request.GET.urlencode(),
+    }
+    return render(request, 'gestor/reporte_brechas.html', contexto)
+
+
+def exportar_brechas_csv(request):
+    """El ranking completo de brechas (con los mismos filtros) como CSV."""
+    region_id, distrito_id, orden = _parametros_brechas(request)
+    datos, indices = analitica.consultar(region_id, distrito_id, orden)
+    # Los nombres se leen acá: las filas se arman sin tocar la base
+    arbol = arbol_geografico()
+
+    columnas = [
+        ('posicion', 'Posición'), ('cue', 'CUE'), ('nombre', 'Nombre'),
+        ('region', 'Región'), ('distrito', 'Distrito'), ('matricula', 'Matrícula'),
+        ('distancia_km', 'Distancia a escuela con Internet (km)'),
+        ('cue_conectada', 'CUE escuela con Internet más cercana'),
+        ('sin_internet_predio', 'Escuelas sin Internet en el predio'),
+        ('puntaje', 'Puntaje'),
+    ]
+    writer = csv.writer(_Echo())
+
+    def filas():
+        yield '\ufeff' + writer.writerow([titulo for _, titulo in columnas])
+        for fila in _filas_brechas(datos, indices, arbol):
+            yield writer.writerow(['' if fila[clave] is None else fila[clave] for clave, _ in columnas])
+
+    async def afilas():
+        # Los datos ya están en memoria: cada línea se arma sin bloquear
+        for linea in filas():
+            yield linea
+
+    contenido = afilas() if _es_asgi(request) else filas()
+    response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="brechas_cobertura.csv"'
+    return response
+
+
+# Tendencias de cobertura (leídas de las instantáneas diarias, nunca de Escuela)
+
+def _filtros_tendencia(request):
+    """Filtros region, distrito y categoria del GET; los ids no numéricos se ignoran."""
+    filtros = {}
+    for parametro, columna in tendencias.FILTROS.items():
+        valor = request.GET.get(parametro, '')
+        if valor.isdigit():
+            filtros[columna] = int(valor)
+    return filtros
+
+
+def _rango_tendencia(request):
+    """Rango desde/hasta del GET. Lanza ValueError si alguna fecha es inválida."""
+    rango = {}
+    for parametro in ('desde', 'hasta'):
+        valor = request.GET.get(parametro)
+        if valor:
+            fecha = parse_date(valor)
+            if fecha is None:
+                raise ValueError(f'Fecha inválida para {parametro} (usar AAAA-MM-DD)')
+            rango[parametro] = fecha
+    return rango
+
+
+def tendencia_cobertura(request):
+    """Evolución de la cobertura en el tiempo, con los filtros de región, distrito y categoría."""
+    filtros = _filtros_tendencia(request)
+    error = None
+    try:
+        rango = _rango_tendencia(request)
+    except ValueError as e:
+        error, rango = str(e), {}
+    arbol = arbol_geografico()
+
+    contexto = {
+        'titulo_reporte': 'Tendencia de Cobertura',
+        'serie': tendencias.serie(filtros, **rango),
+        'regiones': arbol['regiones'],
+        'distritos': arbol['distritos'],
+        'categorias': Categoria.objects.order_by('nombre').values('id', 'nombre'),
+        'version_jerarquia': arbol['version'],
+        'filtro_region_id': filtros.get('region_id'),
+        'filtro_distrito_id': filtros.get('distrito_id'),
+        'filtro_categoria_id': filtros.get('categoria_id'),
+        'desde': rango.get('desde'),
+        'hasta': rango.get('hasta'),
+        'error': error,
+    }
+    return render(request, 'gestor/tendencia_cobertura.html', contexto)
+
+
+def api_tendencia_cobertura(request):
+    """Serie de cobertura por fecha en JSON (mismos parámetros que la vista)."""
+    try:
+        rango = _rango_tendencia(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'serie': tendencias.serie(_filtros_tendencia(request), **rango)})
+
+
+# Reporte cruzado (tabla dinámica): ver pivote.py
+
+def reporte_pivote(request):
+    """Tabla cruzada con dimensiones, medidas y filtros elegidos en el formulario."""
+    arbol = arbol_geografico()
+    contexto = {
+        'titulo_reporte': 'Reporte Cruzado',
+        'dimensiones': [(clave, titulo) for clave, (_, titulo) in pivote.DIMENSIONES.items()],
+        'medidas': [(clave, titulo) for clave, (titulo, _) in pivote.MEDIDAS.items()],
+        'regiones': arbol['regiones'],
+        'distritos': arbol['distritos'],
+        'categorias': Categoria.objects.order_by('nombre').values('id', 'nombre'),
+        'version_jerarquia': arbol['version'],
+        'query_string': request.GET.urlencode(),
+        'tabla': None,
+        'error': None,
+    }
+    if request.GET:
+        try:
+            dimensiones, medidas, filtros = pivote.leer_pedido(request.GET)
+        except ValueError as e:
+            contexto['error'] = str(e)
+        else:
+            contexto['tabla'] = pivote.tabla_cruzada(dimensiones, medidas, filtros)
+            contexto.update(seleccion_dimensiones=dimensiones, seleccion_medidas=medidas, filtros=filtros)
+    if 'seleccion_dimensiones' not in contexto:
+        contexto.update(seleccion_dimensiones=['region', 'categoria'],
+                        seleccion_medidas=list(pivote.MEDIDAS_POR_DEFECTO), filtros={})
+    # Un selector por dimensión posible; los que sobran quedan en blanco
+    seleccion = contexto['seleccion_dimensiones']
+    contexto['selectores_dimension'] = [
+        seleccion[i] if i < len(seleccion) else '' for i in range(pivote.MAX_DIMENSIONES)
+    ]
+    return render(request, 'gestor/reporte_pivote.html', contexto)
+
+
+def api_reporte_pivote(request):
+    """El reporte cruzado en JSON, una fila por combinación de dimensiones."""
+    try:
+        dimensiones, medidas, filtros = pivote.leer_pedido(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(pivote.consultar(dimensiones, medidas, filtros))
+
+
+def exportar_pivote_excel(request):
+    """El reporte cruzado como .xlsx (mismos parámetros que la vista)."""
+    try:
+        dimensiones, medidas, filtros = pivote.leer_pedido(request.GET)
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain; charset=utf-8')
+    response = HttpResponse(
+        pivote.excel(pivote.tabla_cruzada(dimensiones, medidas, filtros)),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = f'attachment; filename="reporte_{"_".join(dimensiones)}.xlsx"'
+    return response
+
+
+# Desempeño de proveedores de Internet (ver gestor/proveedores.py)
+
+def reporte_proveedores(request):
+    """Escuelas, ancho de banda y demora hasta la mejora por proveedor y región."""
+    datos = proveedores.reporte()
+    contexto = {
+        'titulo_reporte': 'Proveedores de Internet',
+        'tramos': datos['tramos'],
+        'proveedores': datos['proveedores'],
+        'total': datos['total'],
+    }
+    return render(request, 'gestor/reporte_proveedores.html', contexto)
+
+
+def api_reporte_proveedores(request):
+    """El reporte de proveedores en JSON."""
+    return JsonResponse(proveedores.reporte())
+
+
+def exportar_proveedores_excel(request):
+    """El reporte de proveedores como .xlsx (resumen, tramos de velocidad y regiones)."""
+    response = HttpResponse(
+        proveedores.excel(proveedores.reporte()),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = 'attachment; filename="reporte_proveedores.xlsx"'
+    return response
+
 ######
 
 
+@cache_por_revision
 def dashboard(request):
-    # --- 1. CÁLCULOS GLOBALES ---
-    total_escuelas = Escuela.objects.count()
-    con_internet = Escuela.objects.filter(tiene_internet=True).count()
-    sin_internet = total_escuelas - con_internet
-    con_piso = Escuela.objects.filter(tiene_piso_tecnologico=True).count()
-    sin_piso = total_escuelas - con_piso
-    
-    # Cálculo del porcentaje global
-    if total_escuelas > 0:
-        tasa_cobertura = (float(con_internet) / total_escuelas) * 100
-        # Formatea a dos decimales
-        porcentaje_conectividad = "{:.2f}".format(tasa_cobertura) 
-    else:
-        porcentaje_conectividad = "0.00"
-        
-    # --------------------------------------------------------------------------
-    # --- 2. CÁLCULOS: CONECTIVIDAD POR PROGRAMA (PBA / PNCE) ---
-    # --------------------------------------------------------------------------
-    
-    # 2.1. Conectadas por PNCE (SOLO 'PNCE')
-    # Buscamos escuelas con internet cuyo estado de conectividad es EXACTAMENTE 'PNCE'
-    conectadas_pnce = Escuela.objects.filter(
-        tiene_internet=True,
-        servicioconectividad__estado_conectividad__nombre__iexact='PNCE' 
-    ).count()
-
-    # 2.2. Conectadas por PBA (INCLUYENDO 'PBA - PNCE')
-    # Creamos las dos condiciones Q:
-    filtro_pba_solo = Q(servicioconectividad__estado_conectividad__nombre__iexact='PBA')
-    filtro_pnce_pba = Q(servicioconectividad__estado_conectividad__nombre__iexact='PNCE - PBA')
-    
-    # Combinamos la condición de 'tiene_internet=True' con el OR (|) de los estados
-    conectadas_pba = Escuela.objects.filter(
-        Q(tiene_internet=True) & (filtro_pba_solo | filtro_pnce_pba)
-    ).count()
-    
+    # --- 1. CÁLCULOS GLOBALES Y POR PROGRAMA (cacheados por revisión) ---
+    totales = cobertura.dashboard()
+
     # --------------------------------------------------------------------------
-    # --- 3. CÁLCULO PARA LA GRÁFICA DE CATEGORÍAS ---
+    # --- 2. CÁLCULO PARA LA GRÁFICA DE CATEGORÍAS ---
     # --------------------------------------------------------------------------
-    
-    # Usamos la lógica eficiente de filter() + annotate(Count()) para la gráfica
-    conectadas_por_categoria_queryset = Categoria.objects.filter(
-        escuela__tiene_internet=True
-    ).annotate(
-        total_conectadas=Count('escuela')
-    ).values('nombre', 'total_conectadas')
-
-    # Convertimos el QuerySet a una lista de diccionarios
-    conectadas_por_categoria = list(conectadas_por_categoria_queryset)
+    conectadas_por_categoria = cobertura.conectadas_por_categoria()
     
     # --------------------------------------------------------------------------
-    # --- 4. CONTEXTO ---
+    # --- 3. CONTEXTO ---
     # --------------------------------------------------------------------------
     contexto = {
-        'total_escuelas': total_escuelas,
-        'con_internet': con_internet,
-        'sin_internet': sin_internet,
-        'con_piso': con_piso,
-        'sin_piso': sin_piso,
+        'total_escuelas': totales['total_escuelas'],
+        'con_internet': totales['con_internet'],
+        'sin_internet': totales['sin_internet'],
+        'con_piso': totales['con_piso'],
+        'sin_piso': totales['sin_piso'],
         
         # Variable usada en el bloque de porcentaje de la plantilla
-        'porcentaje_conectividad': porcentaje_conectividad, 
+        'porcentaje_conectividad': "{:.2f}".format(totales['porcentaje_internet']),
+
+        # Cobertura ponderada por matrícula (alumnos, no escuelas)
+        'matricula_total': totales['matricula_total'],
+        'matricula_con_internet': totales['matricula_con_internet'],
+        'matricula_sin_internet': totales['matricula_sin_internet'],
+        'porcentaje_matricula_conectividad': "{:.2f}".format(totales['porcentaje_matricula_internet']),
         
         # Nuevas variables de los programas
-        'conectadas_pba': conectadas_pba,
-        'conectadas_pnce': conectadas_pnce,
+        'conectadas_pba': totales['conectadas_pba'],
+        'conectadas_pnce': totales['conectadas_pnce'],
         
         # Variable que alimenta la gráfica (¡ahora definida!)
         'conectadas_por_categoria': conectadas_por_categoria, 
@@ -782,36 +1007,26 @@ def dashboard(request):
     return render(request, 'gestor/dashboard.html', contexto)
 
 
+@cache_por_revision
 def dashboard_data(request):
     """Devuelve datos en JSON para gráficos del dashboard."""
-    total_escuelas = Escuela.objects.count()
-    con_internet = Escuela.objects.filter(tiene_internet=True).count()
-    sin_internet = total_escuelas - con_internet
-    con_piso = Escuela.objects.filter(tiene_piso_tecnologico=True).count()
-    sin_piso = total_escuelas - con_piso
-    
-    # 1. CÁLCULO DE LA TASA DE COBERTURA (Global)
-    if total_escuelas > 0:
-        tasa_cobertura = (float(con_internet) / total_escuelas) * 100
-        porcentaje_conectividad = "{:.2f}".format(tasa_cobertura)
-    else:
-        porcentaje_conectividad = "0.00"
+    # 1. TOTALES Y TASAS DE COBERTURA (los mismos que el dashboard, cacheados por revisión)
+    totales = cobertura.dashboard()
 
     # 2. ESCUELAS CONECTADAS POR CATEGORÍA (Para la gráfica de barras)
-    # Usamos el filtro 'escuela__tiene_internet=True' y contamos
-    conectadas_por_categoria_json = Categoria.objects.filter(
-        escuela__tiene_internet=True
-    ).annotate(
-        total_conectadas=Count('escuela')
-    ).values('nombre', 'total_conectadas')
+    conectadas_por_categoria_json = cobertura.conectadas_por_categoria()
     
     data = {
-        'total_escuelas': total_escuelas,
-        'con_internet': con_internet,
-        'sin_internet': sin_internet,
-        'con_piso': con_piso,
-        'sin_piso': sin_piso,
-        'porcentaje_conectividad': porcentaje_conectividad, # Incluimos la tasa en el JSON
+        'total_escuelas': totales['total_escuelas'],
+        'con_internet': totales['con_internet'],
+        'sin_internet': totales['sin_internet'],
+        'con_piso': totales['con_piso'],
+        'sin_piso': totales['sin_piso'],
+        'porcentaje_conectividad': "{:.2f}".format(totales['porcentaje_internet']), # Incluimos la tasa en el JSON
+        'matricula_total': totales['matricula_total'],
+        'matricula_con_internet': totales['matricula_con_internet'],
+        'matricula_con_piso': totales['matricula_con_piso'],
+        'porcentaje_matricula_conectividad': "{:.2f}".format(totales['porcentaje_matricula_internet']),
         
         # Enviamos la data de las escuelas CONECTADAS por categoría
         'conectadas_por_categoria': list(conectadas_por_categoria_json), 
@@ -821,148 +1036,117 @@ def dashboard_data(request):
 
 
 # Genera el  excel  para detalles completo  escuela 
+MAX_ESCUELAS_EXCEL_LOTE = 500
+
+
+def _escuelas_para_excel():
+    """Escuelas con catálogos (select_related) y servicios/pisos precargados."""
+    return Escuela.objects.select_related(
+        'region', 'distrito', 'ciudad', 'predio', 'ambito', 'dependencia',
+        'turno', 'categoria', 'tipo_establecimiento'
+    ).prefetch_related(
+        Prefetch(
+            'servicioconectividad_set',
+            queryset=ServicioConectividad.objects.select_related(
+                'proveedor', 'estado_conectividad', 'metodo_solicitud'
+            ).order_by('id'),
+        ),
+        Prefetch(
+            'pisotecnologico_set',
+            queryset=PisoTecnologico.objects.select_related(
+                'proveedor', 'plan_piso', 'tipo_piso_instalado'
+            ).order_by('id'),
+        ),
+    )
+
+
+def _datos_excel_escuela(escuela):
+    """Pasa la escuela a tipos simples para excel_escuela.renderizar."""
+    def nombre(obj):
+        return obj.nombre if obj else 'Sin datos'
+
+    return {
+        'general': {
+            'nombre': escuela.nombre,
+            'cue': escuela.cue,
+            'clave_provincial': escuela.clave_provincial,
+            'direccion': escuela.direccion,
+            'matricula': escuela.matricula,
+            'dependencia': nombre(escuela.dependencia),
+            'ambito': nombre(escuela.ambito),
+            'turno': nombre(escuela.turno),
+            'categoria': nombre(escuela.categoria),
+            'tipo_establecimiento': nombre(escuela.tipo_establecimiento),
+            'region': nombre(escuela.region),
+            'distrito': nombre(escuela.distrito),
+            'ciudad': nombre(escuela.ciudad),
+            'predio': escuela.predio.numero_predio if escuela.predio else 'Sin datos',
+            'latitud': escuela.latitud,
+            'longitud': escuela.longitud,
+            'tiene_internet': 'Sí' if escuela.tiene_internet else 'No',
+            'tiene_piso_tecnologico': 'Sí' if escuela.tiene_piso_tecnologico else 'No',
+        },
+        'servicios': [
+            [
+                nombre(servicio.proveedor),
+                nombre(servicio.estado_conectividad),
+                servicio.velocidad_mbps,
+                nombre(servicio.metodo_solicitud),
+                servicio.fecha_instalacion,
+                servicio.fecha_mejora,
+                servicio.observaciones,
+            ]
+            for servicio in escuela.servicioconectividad_set.all()
+        ],
+        'pisos': [
+            [
+                nombre(piso.proveedor),
+                nombre(piso.tipo_piso_instalado),
+                nombre(piso.plan_piso),
+                piso.tipo_mejora,
+                piso.fecha_terminado,
+                piso.fecha_mejora,
+                piso.observaciones,
+            ]
+            for piso in escuela.pisotecnologico_set.all()
+        ],
+    }
+
+
 def generar_excel_escuela(request, cue):
     """Genera un archivo Excel detallado para una escuela específica."""
-    escuela = get_object_or_404(Escuela, cue=cue)
-    servicios = ServicioConectividad.objects.filter(escuela=escuela)
-    pisos_tecnologicos = PisoTecnologico.objects.filter(escuela=escuela)
+    escuela = get_object_or_404(_escuelas_para_excel(), cue=cue)
 
     response = HttpResponse(
+        excel_escuela.renderizar(_datos_excel_escuela(escuela)),
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
     response['Content-Disposition'] = f'attachment; filename="escuela_{escuela.cue}.xlsx"'
-    
-    workbook = openpyxl.Workbook()
-    hoja = workbook.active
-    hoja.title = "Reporte de Escuela"
-
-    fuente_negrita = Font(bold=True)
-    relleno_cabecera = PatternFill(start_color="D6EAF8", end_color="D6EAF8", fill_type="solid")
-    borde_fino = Border(left=Side(style='thin'), 
-                        right=Side(style='thin'), 
-                        top=Side(style='thin'), 
-                        bottom=Side(style='thin'))
-
-    row_num = 1
-
-    # Bloque de Información General
-    hoja.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=2)
-    hoja[f'A{row_num}'] = "INFORMACIÓN GENERAL"
-    hoja[f'A{row_num}'].font = fuente_negrita
-    hoja[f'A{row_num}'].fill = relleno_cabecera
-    hoja[f'A{row_num}'].alignment = Alignment(horizontal='center')
-    row_num += 1
-
-    datos_escuela = [
-        ("Nombre", escuela.nombre),
-        ("CUE", escuela.cue),
-        ("Clave Provincial", escuela.clave_provincial),
-        ("Dirección", escuela.direccion),
-        ("Matrícula", escuela.matricula),
-        ("Dependencia", escuela.dependencia.nombre if escuela.dependencia else 'Sin datos'),
-        ("Ámbito", escuela.ambito.nombre if escuela.ambito else 'Sin datos'),
-        ("Turno", escuela.turno.nombre if escuela.turno else 'Sin datos'),
-        ("Categoría", escuela.categoria.nombre if escuela.categoria else 'Sin datos'),
-        ("Tipo de Establecimiento", escuela.tipo_establecimiento.nombre if escuela.tipo_establecimiento else 'Sin datos'),
-        ("Región", escuela.region.nombre if escuela.region else 'Sin datos'),
-        ("Distrito", escuela.distrito.nombre if escuela.distrito else 'Sin datos'),
-        ("Ciudad", escuela.ciudad.nombre if escuela.ciudad else 'Sin datos'),
-        ("Predio", escuela.predio.numero_predio if escuela.predio else 'Sin datos'),
-        ("Coordenadas", escuela.coordenadas),
-        ("Latitud", escuela.latitud),
-        ("Longitud", escuela.longitud),
-        ("Tiene Internet", 'Sí' if escuela.tiene_internet else 'No'),
-        ("Tiene Piso Tecnológico", 'Sí' if escuela.tiene_piso_tecnologico else 'No'),
-    ]
-    
-    for campo, valor in datos_escuela:
-        hoja[f'A{row_num}'] = campo
-        hoja[f'B{row_num}'] = valor
-        hoja[f'A{row_num}'].font = fuente_negrita
-        row_num += 1
-    
-    row_num += 2
-
-    # Bloque de Conectividad
-    hoja.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=7)
-    hoja[f'A{row_num}'] = "DETALLES DE CONECTIVIDAD"
-    hoja[f'A{row_num}'].font = fuente_negrita
-    hoja[f'A{row_num}'].fill = relleno_cabecera
-    hoja[f'A{row_num}'].alignment = Alignment(horizontal='center')
-    row_num += 1
-
-    headers_conectividad = ["Proveedor", "Estado", "Velocidad (Mbps)", "Método de Solicitud",  "Fecha de Instalación", "Fecha de Mejora", "Observaciones"]
-    for col_num, header in enumerate(headers_conectividad, 1):
-        cell = hoja.cell(row=row_num, column=col_num)
-        cell.value = header
-        cell.font = fuente_negrita
-        cell.border = borde_fino
-        cell.fill = relleno_cabecera
-    row_num += 1
-
-    if servicios.exists():
-        for servicio in servicios:
-            hoja.cell(row=row_num, column=1, value=servicio.proveedor.nombre if servicio.proveedor else 'Sin datos')
-            hoja.cell(row=row_num, column=2, value=servicio.estado_conectividad.nombre if servicio.estado_conectividad else 'Sin datos')
-            hoja.cell(row=row_num, column=3, value=servicio.velocidad_mbps)
-            hoja.cell(row=row_num, column=4, value=servicio.metodo_solicitud.nombre if servicio.metodo_solicitud else 'Sin datos')
-            hoja.cell(row=row_num, column=5, value=servicio.fecha_instalacion)
-            hoja.cell(row=row_num, column=6, value=servicio.fecha_mejora)
-            hoja.cell(row=row_num, column=7, value=servicio.observaciones)
-            for col in range(1, 8):
-                hoja.cell(row=row_num, column=col).border = borde_fino
-            row_num += 1
-    else:
-        hoja.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=7)
-        hoja[f'A{row_num}'] = "No hay datos de conectividad."
-        hoja[f'A{row_num}'].alignment = Alignment(horizontal='center')
-        hoja[f'A{row_num}'].font = Font(italic=True)
-        row_num += 1
-    
-    row_num += 2
-
-    # Bloque de Piso Tecnológico
-    hoja.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=7)
-    hoja[f'A{row_num}'] = "DETALLES DE PISO TECNOLÓGICO"
-    hoja[f'A{row_num}'].font = fuente_negrita
-    hoja[f'A{row_num}'].fill = relleno_cabecera
-    hoja[f'A{row_num}'].alignment = Alignment(horizontal='center')
-    row_num += 1
-
-    headers_piso = ["Proveedor", "Tipo de Piso", "Plan de Piso", "Tipo de Mejora", "Fecha de Finalización", "Fecha de Mejora", "Observaciones"]
-    for col_num, header in enumerate(headers_piso, 1):
-        cell = hoja.cell(row=row_num, column=col_num)
-        cell.value = header
-        cell.font = fuente_negrita
-        cell.border = borde_fino
-        cell.fill = relleno_cabecera
-    row_num += 1
-    
-    if pisos_tecnologicos.exists():
-        for piso in pisos_tecnologicos:
-            hoja.cell(row=row_num, column=1, value=piso.proveedor.nombre if piso.proveedor else 'Sin datos')
-            hoja.cell(row=row_num, column=2, value=piso.tipo_piso_instalado.nombre if piso.tipo_piso_instalado else 'Sin datos')
-            hoja.cell(row=row_num, column=3, value=piso.plan_piso.nombre if piso.plan_piso else 'Sin datos')
-            hoja.cell(row=row_num, column=4, value=piso.tipo_mejora)
-            hoja.cell(row=row_num, column=5, value=piso.fecha_terminado)
-            hoja.cell(row=row_num, column=6, value=piso.fecha_mejora)
-            hoja.cell(row=row_num, column=7, value=piso.observaciones)
-            for col in range(1, 8):
-                hoja.cell(row=row_num, column=col).border = borde_fino
-            row_num += 1
-    else:
-        hoja.merge_cells(start_row=row_num, start_column=1, end_row=row_num, end_column=7)
-        hoja[f'A{row_num}'] = "No hay datos de piso tecnológico."
-        hoja[f'A{row_num}'].alignment = Alignment(horizontal='center')
-        hoja[f'A{row_num}'].font = Font(italic=True)
-        row_num += 1
-    
-    # Ajustar ancho de columnas
-    for col in range(1, hoja.max_column + 1):
-        column_letter = get_column_letter(col)
-        hoja.column_dimensions[column_letter].width = 25
-    
-    workbook.save(response)
+    return response
+
+
+def generar_excel_escuelas(request):
+    """
+    Modo lote: devuelve un ZIP con un Excel por escuela.
+    Los CUE llegan como ?cue=...&cue=... o separados por coma en ?cues=...
+    """
+    cues = request.GET.getlist('cue')
+    cues += [cue for cue in request.GET.get('cues', '').split(',')]
+    cues = list(dict.fromkeys(cue.strip() for cue in cues if cue.strip()))
+
+    if not cues:
+        return JsonResponse({'error': 'Debe indicar al menos un CUE'}, status=400)
+    if len(cues) > MAX_ESCUELAS_EXCEL_LOTE:
+        return JsonResponse({'error': f'Máximo {MAX_ESCUELAS_EXCEL_LOTE} escuelas por lote'}, status=400)
+
+    escuelas = _escuelas_para_excel().filter(cue__in=cues).order_by('cue')
+    lista_datos = [_datos_excel_escuela(escuela) for escuela in escuelas]
+    if not lista_datos:
+        return JsonResponse({'error': 'No se encontraron escuelas para los CUE indicados'}, status=404)
+
+    response = HttpResponse(excel_escuela.generar_zip(lista_datos), content_type='application/zip')
+    filename = "escuelas_{}.zip".format(datetime.now().strftime('%Y%m%d_%H%M'))
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 # =========================================================================
 # --- Genera el  reporte de filtro avanzado  en excel   ---
@@ -1000,7 +1184,7 @@ def exportar_resultados_excel(request):
                          bottom=Side(style='thin'))
     
     # 3. Encabezados (Deben coincidir con los de tu tabla)
-    headers = ['CUE', 'Nombre', 'Región', 'Distrito', 'Predio', 'Tiene Internet', 'Piso Tecnológico']
+    headers = ['CUE', 'Nombre', 'Región', 'Distrito', 'Predio', 'Matrícula', 'Tiene Internet', 'Piso Tecnológico']
     ws.append(headers)
 
     # Aplicar estilos a la cabecera
@@ -1010,21 +1194,32 @@ def exportar_resultados_excel(request):
         cell.border = thin_border
         cell.alignment = Alignment(horizontal='center', vertical='center')
 
-    # 4. Llenar filas con datos
-    for escuela in queryset:
+    # 4. Llenar filas con datos (los catálogos vienen en la misma consulta)
+    for escuela in queryset.select_related('region', 'distrito', 'predio'):
         row = [
             escuela.cue,
             escuela.nombre,
             escuela.region.nombre if escuela.region else 'N/A',
             escuela.distrito.nombre if escuela.distrito else 'N/A',
             escuela.predio.numero_predio if escuela.predio else 'N/A',
+            escuela.matricula,
             'SÍ' if escuela.tiene_internet else 'NO',
             'SÍ' if escuela.tiene_piso_tecnologico else 'NO',
         ]
         ws.append(row)
-    
+
+    # Cobertura ponderada por matrícula de los resultados, sumada en la base
+    totales = cobertura.totales(queryset, decimales=2)
+    ws.append([])
+    ws.append([
+        'TOTAL', '', '', '', '', totales['matricula_total'],
+        f"{totales['porcentaje_matricula_internet']} % de la matrícula", '',
+    ])
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+
     # 5. Ajustar ancho de columnas (Opcional, mejora visual)
-    column_widths = [15, 60, 20, 20, 15, 15, 20] # Ejemplo de anchos
+    column_widths = [15, 60, 20, 20, 15, 12, 22, 20] # Ejemplo de anchos
     for i, width in enumerate(column_widths, 1):
         ws.column_dimensions[chr(64 + i)].width = width
 
@@ -1059,27 +1254,26 @@ from .models import Escuela
 from django.db.models import Count, Q
 from .models import Escuela, Categoria # Importa tus modelos
 
+@cache_por_revision
 def reportes_generales(request):
     """
     Genera el Reporte General de Cobertura, permitiendo filtrar los datos
     por Región y/o Distrito.
     """
 
-    # --- 1. CAPTURA Y APLICACIÓN DE FILTROS AL QUERYSET BASE ---
+    # --- 1. CAPTURA DE FILTROS Y TÍTULO ---
 
     # Captura los IDs de filtro enviados por el formulario GET
     filtro_region_id = request.GET.get('region')
     filtro_distrito_id = request.GET.get('distrito')
     
-    # Inicializa el QuerySet principal con todas las escuelas
-    escuelas_queryset = Escuela.objects.all()
+    arbol = arbol_geografico()
     
     # Define el título inicial
     titulo_pagina = 'Reportes Generales de Cobertura'
     
     # Aplica el filtro por Región
     if filtro_region_id:
-        escuelas_queryset = escuelas_queryset.filter(region_id=filtro_region_id)
         try:
             region_nombre = Region.objects.get(id=filtro_region_id).nombre 
             titulo_pagina = f"Reporte por Región: {region_nombre}"
@@ -1088,7 +1282,6 @@ def reportes_generales(request):
     
     # Aplica el filtro por Distrito (se aplica después de Región si ambos están presentes)
     if filtro_distrito_id:
-        escuelas_queryset = escuelas_queryset.filter(distrito_id=filtro_distrito_id)
         try:
             distrito_nombre = Distrito.objects.get(id=filtro_distrito_id).nombre
             titulo_pagina = f"Reporte por Distrito: {distrito_nombre}"
@@ -1096,99 +1289,33 @@ def reportes_generales(request):
             pass # Si el ID no existe, usamos el título por defecto
     
     # -------------------------------------------------------------------------
-    # 2. CÁLCULO DE TOTALES GLOBALES CON EL FILTRO APLICADO
-    # -------------------------------------------------------------------------
-    
-    # Usamos el QuerySet filtrado (escuelas_queryset)
-    total_escuelas = escuelas_queryset.count()
-    
-    # Conectividad (Internet)
-    con_internet = escuelas_queryset.filter(tiene_internet=True).count()
-    sin_internet = total_escuelas - con_internet
-    
-    # Equipamiento (Piso Tecnológico)
-    con_piso = escuelas_queryset.filter(tiene_piso_tecnologico=True).count()
-    sin_piso = total_escuelas - con_piso
-
-    # -------------------------------------------------------------------------
-    # 3. REPORTE DE CONECTIVIDAD (INTERNET) - DETALLE POR CATEGORÍA
-    # -------------------------------------------------------------------------
-    
-    # Para el reporte por categoría, filtramos las Categorías por las escuelas
-    # que pertenecen al QuerySet filtrado (escuelas_queryset).
-    
-    # NOTA: Para que esto funcione, necesitamos que la relación entre Categoria y Escuela
-    # sea ManyToOne (Categoria tiene un set de 'escuela_set'). Si la relación es indirecta, 
-    # se podría necesitar una consulta más compleja, pero esta estructura es la estándar.
-
-    categoria_counts = []
-    
-    # Iteramos sobre TODAS las categorías disponibles
-    for categoria in Categoria.objects.all().order_by('nombre'):
-        # Filtramos nuestro QuerySet principal por la Categoría actual
-        escuelas_en_categoria_y_filtro = escuelas_queryset.filter(categoria=categoria)
-        
-        total_cat = escuelas_en_categoria_y_filtro.count()
-        
-        # Solo procesamos si hay escuelas en esta categoría Y que cumplen el filtro
-        if total_cat > 0:
-            con_internet_cat = escuelas_en_categoria_y_filtro.filter(tiene_internet=True).count()
-            porcentaje_cobertura = (float(con_internet_cat) / total_cat) * 100 
-            
-            categoria_counts.append({
-                'nombre': categoria.nombre,
-                'total_escuelas': total_cat,
-                'con_internet': con_internet_cat, 
-                'porcentaje_cobertura': round(porcentaje_cobertura, 1) 
-            })
-
-    # -------------------------------------------------------------------------
-    # 4. REPORTE DE PISO TECNOLÓGICO - DETALLE POR CATEGORÍA
+    # 2. TOTALES Y DETALLE POR CATEGORÍA CON EL FILTRO APLICADO
     # -------------------------------------------------------------------------
     
-    categoria_piso_counts = []
-
-    # Iteramos sobre TODAS las categorías disponibles
-    for categoria in Categoria.objects.all().order_by('nombre'):
-        # Filtramos nuestro QuerySet principal por la Categoría actual
-        escuelas_en_categoria_y_filtro = escuelas_queryset.filter(categoria=categoria)
-        
-        total_cat = escuelas_en_categoria_y_filtro.count()
-        
-        # Solo procesamos si hay escuelas en esta categoría Y que cumplen el filtro
-        if total_cat > 0:
-            con_piso_cat = escuelas_en_categoria_y_filtro.filter(tiene_piso_tecnologico=True).count()
-            porcentaje_cobertura_piso = (float(con_piso_cat) / total_cat) * 100 
-            
-            categoria_piso_counts.append({
-                'nombre': categoria.nombre,
-                'total_escuelas': total_cat,
-                'con_piso': con_piso_cat,
-                'porcentaje_cobertura_piso': round(porcentaje_cobertura_piso, 1)
-            })
+    # Escuelas y matrícula con/sin Internet y piso en una sola agregación, y
+    # un GROUP BY por categoría del que salen las dos tablas (Internet y Piso).
+    # Solo aparecen categorías con escuelas que cumplen el filtro. Todo queda
+    # cacheado por revisión y filtros (ver cobertura.reporte_general).
+    totales, categoria_counts = cobertura.reporte_general(filtro_region_id, filtro_distrito_id)
 
     # -------------------------------------------------------------------------
-    # 5. DEFINICIÓN DEL CONTEXTO FINAL
+    # 3. DEFINICIÓN DEL CONTEXTO FINAL
     # -------------------------------------------------------------------------
     contexto = {
         # Para el formulario de filtro (listas desplegables y mantener la selección)
-        'regiones': Region.objects.all().order_by('nombre'),
-        'distritos': Distrito.objects.all().order_by('nombre'),
+        'regiones': arbol['regiones'],
+        'distritos': arbol['distritos'],
+        'version_jerarquia': arbol['version'],
         'filtro_region_id': filtro_region_id,
         'filtro_distrito_id': filtro_distrito_id,
         
         'titulo_pagina': titulo_pagina,
         
-        # Totales Globales (ahora filtrados)
-        'total_escuelas': total_escuelas, 
-        'con_internet': con_internet,
-        'sin_internet': sin_internet,
-        'con_piso': con_piso,
-        'sin_piso': sin_piso,
+        # Totales Globales (ahora filtrados): escuelas y matrícula
+        **totales,
         
         # Reportes por Categoría (ahora filtrados)
         'categoria_counts': categoria_counts,
-        'categoria_piso_counts': categoria_piso_counts, 
     }
     
     return render(request, 'gestor/reportes_generales.html', contexto)
@@ -1240,33 +1367,28 @@ def exportar_reporte_excel(request):
     hoja_internet = workbook.active
     hoja_internet.title = "Internet por Categoria"
     
+    # Una sola consulta agrupada alimenta las dos hojas
+    categorias = cobertura.por_categoria(escuelas_queryset)
+
     # Encabezados de la tabla
     columnas_internet = [
         "Categoría", "Total Escuelas", "Escuelas con Internet", 
-        "Escuelas sin Internet", "Cobertura Internet (%)"
+        "Escuelas sin Internet", "Cobertura Internet (%)",
+        "Matrícula", "Matrícula con Internet", "Cobertura Internet por Matrícula (%)"
     ]
     hoja_internet.append(columnas_internet)
     
-    # Llenado de datos (usando la misma lógica de cálculo)
-    categorias = Categoria.objects.all().order_by('nombre')
-    
     for categoria in categorias:
-        escuelas_cat = escuelas_queryset.filter(categoria=categoria)
-        total_cat = escuelas_cat.count()
-        
-        if total_cat > 0:
-            conectadas_cat = escuelas_cat.filter(tiene_internet=True).count()
-            sin_internet_cat = total_cat - conectadas_cat
-            porcentaje_cobertura = round((conectadas_cat / total_cat) * 100, 1)
-            
-            # Añadir fila a la hoja
-            hoja_internet.append([
-                categoria.nombre, 
-                total_cat, 
-                conectadas_cat, 
-                sin_internet_cat,
-                porcentaje_cobertura
-            ])
+        hoja_internet.append([
+            categoria['nombre'], 
+            categoria['total_escuelas'], 
+            categoria['con_internet'], 
+            categoria['sin_internet'],
+            categoria['porcentaje_internet'],
+            categoria['matricula_total'],
+            categoria['matricula_con_internet'],
+            categoria['porcentaje_matricula_internet'],
+        ])
 
 
     # 4. HOJA 2: REPORTE DE PISO TECNOLÓGICO
@@ -1276,28 +1398,22 @@ def exportar_reporte_excel(request):
     # Encabezados de la tabla
     columnas_piso = [
         "Categoría", "Total Escuelas", "Escuelas con Piso Tecnológico", 
-        "Escuelas sin Piso Tecnológico", "Cobertura Piso Tecnológico (%)"
+        "Escuelas sin Piso Tecnológico", "Cobertura Piso Tecnológico (%)",
+        "Matrícula", "Matrícula con Piso Tecnológico", "Cobertura Piso por Matrícula (%)"
     ]
     hoja_piso.append(columnas_piso)
 
-    # Llenado de datos (usando la misma lógica de cálculo)
-    for categoria in categorias: # Reutilizamos la lista de categorías
-        escuelas_cat = escuelas_queryset.filter(categoria=categoria)
-        total_cat = escuelas_cat.count()
-        
-        if total_cat > 0:
-            con_piso_cat = escuelas_cat.filter(tiene_piso_tecnologico=True).count()
-            sin_piso_cat = total_cat - con_piso_cat
-            porcentaje_cobertura_piso = round((con_piso_cat / total_cat) * 100, 1)
-            
-            # Añadir fila a la hoja
-            hoja_piso.append([
-                categoria.nombre, 
-                total_cat, 
-                con_piso_cat, 
-                sin_piso_cat,
-                porcentaje_cobertura_piso
-            ])
+    for categoria in categorias:
+        hoja_piso.append([
+            categoria['nombre'], 
+            categoria['total_escuelas'], 
+            categoria['con_piso'], 
+            categoria['sin_piso'],
+            categoria['porcentaje_piso'],
+            categoria['matricula_total'],
+            categoria['matricula_con_piso'],
+            categoria['porcentaje_matricula_piso'],
+        ])
             
 
     # 5. GUARDAR Y DEVOLVER
@@ -1314,151 +1430,124 @@ def exportar_reporte_excel(request):
     
 ### Para filtrar en mapa 
 def mapa_escuelas_colores(request):
-    regiones = Region.objects.all().order_by('nombre')
-    distritos = Distrito.objects.all().order_by('nombre')
+    arbol = arbol_geografico()
     estados = EstadoConectividad.objects.all().order_by('nombre')
     predios = Predio.objects.all().order_by('numero_predio')   # <-- agregado
     context = {
-        'regiones': regiones,
-        'distritos': distritos,
+        'regiones': arbol['regiones'],
+        'distritos': arbol['distritos'],
+        'version_jerarquia': arbol['version'],
+        'zoom_max_teselas': teselas.ZOOM_MAX_TESELAS,
         'estados_conectividad': estados,
         'predios': predios,   # <-- agregado
     }
     return render(request, 'gestor/mapa_escuelas_colores.html', context)
 
 
+def tesela_escuelas(request, z, x, y):
+    """
+    Tesela PNG con un punto por escuela para la vista general del mapa
+    (ver gestor/teselas.py). Sale de la caché en disco salvo que haya cambiado
+    alguna escuela dentro de ella.
+    """
+    if not teselas.valida(z, x, y):
+        raise Http404("Tesela fuera de rango")
+    respuesta = HttpResponse(teselas.tesela(z, x, y), content_type='image/png')
+    # Vida corta en el navegador: la invalidación por tesela ocurre en el servidor
+    respuesta['Cache-Control'] = 'public, max-age=300'
+    return respuesta
+
+
 def mapa_escuelas_con_internet(request):
-    """Prepara datos para mostrar un mapa de solo las escuelas con Internet."""
-    escuelas = Escuela.objects.filter(tiene_internet=True)
-    
-    escuelas_data = []
-    for escuela in escuelas:
-        if escuela.latitud and escuela.longitud:
-            escuelas_data.append({
-                'nombre': escuela.nombre,
-                'latitud': float(escuela.latitud),
-                'longitud': float(escuela.longitud),
-                'cue': escuela.cue,
-                'region_nombre': escuela.region.nombre if escuela.region else 'Sin datos'
-            })
-            
+    """
+    Mapa de las escuelas con Internet. La página solo trae el primer pintado
+    (vista de la provincia, agrupado y cacheado); el resto se pide a
+    api_escuelas_bounds a medida que se mueve el mapa.
+    """
     context = {
-        'escuelas_data': escuelas_data
+        'vista_inicial': mapa.VISTA_INICIAL,
+        'datos_iniciales': mapa.vista_inicial_internet(),
     }
     
     return render(request, 'gestor/mapa_internet.html', context)
 
-#Distritos 
+# =========================================================================
+# --- API JSON (vistas asíncronas) ---
+# Bajo ASGI no ocupan un hilo por pedido mientras esperan a la base: usan el
+# ORM asíncrono (acount, aget, async for). Lo que sigue siendo síncrono
+# (caché de catálogos, índice espacial) pasa por sync_to_async.
+# =========================================================================
 
-def ajax_cargar_distritos(request):
+async def ajax_cargar_distritos(request):
     """
     Vista AJAX para cargar distritos basados en la selección de Regiones.
+    Filtra sobre el árbol geográfico cacheado, sin consultar la base.
     """
     region_ids_str = request.GET.getlist('region_ids')
     
     try:
         # Filtra solo IDs que sean números y no estén vacíos
-        region_ids = [int(id) for id in region_ids_str if id] 
+        region_ids = {int(id) for id in region_ids_str if id}
     except ValueError:
         return JsonResponse({'opciones': {}}, status=200)
 
-    distritos_queryset = []
+    opciones = {}
     if region_ids:
-        # Asumiendo que 'Distrito' tiene un campo de relación llamado 'region'
-        distritos_queryset = Distrito.objects.filter(region__id__in=region_ids).order_by('nombre')
+        arbol = await sync_to_async(arbol_geografico)()
+        opciones = {
+            distrito['id']: distrito['nombre']
+            for distrito in arbol['distritos']
+            if distrito['region_id'] in region_ids
+        }
 
-    opciones = {distrito.id: distrito.nombre for distrito in distritos_queryset}
-    
     return JsonResponse({'opciones': opciones})
 
-# Api par a que el mapa se vea  con los datos por sectores 
-
-def api_escuelas_bounds(request):
-    try:
-        min_lat = float(request.GET.get('minLat'))
-        max_lat = float(request.GET.get('maxLat'))
-        min_lng = float(request.GET.get('minLng'))
-        max_lng = float(request.GET.get('maxLng'))
-    except (TypeError, ValueError):
-        return JsonResponse({'error': 'Parámetros de bounds inválidos'}, status=400)
-
-    qs = Escuela.objects.filter(
-        latitud__gte=min_lat,
-        latitud__lte=max_lat,
-        longitud__gte=min_lng,
-        longitud__lte=max_lng,
-    )
-
-    # -------------------------
-    # FILTROS OPCIONALES
-    # -------------------------
 
-    region_id = request.GET.get('region')
-    distrito_id = request.GET.get('distrito')
-    tiene_internet = request.GET.get('tiene_internet')
-    tiene_piso = request.GET.get('tiene_piso')
-    estado_id = request.GET.get('estado_conectividad')
-    cue = request.GET.get('cue')
-    predio = request.GET.get('predio')
-
-    if region_id:
-        qs = qs.filter(region__id=region_id)
-
-    if distrito_id:
-        qs = qs.filter(distrito__id=distrito_id)
-
-    if tiene_internet in ('1', '0'):
-        qs = qs.filter(tiene_internet=(tiene_internet == '1'))
-
-    if tiene_piso in ('1', '0'):
-        qs = qs.filter(tiene_piso_tecnologico=(tiene_piso == '1'))
+async def api_jerarquia(request):
+    """
+    Árbol Región -> Distrito -> Ciudad completo para filtrar en cascada en el
+    navegador. Las plantillas piden la URL con ?v=<version>, el hash del
+    contenido del árbol ('version' en catalogos.arbol_geografico), así que la
+    respuesta se puede cachear en el cliente: solo un cambio en el árbol
+    cambia la URL.
+    """
+    respuesta = JsonResponse(await sync_to_async(arbol_geografico)())
+    if request.GET.get('v'):
+        respuesta['Cache-Control'] = f'public, max-age={TTL_CACHE}'
+    return respuesta
 
-    if estado_id:
-        qs = qs.filter(servicioconectividad__estado_conectividad__id=estado_id).distinct()
+# Api par a que el mapa se vea  con los datos por sectores 
 
-    # -------------------------
-    #  ✅ FILTRO POR CUE
-    # -------------------------
-    if cue:
-        qs = qs.filter(cue__icontains=cue)
-
-    # -------------------------
-    # ✅ FILTRO POR PREDIO (FUNCIONANDO)
-    #    Usa el campo correcto: numero_predio
-    # -------------------------
-    if predio:
-        qs = qs.filter(predio__numero_predio__icontains=predio)
-
-    # -------------------------
-    # SERIALIZACIÓN
-    # -------------------------
-    resultados = []
-    for e in qs:
-        resultados.append({
-            'cue': e.cue,
-            'nombre': str(e.nombre),
-            'latitud': float(e.latitud) if e.latitud is not None else None,
-            'longitud': float(e.longitud) if e.longitud is not None else None,
-            'tiene_internet': bool(e.tiene_internet),
-            'tiene_piso_tecnologico': bool(e.tiene_piso_tecnologico),
-            'region_id': e.region.id if e.region else None,
-            'distrito_id': e.distrito.id if e.distrito else None,
-        })
+async def api_escuelas_bounds(request):
+    """
+    Escuelas dentro de la ventana visible del mapa.
 
-    return JsonResponse(resultados, safe=False)
+    Con el parámetro 'zoom' responde {'modo', 'total', 'items'} y agrupa en
+    celdas cuando hay demasiadas escuelas (ver gestor/mapa.py); sin él
+    devuelve la lista de escuelas como antes. Los pedidos simultáneos con
+    los mismos parámetros comparten una sola consulta.
+    """
+    try:
+        if request.GET.get('zoom'):
+            return JsonResponse(await mapa.aconsultar_compartido(request.GET))
+        return JsonResponse(await mapa.apuntos_compartido(request.GET), safe=False)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de bounds inválidos'}, status=400)
 
 
 
-def api_escuela(request, cue):
+async def api_escuela(request, cue):
     """
     Devuelve detalles serializables de una escuela para el popup.
     Evita devolver objetos ORM; siempre strings o None.
     """
-    escuela = get_object_or_404(Escuela, cue=cue)
-
-    # Obtenemos primer servicio (podés ajustar: último por fecha, etc.)
-    servicio = ServicioConectividad.objects.filter(escuela=escuela).first()
-    piso = PisoTecnologico.objects.filter(escuela=escuela).first()
+    # Servicio y piso vigentes en la misma consulta que la escuela (en una
+    # vista asíncrona, una relación sin select_related no se puede cargar)
+    escuela = await aget_object_or_404(
+        Escuela.objects.select_related('categoria', *RELACIONES_VIGENTES), cue=cue
+    )
+    servicio = escuela.servicio_vigente
+    piso = escuela.piso_vigente
 
     data = {
         'cue': escuela.cue,
@@ -1478,4 +1567,154 @@ def api_escuela(request, cue):
         'observaciones_piso': piso.observaciones if piso else None,
     }
 
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+# Búsquedas por cercanía sobre el índice espacial en memoria
+
+def _centro_proximidad(params, indice):
+    """
+    Punto de partida de la búsqueda: lat/lng, una escuela (?cue=, que se
+    excluye de los resultados) o un predio (?predio=, centroide de sus
+    escuelas). Devuelve (lat, lng, excluir) o lanza ValueError.
+    """
+    if params.get('cue'):
+        posicion = indice.por_cue.get(params['cue'])
+        if posicion is None:
+            raise ValueError('La escuela no existe o no tiene coordenadas')
+        escuela = indice.escuelas[posicion]
+        return escuela['latitud'], escuela['longitud'], posicion
+    if params.get('predio'):
+        if not params['predio'].isdigit():
+            raise ValueError('Número de predio inválido')
+        centro = indice.centro_predio(int(params['predio']))
+        if centro is None:
+            raise ValueError('El predio no existe o no tiene escuelas con coordenadas')
+        return centro[0], centro[1], None
+    try:
+        lat, lng = float(params.get('lat')), float(params.get('lng'))
+    except (TypeError, ValueError):
+        raise ValueError('Indicar lat y lng, cue o predio')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordenadas fuera de rango')
+    return lat, lng, None
+
+
+def _respuesta_proximidad(lat, lng, encontrados):
+    return JsonResponse({
+        'centro': {'latitud': lat, 'longitud': lng},
+        'total': len(encontrados),
+        'resultados': [{
+            'cue': escuela['cue'],
+            'nombre': escuela['nombre'],
+            'latitud': escuela['latitud'],
+            'longitud': escuela['longitud'],
+            'distancia_km': round(distancia, 3),
+            'tiene_internet': escuela['tiene_internet'],
+            'tiene_piso_tecnologico': escuela['tiene_piso_tecnologico'],
+            'region_id': escuela['region_id'],
+            'distrito_id': escuela['distrito_id'],
+        } for distancia, escuela in encontrados],
+    })
+
+
+async def api_escuelas_cercanas(request):
+    """
+    Las N escuelas más cercanas a un punto, escuela o predio.
+    Parámetros: lat/lng, cue o predio; k (por defecto 10) y los filtros de
+    los mapas (region, distrito, tiene_internet, tiene_piso, estado_conectividad).
+    """
+    indice = await sync_to_async(espacial.indice)()
+    try:
+        lat, lng, excluir = _centro_proximidad(request.GET, indice)
+        k = request.GET.get('k', '10')
+        if not k.isdigit():
+            raise ValueError('k debe ser un número entero')
+        k = min(max(int(k), 1), espacial.MAX_VECINOS)
+        filtro = espacial.filtro_desde_parametros(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return _respuesta_proximidad(lat, lng, indice.cercanas(lat, lng, k, filtro, excluir))
+
+
+async def api_escuelas_radio(request):
+    """
+    Escuelas a menos de 'km' kilómetros de un punto, escuela o predio, con
+    los mismos filtros. Ej.: escuelas sin Internet a 10 km de un punto:
+        ?lat=-34.6&lng=-58.4&km=10&tiene_internet=0
+    """
+    indice = await sync_to_async(espacial.indice)()
+    try:
+        lat, lng, excluir = _centro_proximidad(request.GET, indice)
+        try:
+            km = float(request.GET.get('km'))
+        except (TypeError, ValueError):
+            km = 0
+        if not 0 < km <= espacial.MAX_RADIO_KM:
+            raise ValueError(f'El radio (km) debe estar entre 0 y {espacial.MAX_RADIO_KM}')
+        filtro = espacial.filtro_desde_parametros(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    encontrados = indice.en_radio(lat, lng, km, filtro, excluir)
+    return _respuesta_proximidad(lat, lng, encontrados[:espacial.MAX_RESULTADOS_RADIO])
+
+
+# Feed de cambios para sistemas que replican los datos
+MAX_CAMBIOS_POR_PAGINA = 1000
+# Segundos sugeridos (Retry-After) antes de volver a pedir una página cortada en un hueco
+REINTENTO_HUECO = 5
+
+
+async def api_cambios(request):
+    """
+    Devuelve los cambios registrados con id mayor a ?after=<id> (por defecto 0),
+    en orden, de a ?limit=<n> (máximo 1000). El consumidor guarda 'siguiente'
+    y lo envía como 'after' en la próxima llamada mientras 'hay_mas' sea true.
+
+    La página se corta antes de un hueco de ids reciente (puede ser una
+    transacción todavía abierta): 'siguiente' queda detrás del hueco,
+    'hay_mas' es true y la respuesta trae Retry-After. Los cambios
+    posteriores llegan cuando el hueco se llena o, si nunca se llena (un
+    rollback, un savepoint deshecho en una importación, un id salteado por
+    la base), cuando vence models.MARGEN_CONFIRMACION.
+
+    Límite: un cambio cuya transacción confirma más de MARGEN_CONFIRMACION
+    después de creado el cambio siguiente puede quedar detrás de un cursor
+    que ya avanzó, y ese consumidor no lo recibe.
+    """
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = min(int(request.GET.get('limit', 500)), MAX_CAMBIOS_POR_PAGINA)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros after/limit inválidos'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'El parámetro limit debe ser mayor a 0'}, status=400)
+
+    # Se pide uno de más para saber si quedan cambios sin enviar
+    registros = [
+        registro async for registro in RegistroCambio.objects.filter(id__gt=after).order_by('id').values(
+            'id', 'modelo', 'accion', 'objeto_id', 'cue', 'hash_contenido', 'datos', 'fecha'
+        )[:limit + 1]
+    ]
+    hay_mas = len(registros) > limit
+    registros, recortado = hasta_confirmados(registros[:limit], after)
+
+    data = {
+        'cambios': registros,
+        'siguiente': registros[-1]['id'] if registros else after,
+        'hay_mas': hay_mas or recortado,
+    }
+    response = JsonResponse(data)
+    if recortado:
+        response['Retry-After'] = str(REINTENTO_HUECO)
+    return response
+
+
+# Uso de conexiones a la base del worker que atiende (para dimensionar
+# workers y pool). Solo para el personal.
+
+def api_estado_conexiones(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Solo para usuarios del staff'}, status=403)
+    return JsonResponse(conexiones.estadisticas())
@@ -0,0 +1,109 @@
+#gunicorn.conf.py
+"""
+Configuración de gunicorn para producción (railway.toml la usa con
+`gunicorn -c gunicorn.conf.py`). Todo se ajusta por variables de entorno:
+
+  GUNICORN_WORKER_CLASS   uvicorn_worker.UvicornWorker (ASGI, por defecto),
+                          gthread o sync (WSGI)
+  WEB_CONCURRENCY         procesos worker
+  GUNICORN_THREADS        hilos por worker (solo gthread)
+  GUNICORN_TIMEOUT        segundos sin respuesta del worker antes de reiniciarlo
+  GUNICORN_PRELOAD        carga la aplicación una vez en el proceso maestro
+  GUNICORN_PRECALENTAR    precalienta las cachés antes de atender (ver gestor/precalentar.py)
+  GUNICORN_MAX_REQUESTS   reinicia cada worker tras esta cantidad de requests
+
+Con preload la aplicación y las cachés en memoria (caché local, índice
+espacial, catálogos) se cargan y precalientan una sola vez en el maestro, y
+los workers las heredan al hacer fork: arrancan rápido y comparten esa
+memoria mientras no la modifiquen. Sin preload cada worker precalienta lo
+suyo al iniciar.
+
+Conexiones a la base según el perfil (ver settings.py):
+  - uvicorn (ASGI, por defecto): cada request corre en un hilo propio, así
+    que las conexiones se reusan a través de un pool por worker (DB_POOL,
+    activado por defecto con MySQL y PostgreSQL). Cada worker abre hasta
+    DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW conexiones: dimensionar
+    WEB_CONCURRENCY con el límite de conexiones de la base. Con DB_POOL=False
+    se abre y cierra una conexión por request.
+  - gthread (WSGI): cada hilo reusa la suya durante DB_CONN_MAX_AGE
+    segundos; hasta WEB_CONCURRENCY x GUNICORN_THREADS conexiones abiertas.
+
+Para validar un cambio de estos valores, levantar el servidor y correr
+`python manage.py prueba_carga --url http://localhost:8000`.
+"""
+import multiprocessing
+import os
+
+
+def _entero(nombre, por_defecto):
+    return int(os.getenv(nombre, por_defecto))
+
+
+def _booleano(nombre, por_defecto):
+    return os.getenv(nombre, str(por_defecto)) == 'True'
+
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+# Los workers de uvicorn sirven la aplicación ASGI; gthread y sync, la WSGI
+ASGI = 'uvicorn' in worker_class.lower()
+wsgi_app = 'ges_proyecto.asgi:application' if ASGI else 'ges_proyecto.wsgi:application'
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Cada worker tiene su propia caché en memoria e índice espacial: más de
+# cuatro suele costar más memoria de la que rinde
+workers = _entero('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count() + 1, 4))
+threads = _entero('GUNICORN_THREADS', 4)
+
+# Las importaciones y exportaciones grandes tardan: el valor por defecto de
+# gunicorn (30 s) cortaba los workers sync a mitad de camino
+timeout = _entero('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _entero('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _entero('GUNICORN_KEEPALIVE', 5)
+
+# Reciclado gradual de workers (el jitter evita que se reinicien todos juntos)
+max_requests = _entero('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _entero('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+preload_app = _booleano('GUNICORN_PRELOAD', True)
+PRECALENTAR = _booleano('GUNICORN_PRECALENTAR', True)
+
+# El latido de los workers en memoria y no en el disco del contenedor
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = '-'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
+
+
+# -------------------------------------------------------------------------
+# HOOKS
+# -------------------------------------------------------------------------
+
+def _precalentar(log):
+    from django.db import connections
+    from gestor import precalentar
+
+    for descripcion, segundos in precalentar.precalentar():
+        if segundos is None:
+            log.warning('Falló el precalentamiento de %s', descripcion)
+        else:
+            log.info('Precalentado %s en %.2f s', descripcion, segundos)
+    # Los workers no pueden compartir la conexión que abrió el maestro
+    connections.close_all()
+
+
+def when_ready(server):
+    if preload_app and PRECALENTAR:
+        _precalentar(server.log)
+
+
+def post_fork(server, worker):
+    # Las estadísticas de conexiones son de cada worker, no del maestro
+    if preload_app:
+        from gestor import conexiones
+        conexiones.reiniciar()
+
+
+def post_worker_init(worker):
+    if not preload_app and PRECALENTAR:
+        _precalentar(worker.log)